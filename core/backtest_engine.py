@@ -1,8 +1,9 @@
-import importlib
 import os
 import json
 import datetime
-import core.backtrader_runer as bt_runer
+from core.result_cache import ResultCache
+from core.strategy_registry import StrategyRegistry
+from core.results_catalog import ResultsCatalog
 
 def snake_to_camel(s: str) -> str:
     if not s:
@@ -41,6 +42,12 @@ def pydantic_to_html_form(model: dict) -> str:
         html.append(" ".join(node))
     return "<br><br>".join(html)
 
+# 报告类型对应的结果文件后缀
+REPORT_FILES = {
+    'bt': '_report.html',
+    'pf': '_pf_report.html',
+}
+
 class StrategyRunner:
     """
     策略执行引擎
@@ -48,34 +55,60 @@ class StrategyRunner:
     1. 动态加载策略类
     2. 执行回测
     3. 保存结果
+    4. 缓存结果，相同策略源码、参数和数据区间的回测不重复计算
+    5. 维护回测结果索引，支持分页、排序和按参数过滤
     """
     
     def __init__(self, strategies_dir="strategies"):
         self.strategies_dir = strategies_dir
         os.makedirs("results", exist_ok=True)
+        self.catalog = ResultsCatalog("results")
+        self.cache = ResultCache()
+        self.registry = StrategyRegistry(strategies_dir, form_builder=pydantic_to_html_form)
     
     def load_strategy(self, strategy_name: str):
-        """动态加载策略类"""
+        """动态加载策略类，策略文件修改后自动重新加载"""
+        cn = snake_to_camel(strategy_name)
         try:
-            m = f"{self.strategies_dir}.{strategy_name}"
-            print(m)
-            module = importlib.import_module(m)
-            print(dir(module))
-            cn = snake_to_camel(strategy_name)
+            module = self.registry.get(strategy_name)['module']
             print(cn)
             StrategyClass = getattr(module, cn)
             return StrategyClass, module
         except Exception as e:
             raise ValueError(f"加载策略失败: {cn}")
     
-    def run_backtest(self, strategy_name: str, **params):
+    def run_backtest(self, strategy_name: str, progress=None, datafeed=None, force_refresh=False, report_mode=None, **params):
+        """
+        执行回测，命中缓存时直接返回已有结果，force_refresh 为 True 时强制重新计算；
+        report_mode 为 'lazy' 时报告推迟到首次打开时生成
+        """
         StrategyClass, module = self.load_strategy(strategy_name)
+        report_mode = report_mode or os.environ.get('BACKTEST_REPORT_MODE', 'eager')
+        key = self.cache.make_key(strategy_name, module, params, report_mode)
+        if not force_refresh:
+            result = self.cache.get(key)
+            if result is not None:
+                if progress is not None:
+                    progress.update(stage='cached')
+                return result
+
         bteng = getattr(module, 'backengine') or ''
         if bteng == 'backtesting':
             import core.backtesting_runer as bti_runer
-            return bti_runer.run_backtest(strategy_name, StrategyClass, module, **params)
+            result = bti_runer.run_backtest(strategy_name, StrategyClass, module, progress=progress, **params)
+        elif bteng == 'vector':
+            import core.vector_runer as vec_runer
+            result = vec_runer.run_backtest(strategy_name, StrategyClass, module, progress=progress, datafeed=datafeed,
+                                            report_mode=report_mode, **params)
         else:
-            return bt_runer.run_backtest(strategy_name, StrategyClass, module, **params)
+            # 回测引擎及其依赖（matplotlib、pyfolio、quantstats、Bokeh）用到时才导入
+            import core.backtrader_runer as bt_runer
+            result = bt_runer.run_backtest(strategy_name, StrategyClass, module, progress=progress, datafeed=datafeed,
+                                           report_mode=report_mode, **params)
+        with open(result["json_path"]) as f:
+            self.catalog.add(strategy_name, json.load(f))
+        self.cache.put(key, strategy_name, result)
+        return result
         
     # def run_backtest(self, strategy_name: str, **params):
     #     """执行回测并保存结果"""
@@ -154,56 +187,40 @@ class StrategyRunner:
     #         "html_path": html_path
     #     }
         
-    def load_all_results(self, strategy_name: str):
-        results = []
-        
-        results_dir = f"results/{strategy_name}"
-        if os.path.exists(results_dir):
-            for file in os.listdir(results_dir):
-                if file.endswith(".json"):
-                    with open(os.path.join(results_dir, file)) as f:
-                        data = json.load(f)
-                        results.append({
-                            "strategy_name": strategy_name,
-                            "result_id": '_'.join(data["result_id"].split("_")[-2:]),
-                            "params": data["parameters"],
-                            "timestamp": data["timestamp"],
-                            "html_path": os.path.join(results_dir, f"{data['result_id']}.html"), 
-                            "json_path": os.path.join(results_dir, file),
-                            "report_path": os.path.join(results_dir, f"{data['result_id']}_report.html"),
-                            "pf_report_path": os.path.join(results_dir, f"{data['result_id']}_pf_report.html")
-                        })
-        
-        print(results)
-        results.sort(key=lambda x: x['timestamp'], reverse=True)
-        return results
+    def report_path(self, strategy_name: str, result_id: str, kind: str):
+        """报告文件路径，kind 为 'bt'（回测图表）或 'pf'（quantstats 报告）"""
+        return os.path.join("results", strategy_name, f"{result_id}{REPORT_FILES[kind]}")
+
+    def render_report(self, strategy_name: str, result_id: str, kind: str):
+        """延迟生成报告，返回报告路径"""
+        _, module = self.load_strategy(strategy_name)
+        if (getattr(module, 'backengine') or '') == 'backtesting':
+            raise ValueError("backtesting 引擎的报告在回测时已生成")
+        import core.backtrader_runer as bt_runer
+        return bt_runer.render_report(strategy_name, result_id, kind)
+
+    def load_all_results(self, strategy_name: str, page: int = 1, page_size: int = 50,
+                         sort: str = "timestamp", order: str = "desc", filters: dict = None):
+        """分页查询回测记录，sort 为 timestamp 或指标列，filters 为参数取值过滤"""
+        return self.catalog.query(strategy_name, page, page_size, sort, order, filters)
+
+    def load_cancellations(self, strategy_name: str, limit: int = 50):
+        """最近被取消、超时或超出内存上限的回测"""
+        return self.catalog.cancellations(strategy_name, limit)
             
             
     def get_strategies(self):
-        strategies = []
-        for file in os.listdir(self.strategies_dir):
-            if file.endswith(".py") and file.find('xxx') < 0:
-                strategy_name = file[:-3]
-                params = self.get_strategy_params(strategy_name)
-                strategies.append({
-                    'name': strategy_name,
-                    'params': params
-                })
-        return strategies
+        return [{'name': entry['name'], 'params': entry['params']} for entry in self.registry.list()]
+
+    def get_strategy(self, strategy_name: str):
+        """获取单个策略的元数据，策略不存在时返回 None"""
+        return self.registry.get(strategy_name)
     
     def get_strategy_params(self, strategy_name: str):
-        m = f"{self.strategies_dir}.{strategy_name}"
-        module = importlib.import_module(m)
-        params = getattr(module, 'parametmp', None)
-        if params:
-            if callable(params):
-                params = params()
-            #print(params)
-            return params
-        else:
-            params = getattr(module, 'paramecfg')
-            html = pydantic_to_html_form(params)
-            return html
+        strategy = self.registry.get(strategy_name)
+        if strategy is None:
+            raise ValueError(f"加载策略失败: {snake_to_camel(strategy_name)}")
+        return strategy['params']
 
         
 if __name__ == "__main__":
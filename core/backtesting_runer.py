@@ -1,13 +1,11 @@
 import json
 import os
+from time import perf_counter as timer
 from datetime import datetime, time, date
 import matplotlib.pyplot as plt
 plt.rcParams['font.sans-serif'] = ['DejaVu Sans']  # 开源字体，兼容性好
 plt.rcParams['axes.unicode_minus'] = False
 
-import matplotlib.font_manager as fm
-fonts = sorted(set([f.name for f in fm.fontManager.ttflist]))
-print("可用字体:", fonts)
 
 # Custom JSON encoder for datetime objects
 class DateTimeEncoder(json.JSONEncoder):
@@ -26,9 +24,31 @@ from backtesting.test import GOOG
 from jinja2 import Template
 from jinja2 import Environment, FileSystemLoader
 
+from core.report_pipeline import ReportPipeline
 
-def run_backtest(strategy_name: str, StrategyClass, module, **params):
-    """执行回测并保存结果"""
+
+def render_trade_report(rp_path, stats_data, html_path, trades):
+    """用 templates/tmp.html 生成交易明细报告"""
+    env = Environment(loader=FileSystemLoader('./templates', encoding='utf-8'))
+    template = env.get_template('tmp.html') 
+    with open(rp_path,'w+', encoding='utf-8') as fout:   
+        html_content = template.render(
+            stats_data=stats_data,
+            html_path = html_path,
+            trade_data=trades.to_html(classes='table table-striped', index=False)
+        )
+        fout.write(html_content)
+
+
+def render_pf_report(returns, pf_rp_path):
+    qs.reports.html(returns, title='portfolio report', output=pf_rp_path)
+
+
+def run_backtest(strategy_name: str, StrategyClass, module, progress=None, report_mode=None, **params):
+    """
+    执行回测并保存结果，backtesting 没有逐K线回调，progress 只上报阶段；
+    图表依赖 Backtest 对象，报告总是在回测时生成，report_mode 不起作用
+    """
 
     # 更新策略参数
     for k, v in params.items():
@@ -43,10 +63,15 @@ def run_backtest(strategy_name: str, StrategyClass, module, **params):
         commission=.002, 
         finalize_trades=True,
         )
+    if progress is not None:
+        progress.update(stage='running')
     stats = bt.run()
+    if progress is not None:
+        progress.check()
+        progress.update(stage='reporting')
     
     # 生成结果ID
-    result_id = f"{strategy_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    result_id = f"{strategy_name}_{datetime.now().strftime('%Y%m%d_%H%M%S%f')}"
     
     
     #print(stats.to_json())
@@ -63,17 +88,16 @@ def run_backtest(strategy_name: str, StrategyClass, module, **params):
     os.makedirs(dir, exist_ok=True)
 
     json_path = f"results/{strategy_name}/{result_id}.json"
+    start = timer()
     with open(json_path, "w") as f:
         json.dump(result_data, f, indent=4, cls=DateTimeEncoder)
         # f.write(stats.to_json(indent=4))
+    report_timings = {'json': {'status': 'success', 'seconds': timer() - start, 'error': None}}
     
-    # 生成HTML报告
+    # 并行生成HTML报告，bt.plot 依赖 Backtest 对象，只能在当前进程生成
     html_path = f"results/{strategy_name}/{result_id}.html"
-    bt.plot(filename=html_path, open_browser=False)
-    
     rp_path = f"results/{strategy_name}/{result_id}_report.html"
-    env = Environment(loader=FileSystemLoader('./templates', encoding='utf-8'))
-    template = env.get_template('tmp.html') 
+    pf_rp_path = f"results/{strategy_name}/{result_id}_pf_report.html"
     cols=[
         'Size',
         'EntryPrice',
@@ -84,22 +108,25 @@ def run_backtest(strategy_name: str, StrategyClass, module, **params):
         'ExitTime',
         'Duration',]
     trades = stats._trades[cols]
-    with open(rp_path,'w+', encoding='utf-8') as fout:   
-        html_content = template.render(
-            stats_data=str(stats),
-            html_path = f"{result_id}.html",
-            trade_data=trades.to_html(classes='table table-striped', index=False)
-        )
-        fout.write(html_content)
-
     returns = stats._equity_curve['Equity'].pct_change()
-    pf_rp_path = f"results/{strategy_name}/{result_id}_pf_report.html"
-    qs.reports.html(returns, title='portfolio report', output=pf_rp_path)
+
+    pipeline = ReportPipeline()
+    pipeline.add('plot', lambda: bt.plot(filename=html_path, open_browser=False), local=True)
+    pipeline.add('trade_report', render_trade_report, rp_path, str(stats), f"{result_id}.html", trades)
+    pipeline.add('quantstats', render_pf_report, returns, pf_rp_path)
+    report_timings.update(pipeline.run())
+
+    result_data["report_timings"] = report_timings
+    with open(json_path, "w") as f:
+        json.dump(result_data, f, indent=4, cls=DateTimeEncoder)
 
     return {
         "status": "success",
         "result_id": result_id,
         "json_path": json_path,
-        "html_path": html_path
+        "html_path": html_path,
+        "report_path": rp_path,
+        "pf_report_path": pf_rp_path,
+        "report_timings": report_timings,
     }
     
\ No newline at end of file
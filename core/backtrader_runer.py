@@ -1,13 +1,11 @@
 import json
 import os
+import time as time_module
 from datetime import datetime, time, date
 import matplotlib.pyplot as plt
 plt.rcParams['font.sans-serif'] = ['DejaVu Sans']  # 开源字体，兼容性好
 plt.rcParams['axes.unicode_minus'] = False
 
-import matplotlib.font_manager as fm
-fonts = sorted(set([f.name for f in fm.fontManager.ttflist]))
-print("可用字体:", fonts)
 
 
 import pandas as pd
@@ -24,6 +22,9 @@ if not hasattr(np, 'bool8'):
 from backtrader_plotting import Bokeh
 from backtrader_plotting.schemes import Tradimo
 
+from core.report_pipeline import ReportPipeline
+from utils.array_feed import num2date_array
+
 # Custom JSON encoder for datetime objects
 class DateTimeEncoder(json.JSONEncoder):
     def default(self, obj):
@@ -60,12 +61,109 @@ def convert_params_for_plotting(params):
             converted_params[key] = value
     return converted_params
 
+class ProgressAnalyzer(bt.Analyzer):
+    """
+    回测进度分析器
+    每 every 根K线检查一次节流时间，到期才通过 reporter 上报：
+    已处理K线数/总数、当前模拟时间、账户净值和累计盈亏。
+    reporter 被要求停止时调用 runstop() 提前结束回测
+    """
+    params = (('reporter', None), ('every', 64),)
+
+    def start(self):
+        self.bars = 0
+        self.total = max(d.buflen() for d in self.datas) if self.datas else None
+        self.start_value = self.strategy.broker.getvalue()
+        self.p.reporter.update(stage='running', bars=0, total=self.total)
+
+    def next(self):
+        self.bars += 1
+        if self.p.reporter.stop_reason is not None:
+            # 回测被取消、超时或超出内存上限，结束主循环
+            self.strategy.env.runstop()
+        elif self.bars % self.p.every == 0 and self.p.reporter.due():
+            self.report()
+
+    def stop(self):
+        self.report()
+
+    def report(self):
+        value = self.strategy.broker.getvalue()
+        # 策略自行维护累计盈亏时（如 OStraddleStrategy.cum_pnl）优先使用
+        pnl = getattr(self.strategy, 'cum_pnl', value - self.start_value)
+        current = self.data.datetime.datetime(0).isoformat() if len(self.data) else None
+        self.p.reporter.update(
+            bars=self.bars,
+            total=self.total,
+            datetime=current,
+            equity=value,
+            pnl=pnl,
+        )
+
+
+class ChartRecorder(bt.Analyzer):
+    """
+    记录绘图数据：每根K线上 data0 的收盘价和账户净值，以及 data0 的成交
+    延迟生成报告时由这些数据绘制 Bokeh 图表，不需要重新执行回测
+    """
+
+    def start(self):
+        self.times = []
+        self.close = []
+        self.value = []
+        self.trades = []
+
+    def notify_order(self, order):
+        if order.status == order.Completed and order.data is self.data:
+            self.trades.append((order.executed.dt, order.executed.size, order.executed.price))
+
+    def next(self):
+        # 多个数据源时 data0 可能还没有K线
+        self.times.append(self.strategy.datetime[0])
+        self.close.append(self.data.close[0] if len(self.data) else float('nan'))
+        self.value.append(self.strategy.broker.getvalue())
+
+    def get_analysis(self):
+        trades = list(zip(*self.trades)) or [[], [], []]
+        return chart_data(num2date_array(self.times), self.close, self.value,
+                          num2date_array(trades[0]), trades[1], trades[2])
+
+
+def chart_data(times, close, value, trade_times, trade_sizes, trade_prices):
+    """
+    绘图数据：bars 为各K线的收盘价和账户净值，trades 为成交时间、数量（正数买入，负数卖出）和价格，
+    时间均为不带时区的 UTC 时间
+    """
+    return {
+        'bars': pd.DataFrame({'close': np.asarray(close, dtype='float64'), 'value': np.asarray(value, dtype='float64')},
+                             index=pd.DatetimeIndex(times, name='datetime')),
+        'trades': pd.DataFrame({'datetime': pd.DatetimeIndex(trade_times),
+                                'size': np.asarray(trade_sizes, dtype='float64'),
+                                'price': np.asarray(trade_prices, dtype='float64')}),
+    }
+
+
 def get_quote_data(**params):
     return pd.DataFrame([])
 
 
-def run_backtest(strategy_name: str, StrategyClass, module, **params):
-    """执行回测并保存结果"""
+def get_analyzer_stats(thestrat):
+    """提取收益、回撤和夏普比率分析器的结果，NaN 转为 None 以便写入 JSON"""
+    treturn = thestrat.analyzers.treturn.get_analysis()
+    drawdown = thestrat.analyzers.drawdown.get_analysis()
+    sharpe = thestrat.analyzers.sharpe.get_analysis()
+    stats = {
+        'rtot': treturn.get('rtot'),
+        'rnorm100': treturn.get('rnorm100'),
+        'max_drawdown': drawdown.get('max', {}).get('drawdown'),
+        'max_moneydown': drawdown.get('max', {}).get('moneydown'),
+        'sharpe': sharpe.get('sharperatio'),
+    }
+    return {k: None if v is None or np.isnan(v) else float(v) for k, v in stats.items()}
+
+
+def build_cerebro(StrategyClass, module, datafeed=None, progress=None, chart=False, **params):
+    """创建回测引擎，加载数据、策略和分析器，chart 为 True 时记录延迟生成图表所需的数据"""
 
     # 初始化回测引擎
     cerebro = bt.Cerebro()
@@ -77,9 +175,13 @@ def run_backtest(strategy_name: str, StrategyClass, module, **params):
     cerebro.broker.setcommission(commission=commission)
 
     DataFeed = getattr(module, 'DataFeed', None)
-    if DataFeed:
+    if datafeed is None and DataFeed:
         datafeed = DataFeed(params)
+    if datafeed is not None:
         params_ = datafeed.get_strategy_params()
+        # 策略自身声明的参数（如均线周期）直接透传给策略
+        strategy_keys = StrategyClass.params._getkeys()
+        params_.update({k: v for k, v in params.items() if k in strategy_keys})
         # 添加自己编写的策略，opts是第1小节“策略所需数据”中提到的期权合约信息
         cerebro.addstrategy(StrategyClass, **params_)
         datafeed.add_data_to_engine(cerebro)
@@ -94,40 +196,31 @@ def run_backtest(strategy_name: str, StrategyClass, module, **params):
     cerebro.addanalyzer(bt.analyzers.SharpeRatio, _name='sharpe')    
     # 回测时需要添加 PyFolio 分析器
     cerebro.addanalyzer(bt.analyzers.PyFolio, _name='pyfolio')
-    # 执行回测
-    thestrats = cerebro.run()
-
-    print(thestrats)
-    # 获取分析结果
-    thestrat = thestrats[0]
-    print(thestrat.analyzers.treturn.get_analysis())
-    print(thestrat.analyzers.drawdown.get_analysis())
-    print(thestrat.analyzers.sharpe.get_analysis())
+    if progress is not None:
+        cerebro.addanalyzer(ProgressAnalyzer, _name='progress', reporter=progress)
+    if chart:
+        cerebro.addanalyzer(ChartRecorder, _name='chart')
+    return cerebro
 
 
-    pyfolio = thestrat.analyzers.getbyname('pyfolio')
-    returns, positions, transactions, gross_lev = pyfolio.get_pf_items()
+def write_result_json(json_path, result_data):
+    with open(json_path, "w") as f:
+        json.dump(result_data, f, indent=4, cls=DateTimeEncoder)
 
 
-    # 生成结果ID
-    result_id = f"{strategy_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-    result_data = {
-        "strategy": strategy_name,
-        "parameters": params,
-        "stats": '{}',
-        "timestamp": datetime.now().isoformat(),
-        "result_id": result_id,
+def result_paths(strategy_name: str, result_id: str):
+    """回测结果各文件的路径"""
+    base = f"results/{strategy_name}/{result_id}"
+    return {
+        "json_path": f"{base}.json",
+        "html_path": f"{base}_report.html",
+        "pf_report_path": f"{base}_pf_report.html",
+        "raw_path": f"{base}_raw.pkl",
     }
-    
-    dir = f"results/{strategy_name}"
-    os.makedirs(dir, exist_ok=True)
 
-    json_path = f"results/{strategy_name}/{result_id}.json"
-    with open(json_path, "w") as f:
-        json.dump(result_data, f, indent=4, cls=DateTimeEncoder)
-        
-        # 生成HTML报告
-    html_path = f"results/{strategy_name}/{result_id}_report.html"
+
+def render_bokeh(cerebro, html_path):
+    """生成 Bokeh 图表报告，需要回测完成后的 cerebro"""
     scheme=Tradimo()
     scheme.volup = 'red',
     scheme.voldown = 'red'
@@ -151,14 +244,134 @@ def run_backtest(strategy_name: str, StrategyClass, module, **params):
         # Create an empty HTML file as placeholder
         with open(html_path, 'w') as f:
             f.write('<html><body><h1>Plotting failed</h1><p>Plot generation failed due to incompatible parameters.</p><p>Backtest results are saved successfully.</p></body></html>')
-    
-     
-    pf_rp_path = f"results/{strategy_name}/{result_id}_pf_report.html"
+
+
+def render_bokeh_raw(chart, html_path, title=''):
+    """由保存的绘图数据（见 chart_data）生成 Bokeh 图表：data0 收盘价和买卖点、账户净值"""
+    from bokeh.layouts import column
+    from bokeh.models import ColumnDataSource
+    from bokeh.plotting import figure, output_file, save
+
+    bars = chart['bars']
+    trades = chart['trades']
+    source = ColumnDataSource({'datetime': bars.index, 'close': bars['close'], 'value': bars['value']})
+    tools = 'pan,xwheel_zoom,box_zoom,reset,save'
+    price = figure(x_axis_type='datetime', height=400, sizing_mode='stretch_width', tools=tools, title=title)
+    price.line('datetime', 'close', source=source, legend_label='close')
+    buys = trades[trades['size'] > 0]
+    sells = trades[trades['size'] < 0]
+    price.triangle(buys['datetime'], buys['price'], size=9, color='red', legend_label='buy')
+    price.inverted_triangle(sells['datetime'], sells['price'], size=9, color='green', legend_label='sell')
+    price.legend.location = 'top_left'
+    equity = figure(x_axis_type='datetime', x_range=price.x_range, height=250, sizing_mode='stretch_width',
+                    tools=tools, title='value')
+    equity.line('datetime', 'value', source=source)
+    output_file(html_path, title=title)
+    save(column(price, equity, sizing_mode='stretch_width'))
+
+
+def render_pf_report(returns, pf_rp_path):
+    """根据收益序列生成 quantstats 报告"""
     qs.reports.html(returns, title='portfolio report', output=pf_rp_path)
-       
-    return {
-        "status": "success",
+
+
+def save_raw_outputs(thestrat, raw_path):
+    """保存 PyFolio 分析器的收益、持仓、成交、策略的交易记录和绘图数据，供延迟生成报告使用"""
+    pyfolio = thestrat.analyzers.getbyname('pyfolio')
+    returns, positions, transactions, gross_lev = pyfolio.get_pf_items()
+    chart = thestrat.analyzers.getbyname('chart') if 'chart' in thestrat.analyzers.getnames() else None
+    trade_log = getattr(thestrat, 'trade_log', None)
+    if trade_log is not None:
+        # 按列记录的交易日志（TradeLog）在导出时格式化
+        trade_log = trade_log.to_frame() if hasattr(trade_log, 'to_frame') else pd.DataFrame(trade_log)
+    raw = {
+        'returns': returns,
+        'positions': positions,
+        'transactions': transactions,
+        'gross_lev': gross_lev,
+        'trade_log': trade_log,
+        'chart': chart.get_analysis() if chart is not None else None,
+    }
+    pd.to_pickle(raw, raw_path)
+    return raw
+
+
+def run_backtest(strategy_name: str, StrategyClass, module, progress=None, datafeed=None, report_mode=None, **params):
+    """
+    执行回测并保存结果
+    progress 为 ProgressReporter 时实时上报进度；
+    datafeed 为已加载好的 DataFeed 时直接复用（参数扫描时各组合共享同一份行情数据）；
+    report_mode 为 'lazy' 时只保存原始输出和绘图数据，Bokeh 和 quantstats 报告在首次打开时再生成，
+    此时的 Bokeh 图表只包含 data0 收盘价、买卖点和净值曲线
+    """
+    report_mode = report_mode or os.environ.get('BACKTEST_REPORT_MODE', 'eager')
+    cerebro = build_cerebro(StrategyClass, module, datafeed=datafeed, progress=progress,
+                            chart=report_mode == 'lazy', **params)
+    # 执行回测
+    thestrats = cerebro.run()
+    if progress is not None:
+        # 提前结束的回测结果不完整，不保存也不进入缓存
+        progress.check()
+        progress.update(stage='reporting')
+
+    # 获取分析结果
+    thestrat = thestrats[0]
+    stats = get_analyzer_stats(thestrat)
+
+
+    # 生成结果ID
+    result_id = f"{strategy_name}_{datetime.now().strftime('%Y%m%d_%H%M%S%f')}"
+    result_data = {
+        "strategy": strategy_name,
+        "parameters": params,
+        "stats": stats,
+        "report_mode": report_mode,
+        "timestamp": datetime.now().isoformat(),
         "result_id": result_id,
-        "json_path": json_path,
-        "html_path": html_path,
-    }
\ No newline at end of file
+    }
+    
+    dir = f"results/{strategy_name}"
+    os.makedirs(dir, exist_ok=True)
+    paths = result_paths(strategy_name, result_id)
+
+    # 先写入结果 JSON，报告生成失败时回测记录仍然可见
+    start = time_module.perf_counter()
+    write_result_json(paths["json_path"], result_data)
+    report_timings = {'json': {'status': 'success', 'seconds': time_module.perf_counter() - start, 'error': None}}
+
+    raw = save_raw_outputs(thestrat, paths["raw_path"])
+    if report_mode != 'lazy':
+        # 并行生成HTML报告，Bokeh 图表在当前线程生成，quantstats 报告同时在线程池中生成
+        pipeline = ReportPipeline()
+        pipeline.add('bokeh', render_bokeh, cerebro, paths["html_path"], local=True)
+        pipeline.add('quantstats', render_pf_report, raw['returns'], paths["pf_report_path"])
+        report_timings.update(pipeline.run())
+        result_data["report_timings"] = report_timings
+        write_result_json(paths["json_path"], result_data)
+
+    return dict(
+        status="success",
+        result_id=result_id,
+        stats=stats,
+        report_mode=report_mode,
+        report_timings=report_timings,
+        **paths,
+    )
+
+
+def render_report(strategy_name: str, result_id: str, kind: str):
+    """
+    延迟生成报告并缓存到结果目录，返回报告路径，都由保存的原始输出生成，不重新执行回测
+    kind 为 'pf' 时生成 quantstats 报告，为 'bt' 时由绘图数据生成 Bokeh 图表
+    """
+    if kind not in ('pf', 'bt'):
+        raise ValueError(f"未知的报告类型: {kind}")
+    paths = result_paths(strategy_name, result_id)
+    raw = pd.read_pickle(paths["raw_path"])
+    if kind == 'pf':
+        render_pf_report(raw['returns'], paths["pf_report_path"])
+        return paths["pf_report_path"]
+    if raw.get('chart') is None:
+        raise ValueError("该回测结果没有保存绘图数据，无法生成图表，请重新回测")
+    render_bokeh_raw(raw['chart'], paths["html_path"], title=result_id)
+    return paths["html_path"]
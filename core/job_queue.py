@@ -0,0 +1,408 @@
+import os
+import uuid
+import pickle
+import tempfile
+import importlib
+import itertools
+import threading
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+from core.progress import ProgressReporter
+from core.run_guard import RunGuard, BacktestCancelled
+from utils.shared_data import SharedFrameStore, set_store
+
+
+def default_workers():
+    """并发工作进程数，默认使用全部CPU核心，可通过环境变量 BACKTEST_WORKERS 配置"""
+    n = int(os.environ.get('BACKTEST_WORKERS', 0) or 0)
+    return n if n > 0 else (os.cpu_count() or 1)
+
+
+# 参数扫描的行情数据目录，每次扫描只查询一次数据库，结果序列化到这里供各工作进程读取
+SWEEP_DATA_DIR = os.path.join(tempfile.gettempdir(), 'backtest_sweeps')
+
+# 工作进程内缓存的扫描行情数据，同一扫描的各参数组合只反序列化一次
+_sweep_datafeeds = {}
+
+
+# 工作进程启动时预先导入的模块，回测任务开始时不再付出导入 backtrader、Bokeh、pyfolio、quantstats 的时间
+WARM_MODULES = ['core.backtest_engine', 'core.backtrader_runer', 'core.backtesting_runer', 'core.vector_runer']
+
+# 工作进程内复用的 StrategyRunner，策略模块、结果索引和缓存只初始化一次
+_runner = None
+
+
+def _get_runner():
+    global _runner
+    if _runner is None:
+        from core.backtest_engine import StrategyRunner
+        _runner = StrategyRunner()
+    return _runner
+
+
+def _warm_worker():
+    """工作进程初始化：导入重量级依赖并预加载全部策略模块"""
+    for name in WARM_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            # 未安装的回测引擎（如 backtesting）在用到时再报错
+            print(f"Skipping warm import {name}: {e}")
+    registry = _get_runner().registry
+    for name in registry.names():
+        try:
+            registry.get(name)
+        except Exception as e:
+            print(f"Failed to preload strategy {name}: {e}")
+
+
+def _ping():
+    """空任务，用于在启动时拉起全部工作进程"""
+    return os.getpid()
+
+
+def _load_sweep_datafeed(data_path):
+    if data_path not in _sweep_datafeeds:
+        _sweep_datafeeds.clear()
+        with open(data_path, 'rb') as f:
+            _sweep_datafeeds[data_path] = pickle.load(f)
+    return _sweep_datafeeds[data_path]
+
+
+def _run_job(job_id, strategy_name, params, shared_progress, data_path=None, force_refresh=False, report_mode=None,
+             cancels=None, shared_data=None):
+    """
+    在工作进程中执行一次回测，进度写入共享字典
+    shared_data 为 SharedFrameStore 时行情数据通过共享内存在任务间复用，任务结束时释放本任务的持有
+    被取消、超时或超出内存上限时返回 status 为 cancelled 的结果，原因和停止时的进度同时写入结果索引，
+    任务从内存中淘汰后仍可查询
+    """
+    reporter = ProgressReporter(shared_progress, job_id)
+    reporter.update(stage='loading')
+    set_store(shared_data)
+    guard = RunGuard(reporter, cancels).start()
+    try:
+        try:
+            datafeed = _load_sweep_datafeed(data_path) if data_path else None
+            return _get_runner().run_backtest(strategy_name, progress=reporter, datafeed=datafeed,
+                                       force_refresh=force_refresh, report_mode=report_mode, **params)
+        finally:
+            try:
+                guard.stop()
+            finally:
+                # 不把本任务的共享数据留给同一工作进程中之后的任务（参数扫描的数据准备等）
+                try:
+                    if shared_data is not None:
+                        shared_data.release_all()
+                finally:
+                    set_store(None)
+    except (BacktestCancelled, KeyboardInterrupt):
+        if guard.reason is None:
+            raise
+        reporter.update(stage='cancelled', reason=guard.reason)
+        try:
+            _get_runner().catalog.add_cancellation(strategy_name, job_id, params, guard.reason,
+                                                   guard.interrupted, dict(reporter.info))
+        except Exception as e:
+            print(f"Failed to record cancellation of job {job_id}: {e}")
+        return {
+            "status": "cancelled",
+            "reason": guard.reason,
+            "interrupted": guard.interrupted,
+            "progress": dict(reporter.info),
+        }
+
+
+def _render_report(strategy_name, result_id, kind):
+    """在工作进程中延迟生成报告"""
+    return _get_runner().render_report(strategy_name, result_id, kind)
+
+
+def _prepare_sweep(strategy_name, params, data_path):
+    """在工作进程中加载一次行情数据并序列化，策略没有 DataFeed 时返回 None"""
+    StrategyClass, module = _get_runner().load_strategy(strategy_name)
+    DataFeed = getattr(module, 'DataFeed', None)
+    if DataFeed is None:
+        return None
+    datafeed = DataFeed(dict(params))
+    os.makedirs(os.path.dirname(data_path), exist_ok=True)
+    with open(data_path, 'wb') as f:
+        pickle.dump(datafeed, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return data_path
+
+
+def expand_grid(grid: dict):
+    """把 {'n1': [5, 10], 'n2': [20, 30]} 展开为参数组合列表"""
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+# 排名指标，True 表示越大越好
+RANK_METRICS = {
+    'sharpe': True,
+    'rtot': True,
+    'rnorm100': True,
+    'max_drawdown': False,
+    'max_moneydown': False,
+}
+
+
+class JobManager:
+    """
+    回测任务队列
+    功能：
+    1. 提交回测任务，立即返回任务ID
+    2. 由进程池中的工作进程并发执行回测，工作进程启动时预先导入依赖并在任务间复用
+    3. 查询任务状态、实时进度和结果路径
+    4. 取消任务，工作进程中的 RunGuard 同时限制运行时间和内存占用
+    5. 参数扫描：行情数据只加载一次，各参数组合分发到进程池并汇总排名
+    6. 并发任务查询相同行情时，数据只加载一次并通过共享内存复用（见 SharedFrameStore）
+    """
+
+    # 内存中最多保留的已结束任务数
+    max_finished_jobs = 1000
+    # 内存中最多保留的已结束参数扫描数
+    max_finished_sweeps = 100
+    # 单次参数扫描允许的最大组合数
+    max_sweep_size = 1000
+
+    def __init__(self, max_workers=None, warm=None):
+        self.max_workers = max_workers or default_workers()
+        self.executor = ProcessPoolExecutor(max_workers=self.max_workers, initializer=_warm_worker)
+        # 工作进程上报的进度，job_id -> 进度字典
+        self.manager = multiprocessing.Manager()
+        self.progress = self.manager.dict()
+        # 运行中任务的取消请求，job_id -> 取消原因，由工作进程中的 RunGuard 读取
+        self.cancels = self.manager.dict()
+        # 工作进程间共享的行情数据，预算由环境变量 SHARED_DATA_BUDGET_MB 配置
+        self.shared_data = SharedFrameStore(self.manager.dict(), self.manager.Lock())
+        self.jobs = {}
+        self.sweeps = {}
+        # 正在生成的报告，同一报告被同时打开时只生成一次
+        self.renders = {}
+        self.lock = threading.Lock()
+        # 预热可通过环境变量 BACKTEST_WARM_WORKERS=0 关闭
+        if warm if warm is not None else os.environ.get('BACKTEST_WARM_WORKERS', '1') != '0':
+            self.warm_up()
+
+    def warm_up(self):
+        """立即拉起全部工作进程，由初始化函数预先导入依赖，首个回测任务不再等待进程启动"""
+        for _ in range(self.max_workers):
+            self.executor.submit(_ping)
+
+    def submit(self, strategy_name: str, params: dict = None, data_path: str = None, sweep_id: str = None,
+               force_refresh: bool = False, report_mode: str = None):
+        """提交回测任务，返回任务ID"""
+        params = params or {}
+        job_id = uuid.uuid4().hex
+        job = {
+            "job_id": job_id,
+            "strategy_name": strategy_name,
+            "params": params,
+            "sweep_id": sweep_id,
+            "submitted_at": datetime.now().isoformat(),
+            "finished_at": None,
+            "result": None,
+            "error": None,
+        }
+        with self.lock:
+            self.jobs[job_id] = job
+            self._prune()
+        job["future"] = self.executor.submit(_run_job, job_id, strategy_name, params, self.progress, data_path,
+                                             force_refresh, report_mode, self.cancels, self.shared_data)
+        job["future"].add_done_callback(lambda f, job=job: self._on_done(job, f))
+        return job_id
+
+    def submit_sweep(self, strategy_name: str, params: dict, grid: dict, rank_by: str = 'sharpe'):
+        """
+        提交参数扫描，返回扫描ID
+        params 为各组合共用的参数（包括数据区间），grid 为待扫描的参数取值
+        """
+        if rank_by not in RANK_METRICS:
+            raise ValueError(f"不支持的排名指标: {rank_by}")
+        combos = expand_grid(grid)
+        if not combos or len(combos) > self.max_sweep_size:
+            raise ValueError(f"参数组合数必须在 1 到 {self.max_sweep_size} 之间，当前为 {len(combos)}")
+        sweep_id = uuid.uuid4().hex
+        data_path = os.path.join(SWEEP_DATA_DIR, f"{sweep_id}.pkl")
+        sweep = {
+            "sweep_id": sweep_id,
+            "strategy_name": strategy_name,
+            "params": params,
+            "grid": grid,
+            "rank_by": rank_by,
+            "combos": combos,
+            "submitted_at": datetime.now().isoformat(),
+            "finished_at": None,
+            "job_ids": [],
+            "error": None,
+            "data_path": None,
+        }
+        with self.lock:
+            self.sweeps[sweep_id] = sweep
+            self._prune()
+        future = self.executor.submit(_prepare_sweep, strategy_name, params, data_path)
+        future.add_done_callback(lambda f, sweep=sweep: self._on_sweep_prepared(sweep, f))
+        return sweep_id
+
+    def _on_sweep_prepared(self, sweep, future):
+        error = future.exception()
+        if error is not None:
+            sweep["error"] = f"{type(error).__name__}: {error}"
+            sweep["finished_at"] = datetime.now().isoformat()
+            return
+        sweep["data_path"] = future.result()
+        for combo in sweep["combos"]:
+            params = dict(sweep["params"], **combo)
+            job_id = self.submit(sweep["strategy_name"], params, sweep["data_path"], sweep["sweep_id"])
+            sweep["job_ids"].append(job_id)
+        # 组合提交期间可能已全部结束
+        self._cleanup_sweep(sweep)
+
+    def _on_done(self, job, future):
+        if not future.cancelled():
+            error = future.exception()
+            if error is not None:
+                job["error"] = f"{type(error).__name__}: {error}"
+            else:
+                job["result"] = future.result()
+        try:
+            self.cancels.pop(job["job_id"], None)
+        except (OSError, EOFError):
+            # 服务关闭时 Manager 先于被取消的任务停止
+            pass
+        # 最后设置结束时间，状态查询以此判断结果是否已写入
+        job["finished_at"] = datetime.now().isoformat()
+        if job["sweep_id"]:
+            self._cleanup_sweep(self.sweeps.get(job["sweep_id"]))
+
+    def _cleanup_sweep(self, sweep):
+        """扫描的全部组合结束后删除共享的行情数据文件，记录扫描的结束时间"""
+        if sweep is None or sweep["finished_at"] or len(sweep["job_ids"]) < len(sweep["combos"]):
+            return
+        # 已被淘汰的任务必然已经结束
+        if all(self.jobs[j]["finished_at"] for j in sweep["job_ids"] if j in self.jobs):
+            if sweep["data_path"] and os.path.exists(sweep["data_path"]):
+                os.remove(sweep["data_path"])
+            sweep["finished_at"] = datetime.now().isoformat()
+            with self.lock:
+                self._prune()
+
+    def _prune(self):
+        """淘汰最早结束的任务和参数扫描，调用方持有 self.lock"""
+        finished = [j for j in self.jobs.values() if j["finished_at"]]
+        for job in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self.jobs[job["job_id"]]
+            self.progress.pop(job["job_id"], None)
+        finished = [s for s in self.sweeps.values() if s["finished_at"]]
+        for sweep in finished[:max(0, len(finished) - self.max_finished_sweeps)]:
+            del self.sweeps[sweep["sweep_id"]]
+
+    def cancel(self, job_id: str, reason: str = "用户取消"):
+        """
+        取消任务：排队中的任务直接取消，运行中的任务通知工作进程停止
+        任务不存在时返回 None，已结束的任务返回 False
+        """
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        if job["finished_at"]:
+            return False
+        future = job.get("future")
+        if future is not None and future.cancel():
+            return True
+        self.cancels[job_id] = reason
+        return True
+
+    def status(self, job):
+        future = job.get("future")
+        if future is None:
+            return "queued"
+        if future.cancelled():
+            return "cancelled"
+        if job["finished_at"]:
+            if job["error"]:
+                return "failed"
+            return "cancelled" if (job["result"] or {}).get("status") == "cancelled" else "success"
+        if future.running() and job["job_id"] in self.progress:
+            return "running"
+        return "queued"
+
+    def get(self, job_id: str):
+        """获取任务状态，任务不存在时返回 None"""
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        info = {k: v for k, v in job.items() if k != "future"}
+        info["status"] = self.status(job)
+        info["progress"] = self.progress.get(job_id)
+        return info
+
+    def render_report(self, strategy_name: str, result_id: str, kind: str):
+        """提交延迟报告生成任务，返回 Future，结果为报告路径"""
+        key = (strategy_name, result_id, kind)
+        with self.lock:
+            future = self.renders.get(key)
+            if future is None:
+                future = self.executor.submit(_render_report, strategy_name, result_id, kind)
+                self.renders[key] = future
+                future.add_done_callback(lambda f, key=key: self.renders.pop(key, None))
+        return future
+
+    def get_sweep(self, sweep_id: str):
+        """获取参数扫描状态和按指标排序的结果表，扫描不存在时返回 None"""
+        sweep = self.sweeps.get(sweep_id)
+        if sweep is None:
+            return None
+        rank_by = sweep["rank_by"]
+        rows = []
+        for job_id, combo in zip(sweep["job_ids"], sweep["combos"]):
+            job = self.get(job_id) or {"status": "expired", "result": None, "error": None}
+            stats = (job["result"] or {}).get("stats") or {}
+            rows.append(dict(
+                job_id=job_id,
+                params=combo,
+                status=job["status"],
+                error=job["error"],
+                result_id=(job["result"] or {}).get("result_id"),
+                **{k: stats.get(k) for k in RANK_METRICS},
+            ))
+        higher_better = RANK_METRICS[rank_by]
+
+        def sort_key(row):
+            # 指标为空的组合排在最后
+            value = row[rank_by]
+            if value is None:
+                return (1, 0)
+            return (0, -value if higher_better else value)
+
+        rows.sort(key=sort_key)
+
+        if sweep["error"]:
+            status = "failed"
+        elif len(rows) < len(sweep["combos"]):
+            status = "preparing"
+        elif any(r["status"] in ("queued", "running") for r in rows):
+            status = "running"
+        else:
+            status = "success"
+        return {
+            "sweep_id": sweep_id,
+            "strategy_name": sweep["strategy_name"],
+            "params": sweep["params"],
+            "grid": sweep["grid"],
+            "rank_by": rank_by,
+            "status": status,
+            "error": sweep["error"],
+            "submitted_at": sweep["submitted_at"],
+            "done": sum(r["status"] not in ("queued", "running") for r in rows),
+            "total": len(sweep["combos"]),
+            "results": rows,
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.shared_data.clear()
+        self.manager.shutdown()
@@ -0,0 +1,35 @@
+import time
+
+
+class ProgressReporter:
+    """
+    回测进度上报
+    工作进程通过它把进度写入共享字典（multiprocessing.Manager().dict()），
+    服务端再把共享字典中的进度推送给浏览器。
+    写入按时间间隔节流，避免跨进程通信拖慢回测主循环。
+    """
+
+    def __init__(self, shared, job_id: str, interval: float = 0.5):
+        self.shared = shared
+        self.job_id = job_id
+        self.interval = interval
+        self.info = {}
+        self._last = 0.0
+        # 非空时回测应尽快停止，由 RunGuard 设置
+        self.stop_reason = None
+
+    def due(self):
+        """距离上次上报是否已超过节流间隔"""
+        return time.monotonic() - self._last >= self.interval
+
+    def update(self, **info):
+        """合并并立即上报进度信息"""
+        self.info.update(info)
+        self._last = time.monotonic()
+        self.shared[self.job_id] = dict(self.info)
+
+    def check(self):
+        """回测已被要求停止时抛出 BacktestCancelled"""
+        if self.stop_reason is not None:
+            from core.run_guard import BacktestCancelled
+            raise BacktestCancelled(self.stop_reason)
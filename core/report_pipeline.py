@@ -0,0 +1,58 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _timed(func, *args):
+    """执行报告生成函数并计时，在线程池中运行"""
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+class ReportPipeline:
+    """
+    报告生成阶段
+    互不依赖的报告并行生成：报告（quantstats、Jinja 交易报告）提交到线程池，
+    标记为 local 的报告（Bokeh 图表）同时在当前线程生成。
+    回测本身已在任务队列的工作进程中执行，这里不再创建子进程；报告生成主要是写文件和绘图库中的 numpy 运算，线程即可并行。
+    单个报告失败不影响其他报告，每个报告的耗时和状态都会记录下来。
+    """
+
+    def __init__(self):
+        self.tasks = []
+
+    def add(self, name: str, func, *args, local: bool = False):
+        """添加报告任务，local 为 True 时在调用 run() 的线程中生成"""
+        self.tasks.append((name, func, args, local))
+
+    def run(self):
+        """生成全部报告，返回 {报告名: {'status', 'seconds', 'error'}}"""
+        timings = {}
+        remote = [t for t in self.tasks if not t[3]]
+        local = [t for t in self.tasks if t[3]]
+        workers = int(os.environ.get('BACKTEST_REPORT_WORKERS', len(remote)) or 0)
+
+        if not remote or workers <= 0:
+            for name, func, args, _ in self.tasks:
+                timings[name] = self._run_local(func, args)
+            return timings
+
+        with ThreadPoolExecutor(max_workers=min(workers, len(remote)), thread_name_prefix='report') as pool:
+            futures = {name: (pool.submit(_timed, func, *args), time.perf_counter()) for name, func, args, _ in remote}
+            for name, func, args, _ in local:
+                timings[name] = self._run_local(func, args)
+            for name, (future, start) in futures.items():
+                try:
+                    timings[name] = {'status': 'success', 'seconds': future.result(), 'error': None}
+                except Exception as e:
+                    timings[name] = {'status': 'failed', 'seconds': time.perf_counter() - start, 'error': f"{type(e).__name__}: {e}"}
+        return timings
+
+    def _run_local(self, func, args):
+        start = time.perf_counter()
+        try:
+            func(*args)
+        except Exception as e:
+            return {'status': 'failed', 'seconds': time.perf_counter() - start, 'error': f"{type(e).__name__}: {e}"}
+        return {'status': 'success', 'seconds': time.perf_counter() - start, 'error': None}
@@ -0,0 +1,133 @@
+import os
+import json
+import time
+import hashlib
+from datetime import datetime, date, time as dtime
+
+
+def _normalize(value):
+    """规范化参数值，使等价的取值（如 10 与 10.0、'2025-01-01' 与 '2025-01-01 00:00:00'）得到相同的键"""
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in sorted(value.items(), key=lambda kv: str(kv[0]))}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, (datetime, date, dtime)):
+        return value.isoformat()
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value).isoformat()
+        except ValueError:
+            return value
+    return value
+
+
+class ResultCache:
+    """
+    回测结果缓存
+    以策略模块源码哈希、规范化后的参数、数据区间和报告模式作为键，
+    相同的回测命中时直接返回已有的 results/<strategy>/<result_id> 文件。
+    每个键一个 JSON 文件，多个工作进程可以并发读写。
+    超过保留天数或缓存目录总大小超限时，按最近命中时间淘汰条目；
+    只删除缓存条目，结果文件和结果索引中的回测记录保留，淘汰后相同的回测会重新计算。
+    淘汰需要读取全部条目，写入时每隔 evict_interval 秒才执行一次。
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=None, max_age_days=None, evict_interval=None):
+        self.cache_dir = cache_dir or os.path.join("results", ".cache")
+        self.max_bytes = max_bytes or int(float(os.environ.get("BACKTEST_CACHE_MAX_MB", 2048)) * 1024 * 1024)
+        self.max_age = (max_age_days or float(os.environ.get("BACKTEST_CACHE_MAX_AGE_DAYS", 30))) * 86400
+        if evict_interval is None:
+            evict_interval = float(os.environ.get("BACKTEST_CACHE_EVICT_INTERVAL", 60))
+        self.evict_interval = evict_interval
+        # 本进程上次淘汰的时间，首次写入时立即淘汰
+        self._last_evict = None
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def make_key(self, strategy_name: str, module, params: dict, report_mode: str = None):
+        """report_mode 不同的结果不共用：延迟生成的结果没有已生成的报告"""
+        with open(module.__file__, "rb") as f:
+            source_hash = hashlib.sha256(f.read()).hexdigest()
+        payload = json.dumps({
+            "strategy": strategy_name,
+            "source": source_hash,
+            "params": _normalize(params),
+            "range": _normalize([params.get("begin_time"), params.get("end_time")]),
+            "report_mode": report_mode,
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str):
+        """命中且结果文件都还在时返回结果，否则返回 None"""
+        path = self._entry_path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not all(os.path.exists(p) for p in entry["artifacts"]):
+            self._remove(path)
+            return None
+        # 以缓存文件的修改时间记录最近命中时间，条目已被其他进程淘汰时视为未命中
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return dict(entry["result"], cached=True)
+
+    def put(self, key: str, strategy_name: str, result: dict):
+        artifacts = [v for k, v in result.items() if k.endswith("_path") and v and os.path.exists(v)]
+        entry = {
+            "key": key,
+            "strategy": strategy_name,
+            "result": result,
+            "artifacts": artifacts,
+            "created": time.time(),
+        }
+        path = self._entry_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entry, f, default=str)
+        os.replace(tmp_path, path)
+        now = time.monotonic()
+        if self._last_evict is None or now - self._last_evict >= self.evict_interval:
+            self.evict()
+
+    def _remove(self, path):
+        """删除条目文件，返回是否由本进程删除，多个进程同时淘汰同一条目时只有一个进程删除成功"""
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def evict(self):
+        """淘汰过期条目，总大小超限时再按最近命中时间从旧到新淘汰"""
+        self._last_evict = time.monotonic()
+        now = time.time()
+        entries = []
+        for file in os.listdir(self.cache_dir):
+            if not file.endswith(".json"):
+                continue
+            path = os.path.join(self.cache_dir, file)
+            try:
+                with open(path) as f:
+                    entry = json.load(f)
+                stat = os.stat(path)
+            except (OSError, ValueError):
+                continue
+            if now - entry["created"] > self.max_age:
+                self._remove(path)
+            else:
+                entries.append((stat.st_mtime, path, stat.st_size))
+
+        total = sum(size for _, _, size in entries)
+        for _, path, size in sorted(entries, key=lambda x: x[0]):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
@@ -0,0 +1,206 @@
+import os
+import re
+import json
+import math
+import sqlite3
+from datetime import datetime
+from contextlib import contextmanager
+
+# 可排序的列，指标列取自结果 JSON 中的 stats
+METRIC_COLUMNS = ['rtot', 'rnorm100', 'max_drawdown', 'max_moneydown', 'sharpe']
+SORT_COLUMNS = ['timestamp'] + METRIC_COLUMNS
+
+SCHEMA = f"""
+create table if not exists results (
+    result_id text primary key,
+    strategy text not null,
+    timestamp text not null,
+    params text not null,
+    {', '.join(f'{c} real' for c in METRIC_COLUMNS)}
+);
+{''.join(f'create index if not exists idx_results_{c} on results(strategy, {c});' for c in SORT_COLUMNS)}
+create table if not exists cancellations (
+    job_id text primary key,
+    strategy text not null,
+    timestamp text not null,
+    params text not null,
+    reason text not null,
+    interrupted integer not null,
+    progress text
+);
+create index if not exists idx_cancellations_strategy on cancellations(strategy, timestamp);
+"""
+
+
+def _as_number(value):
+    """过滤条件中的数值，"10"、10 和 10.0 都按数值 10 比较；不是数值时返回 None"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            number = float(value)
+        except ValueError:
+            return None
+        return number if math.isfinite(number) else None
+    return None
+
+
+def _number_text(number):
+    return str(int(number)) if number.is_integer() else repr(number)
+
+
+def _filter_clause(key, value):
+    """
+    参数过滤条件及其绑定值
+    参数以 JSON 保存，数值过滤条件同时匹配保存为数值和数值字符串的参数，
+    请求中的 "10" 与保存的 10、10.0 或 "10" 都相等
+    """
+    path = f"'$.{key}'"
+    number = _as_number(value)
+    if number is None:
+        return f"json_extract(params, {path}) = ?", [value]
+    return (
+        f"(json_type(params, {path}) in ('integer', 'real') and json_extract(params, {path}) = ?"
+        f" or json_type(params, {path}) = 'text' and json_extract(params, {path}) in (?, ?))",
+        [number, str(value), _number_text(number)],
+    )
+
+
+class ResultsCatalog:
+    """
+    回测结果索引
+    回测完成时写入嵌入式 SQLite，历史记录查询走索引分页，
+    不再每次遍历 results/<strategy>/ 并读取全部 JSON 文件。
+    首次创建时从已有的 JSON 结果文件导入历史记录。
+    被取消、超时或超出内存上限的回测没有结果文件，原因和停止时的进度记录在 cancellations 表中。
+    """
+
+    def __init__(self, results_dir="results", db_path=None):
+        self.results_dir = results_dir
+        self.db_path = db_path or os.path.join(results_dir, "catalog.db")
+        os.makedirs(results_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            if conn.execute("pragma user_version").fetchone()[0] == 0:
+                self._import_json_files(conn)
+                conn.execute("pragma user_version = 1")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        # WAL 模式下工作进程写入时不阻塞服务端查询
+        conn.execute("pragma journal_mode = wal")
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _import_json_files(self, conn):
+        for strategy_name in os.listdir(self.results_dir):
+            results_dir = os.path.join(self.results_dir, strategy_name)
+            if strategy_name.startswith('.') or not os.path.isdir(results_dir):
+                continue
+            for file in os.listdir(results_dir):
+                if file.endswith(".json"):
+                    try:
+                        with open(os.path.join(results_dir, file)) as f:
+                            self._insert(conn, strategy_name, json.load(f))
+                    except (OSError, ValueError, KeyError) as e:
+                        print(f"Skipping result file {file}: {e}")
+
+    def _insert(self, conn, strategy_name, data):
+        stats = data.get("stats")
+        stats = stats if isinstance(stats, dict) else {}
+        conn.execute(
+            f"insert or replace into results (result_id, strategy, timestamp, params, {', '.join(METRIC_COLUMNS)}) "
+            f"values (?, ?, ?, ?, {', '.join('?' for _ in METRIC_COLUMNS)})",
+            [data["result_id"], strategy_name, data["timestamp"], json.dumps(data["parameters"], default=str)]
+            + [stats.get(c) for c in METRIC_COLUMNS],
+        )
+
+    def add(self, strategy_name: str, data: dict):
+        """写入一条回测结果，data 为结果 JSON 文件的内容"""
+        with self._connect() as conn:
+            self._insert(conn, strategy_name, data)
+
+    def remove(self, result_id: str):
+        with self._connect() as conn:
+            conn.execute("delete from results where result_id = ?", [result_id])
+
+    def add_cancellation(self, strategy_name: str, job_id: str, params: dict, reason: str,
+                         interrupted: bool = False, progress: dict = None):
+        """记录一次提前结束的回测"""
+        with self._connect() as conn:
+            conn.execute(
+                "insert or replace into cancellations (job_id, strategy, timestamp, params, reason, interrupted, progress) "
+                "values (?, ?, ?, ?, ?, ?, ?)",
+                [job_id, strategy_name, datetime.now().isoformat(), json.dumps(params, default=str), reason,
+                 int(bool(interrupted)), json.dumps(progress, default=str)],
+            )
+
+    def cancellations(self, strategy_name: str, limit: int = 50):
+        """最近提前结束的回测，按时间倒序"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "select * from cancellations where strategy = ? order by timestamp desc limit ?",
+                [strategy_name, limit],
+            ).fetchall()
+        return [{
+            "job_id": row["job_id"],
+            "strategy_name": strategy_name,
+            "timestamp": row["timestamp"],
+            "params": json.loads(row["params"]),
+            "reason": row["reason"],
+            "interrupted": bool(row["interrupted"]),
+            "progress": json.loads(row["progress"]) if row["progress"] else None,
+        } for row in rows]
+
+    def query(self, strategy_name: str, page: int = 1, page_size: int = 50,
+              sort: str = "timestamp", order: str = "desc", filters: dict = None):
+        """
+        分页查询回测记录
+        sort 为 timestamp 或指标列，filters 为参数取值过滤，如 {'n1': 10}
+        """
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f"不支持的排序字段: {sort}")
+        order = "asc" if order == "asc" else "desc"
+        where = ["strategy = ?"]
+        args = [strategy_name]
+        for key, value in (filters or {}).items():
+            if not re.fullmatch(r"\w+", key):
+                raise ValueError(f"非法的参数名: {key}")
+            clause, values = _filter_clause(key, value)
+            where.append(clause)
+            args.extend(values)
+        where = " and ".join(where)
+
+        with self._connect() as conn:
+            total = conn.execute(f"select count(*) from results where {where}", args).fetchone()[0]
+            rows = conn.execute(
+                f"select * from results where {where} order by {sort} {order}, timestamp desc limit ? offset ?",
+                args + [page_size, (max(page, 1) - 1) * page_size],
+            ).fetchall()
+
+        results_dir = os.path.join(self.results_dir, strategy_name)
+        items = []
+        for row in rows:
+            result_id = row["result_id"]
+            items.append({
+                "strategy_name": strategy_name,
+                "result_id": '_'.join(result_id.split("_")[-2:]),
+                "params": json.loads(row["params"]),
+                "timestamp": row["timestamp"],
+                "stats": {c: row[c] for c in METRIC_COLUMNS},
+                "html_path": os.path.join(results_dir, f"{result_id}.html"),
+                "json_path": os.path.join(results_dir, f"{result_id}.json"),
+                "report_path": os.path.join(results_dir, f"{result_id}_report.html"),
+                "pf_report_path": os.path.join(results_dir, f"{result_id}_pf_report.html"),
+                # 报告不存在时由服务端在首次打开时生成
+                "report_url": f"/api/reports/{strategy_name}/{result_id}/bt",
+                "pf_report_url": f"/api/reports/{strategy_name}/{result_id}/pf",
+            })
+        return {"total": total, "page": page, "page_size": page_size, "items": items}
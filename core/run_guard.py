@@ -0,0 +1,113 @@
+import os
+import time
+import signal
+import _thread
+import threading
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+class BacktestCancelled(Exception):
+    """回测被取消、超时或超出内存上限"""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+def current_rss():
+    """当前进程的常驻内存（字节），无法获取时返回 None"""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class RunGuard:
+    """
+    回测运行看门狗
+    在工作进程中用后台线程定期检查：取消请求、墙钟超时、常驻内存上限。
+    触发时先设置 reporter.stop_reason，由 ProgressAnalyzer 在下一根K线调用 runstop() 正常结束回测；
+    超过宽限时间仍未结束（如卡在数据库查询或报告生成中），再向主线程发送 SIGUSR1 抛出 KeyboardInterrupt，
+    真实信号可以打断阻塞的系统调用；不支持 pthread_kill 的平台（Windows）退化为 _thread.interrupt_main()。
+    start() 和 stop() 必须在主线程中调用。
+    超时和内存上限可通过环境变量 BACKTEST_TIMEOUT（秒）和 BACKTEST_MAX_RSS_MB 配置，0 表示不限制。
+    """
+
+    def __init__(self, reporter, cancels=None, timeout=None, max_rss_mb=None, interval=0.5, grace=5.0):
+        self.reporter = reporter
+        # 服务端写入的取消请求，job_id -> 取消原因
+        self.cancels = cancels
+        self.timeout = timeout if timeout is not None else float(os.environ.get('BACKTEST_TIMEOUT', 0) or 0)
+        max_rss_mb = max_rss_mb if max_rss_mb is not None else float(os.environ.get('BACKTEST_MAX_RSS_MB', 0) or 0)
+        self.max_rss = max_rss_mb * 1024 * 1024
+        self.interval = interval
+        self.grace = grace
+        self.reason = None
+        self.interrupted = False
+        self._done = False
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._watch, daemon=True)
+
+    def start(self):
+        self._started = time.monotonic()
+        self._main = threading.get_ident()
+        self._previous = None
+        if hasattr(signal, 'pthread_kill'):
+            self._previous = signal.signal(signal.SIGUSR1, self._on_signal)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """回测结束，停止看门狗，此后不会再中断主线程"""
+        try:
+            with self._lock:
+                self._done = True
+            self._thread.join()
+        finally:
+            if self._previous is not None:
+                signal.signal(signal.SIGUSR1, self._previous)
+
+    def _on_signal(self, signum, frame):
+        raise KeyboardInterrupt(self.reason)
+
+    def _interrupt(self):
+        self.interrupted = True
+        if self._previous is not None:
+            signal.pthread_kill(self._main, signal.SIGUSR1)
+        else:
+            _thread.interrupt_main()
+
+    def _check(self):
+        job_id = self.reporter.job_id
+        if self.cancels is not None and job_id in self.cancels:
+            return self.cancels[job_id]
+        if self.timeout and time.monotonic() - self._started > self.timeout:
+            return f"超过运行时间上限 {self.timeout:g} 秒"
+        if self.max_rss:
+            rss = current_rss()
+            if rss is not None and rss > self.max_rss:
+                return f"内存占用 {rss / 1024 / 1024:.0f}MB 超过上限 {self.max_rss / 1024 / 1024:.0f}MB"
+        return None
+
+    def _watch(self):
+        stop_at = None
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if self._done:
+                    return
+                if self.reason is None:
+                    self.reason = self._check()
+                    if self.reason is not None:
+                        self.reporter.stop_reason = self.reason
+                        stop_at = time.monotonic()
+                elif time.monotonic() - stop_at > self.grace:
+                    self._interrupt()
+                    return
@@ -0,0 +1,79 @@
+import os
+import sys
+import importlib
+
+
+class StrategyRegistry:
+    """
+    策略注册表
+    缓存每个策略模块及其元数据（paramecfg、parametmp 生成的参数表单 HTML、backengine），
+    只有策略文件或同名 .html 参数模板的修改时间变化时才重新导入。
+    """
+
+    def __init__(self, strategies_dir="strategies", form_builder=None):
+        self.strategies_dir = strategies_dir
+        # 根据 paramecfg 生成参数表单 HTML 的函数
+        self.form_builder = form_builder
+        self.entries = {}
+
+    def names(self):
+        """策略目录下的全部策略名，文件名带 xxx 的脚本不是策略"""
+        return sorted(
+            file[:-3] for file in os.listdir(self.strategies_dir)
+            if file.endswith(".py") and file.find('xxx') < 0
+        )
+
+    def _mtime(self, name):
+        base = os.path.join(self.strategies_dir, name)
+        try:
+            mtime = os.path.getmtime(f"{base}.py")
+        except OSError:
+            return None
+        html = f"{base}.html"
+        return (mtime, os.path.getmtime(html) if os.path.exists(html) else None)
+
+    def _load(self, name, mtime):
+        module_name = f"{self.strategies_dir}.{name}"
+        module = sys.modules.get(module_name)
+        if module is None:
+            module = importlib.import_module(module_name)
+        elif getattr(module, '__registry_mtime__', None) != mtime:
+            # 进程内已导入的模块可能是旧版本，重新加载
+            module = importlib.reload(module)
+        module.__registry_mtime__ = mtime
+
+        params = getattr(module, 'parametmp', None)
+        if params:
+            if callable(params):
+                params = params()
+        else:
+            params = self.form_builder(getattr(module, 'paramecfg'))
+
+        entry = {
+            'name': name,
+            'mtime': mtime,
+            'module': module,
+            'paramecfg': getattr(module, 'paramecfg', None),
+            'backengine': getattr(module, 'backengine', None) or '',
+            'params': params,
+        }
+        self.entries[name] = entry
+        return entry
+
+    def get(self, name: str):
+        """获取策略元数据，文件变化时重新加载，策略不存在时返回 None"""
+        mtime = self._mtime(name)
+        if mtime is None:
+            self.entries.pop(name, None)
+            return None
+        entry = self.entries.get(name)
+        if entry is None or entry['mtime'] != mtime:
+            entry = self._load(name, mtime)
+        return entry
+
+    def list(self):
+        """全部策略的元数据，已删除的策略从缓存中移除"""
+        names = self.names()
+        for name in set(self.entries) - set(names):
+            del self.entries[name]
+        return [entry for entry in (self.get(name) for name in names) if entry is not None]
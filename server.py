@@ -1,14 +1,38 @@
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, StreamingResponse, FileResponse
 from pydantic import BaseModel
 from typing import Optional
-from core.backtest_engine import StrategyRunner
-import os, json
+from core.backtest_engine import StrategyRunner, REPORT_FILES
+from core.job_queue import JobManager
+import os, re, json, asyncio
+from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware 
 
-app = FastAPI()
+
+# 回测任务队列，工作进程数由环境变量 BACKTEST_WORKERS 配置；
+# 在服务启动时创建，导入 server 模块（uvicorn 重载、启动耗时分析等工具）时不会启动进程池和 Manager
+job_manager = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global job_manager
+    # 已设置的实例（如测试中注入的）直接使用，由设置方负责关闭
+    owned = job_manager is None
+    if owned:
+        job_manager = JobManager()
+    try:
+        yield
+    finally:
+        if owned:
+            # 服务关闭时停止进程池并删除共享内存中的行情数据
+            job_manager.shutdown()
+            job_manager = None
+
+
+app = FastAPI(lifespan=lifespan)
 # 配置并添加 CORS 中间件
 app.add_middleware(
     CORSMiddleware,
@@ -36,6 +60,15 @@ templates = Jinja2Templates(directory="templates")
 class BacktestRequest(BaseModel):
     strategy_name: str
     params: Optional[dict] = {}
+    force_refresh: Optional[bool] = False
+    # 'lazy' 时报告推迟到首次打开时生成
+    report_mode: Optional[str] = None
+
+class SweepRequest(BaseModel):
+    strategy_name: str
+    params: Optional[dict] = {}
+    grid: dict
+    rank_by: Optional[str] = 'sharpe'
 
 @app.get("/", response_class=HTMLResponse)
 async def get_strategy_manager(request: Request):
@@ -44,20 +77,110 @@ async def get_strategy_manager(request: Request):
 
 @app.post("/api/backtest")
 async def run_backtest(request: BacktestRequest):
-    """执行策略回测并保存记录"""
-    # 执行回测
-    result = runner.run_backtest(
-        strategy_name=request.strategy_name,
-        **request.params
-    )
-    return result
+    """提交策略回测任务，立即返回任务ID"""
+    job_id = job_manager.submit(request.strategy_name, request.params, force_refresh=request.force_refresh,
+                                report_mode=request.report_mode)
+    return {"job_id": job_id, "status": "queued"}
+
+@app.post("/api/sweep")
+async def run_sweep(request: SweepRequest):
+    """提交参数扫描，行情数据只加载一次，各参数组合并行回测"""
+    try:
+        sweep_id = job_manager.submit_sweep(request.strategy_name, request.params, request.grid, request.rank_by)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"sweep_id": sweep_id, "status": "preparing"}
+
+@app.get("/api/sweeps/{sweep_id}")
+async def get_sweep(sweep_id: str):
+    """获取参数扫描进度和按指标排序的结果表"""
+    sweep = job_manager.get_sweep(sweep_id)
+    if sweep is None:
+        raise HTTPException(status_code=404, detail="Sweep not found")
+    return sweep
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """获取回测任务状态和结果路径"""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.post("/api/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """取消回测任务，运行中的任务在下一根K线停止，原因和停止时的进度记录在任务结果中"""
+    cancelled = job_manager.cancel(job_id)
+    if cancelled is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if not cancelled:
+        raise HTTPException(status_code=409, detail="Job already finished")
+    return job_manager.get(job_id)
+
+@app.get("/api/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """以 SSE 推送回测任务的实时进度，任务结束后关闭"""
+    if job_manager.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def stream():
+        last = None
+        while True:
+            job = job_manager.get(job_id)
+            if job is None:
+                # 已结束的任务可能在推送过程中被淘汰
+                break
+            data = json.dumps(job, default=str)
+            if data != last:
+                yield f"data: {data}\n\n"
+                last = data
+            if job["status"] not in ("queued", "running"):
+                break
+            await asyncio.sleep(0.5)
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+@app.get("/api/shared-data")
+async def get_shared_data():
+    """共享内存中的行情数据占用"""
+    return job_manager.shared_data.stats()
 
 @app.get("/api/records")
-async def get_records(strategies_name: str):
-    """获取回测记录列表"""
-    res = runner.load_all_results(strategies_name)
+async def get_records(strategies_name: str, page: int = 1, page_size: int = 50,
+                      sort: str = "timestamp", order: str = "desc", params: Optional[str] = None):
+    """分页获取回测记录列表，params 为 JSON 格式的参数过滤条件，如 {"n1": 10}"""
+    try:
+        filters = json.loads(params) if params else None
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"params 不是有效的 JSON: {e}")
+    if params and not isinstance(filters, dict):
+        raise HTTPException(status_code=400, detail="params 必须是 JSON 对象，如 {\"n1\": 10}")
+    try:
+        res = runner.load_all_results(strategies_name, page, page_size, sort, order, filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return res
 
+@app.get("/api/records/cancelled")
+async def get_cancelled_records(strategies_name: str, limit: int = 50):
+    """最近提前结束的回测及其原因"""
+    return {"items": runner.load_cancellations(strategies_name, limit)}
+
+@app.get("/api/reports/{strategy_name}/{result_id}/{kind}")
+async def get_report(strategy_name: str, result_id: str, kind: str):
+    """打开回测报告，报告尚未生成时在进程池中生成并缓存"""
+    if kind not in REPORT_FILES or not re.fullmatch(r"\w+", strategy_name) or not re.fullmatch(r"\w+", result_id):
+        raise HTTPException(status_code=404, detail="Report not found")
+    path = runner.report_path(strategy_name, result_id, kind)
+    if not os.path.exists(path):
+        if not os.path.exists(os.path.join("results", strategy_name, f"{result_id}.json")):
+            raise HTTPException(status_code=404, detail="Result not found")
+        try:
+            path = await asyncio.wrap_future(job_manager.render_report(strategy_name, result_id, kind))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Report rendering failed: {e}")
+    return FileResponse(path, media_type="text/html")
+
 @app.get("/api/strategies")
 async def list_strategies():
     """获取可用策略列表"""
@@ -68,11 +191,10 @@ async def list_strategies():
 @app.get("/api/strategies/{strategy_name}/params")
 async def get_strategy_params(strategy_name: str):
     """获取策略参数配置"""
-    strategies = runner.get_strategies()
-    for strategy in strategies:
-        if strategy['name'] == strategy_name:
-            return {"params": strategy['params']}
-    raise HTTPException(status_code=404, detail="Strategy not found")
+    strategy = runner.get_strategy(strategy_name)
+    if strategy is None:
+        raise HTTPException(status_code=404, detail="Strategy not found")
+    return {"params": strategy['params']}
 
 
 
@@ -84,5 +206,13 @@ async def auth(phone, code):
 
 
 if __name__ == '__main__':
-    import uvicorn
-    uvicorn.run("server:app", host="0.0.0.0", port=9000, reload=True, workers=1)
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--profile-startup', action='store_true', help='输出按模块统计的启动导入耗时报告后退出')
+    args = parser.parse_args()
+    if args.profile_startup:
+        from utils.startup_profile import profile_startup
+        profile_startup()
+    else:
+        import uvicorn
+        uvicorn.run("server:app", host="0.0.0.0", port=9000, reload=True, workers=1)
@@ -4,7 +4,9 @@ import numpy as np
 import backtrader as bt
 from backtrader.feeds import PandasData
 
-from utils.data_feed_utils import FuturesDataFeed, engine
+from utils.data_feed_utils import FuturesDataFeed, mark_price_bars
+from utils.market_data import read_market_data, feed_columns
+from utils.vector_signals import sma, crossover
 
 
 backengine = 'backtrader'
@@ -28,6 +30,14 @@ paramecfg = {
     'code': {
         'type': str,
         'default': ''
+    },
+    'n1': {
+        'type': int,
+        'default': 10
+    },
+    'n2': {
+        'type': int,
+        'default': 20
     }
 }
 
@@ -73,6 +83,13 @@ class VolumeBuySell(bt.observers.BuySell):
           
 # VolSma 策略
 class FVolSma(bt.Strategy):
+    params = (('n1', 10), ('n2', 20),)
+    vector_engine = 'signal'
+
+    @staticmethod
+    def vector_signals(data, p):
+        cross = data.tick(crossover(sma(data.volume, p.n1), sma(data.volume, p.n2)))
+        return cross > 0, cross < 0
     
     def __init__(self):
         pass
@@ -80,8 +97,8 @@ class FVolSma(bt.Strategy):
         # 成交量
         self.vol = self.data.volume
         
-        sma1 = bt.indicators.SMA(self.vol, period=10)
-        sma2 = bt.indicators.SMA(self.vol, period=20)
+        sma1 = bt.indicators.SMA(self.vol, period=self.p.n1)
+        sma2 = bt.indicators.SMA(self.vol, period=self.p.n2)
         self.crossover = bt.indicators.CrossOver(sma1, sma2)
         # sma1.plotinfo.plotid = 'volsma1'
         # sma2.plotinfo.plotid = 'volsma2'
@@ -134,24 +151,25 @@ class FVolSma(bt.Strategy):
 
     
 class DataFeed:
+    extra_columns = ['date', 'exchange', 'instrument_name', 'expiration_date']
+
     def __init__(self, paramecfg={}):
         self.code = ''
         self.begin_time = paramecfg.get('begin_time', '2025-09-01') 
         self.end_time = paramecfg.get('end_time', '2025-09-05')
+        self.get_date_db()
 
     def get_strategy_params(self):
         return {}
 
+    def get_date_db(self):
+        # 按天缓存在本地，只有缓存中缺失的日期才查询数据库
+        columns = feed_columns('crypto_futures_5m', FuturesDataFeed, self.extra_columns)
+        self.df = read_market_data('crypto_futures_5m', self.begin_time, self.end_time,
+                                   columns=columns, convert=mark_price_bars)
+
     def add_data_to_engine(self, cerebro, datas=[]):
-        sql = f"""
-        select * from crypto_futures_5m where datetime >= '{self.begin_time}' and datetime < '{self.end_time}'
-        """
-        df = pd.read_sql(sql, engine)
-        df['close'] = df['mark_price']
-        df['open'] = df['close']
-        df['high'] = df['close']
-        df['low'] = df['close']
-        dfs = df.groupby(['exchange', 'instrument_name', 'expiration_date'])
+        dfs = self.df.groupby(['exchange', 'instrument_name', 'expiration_date'], observed=True)
         
         n = 0
         dfss = []
@@ -3,9 +3,11 @@ import pandas as pd
 import numpy as np
 import backtrader as bt
 from backtrader.feeds import PandasData
-from sqlalchemy import create_engine
 
-from utils.data_feed_utils import OptionsDataFeed, engine
+from utils.data_feed_utils import OptionsDataFeed, mark_price_bars
+from utils.market_data import read_market_data, feed_columns
+from utils.instrument_selector import InstrumentSelector
+from utils.vector_signals import sma, crossover
 
 
 
@@ -31,16 +33,31 @@ paramecfg = {
     'code': {
         'type': str,
         'default': ''
+    },
+    'n1': {
+        'type': int,
+        'default': 10
+    },
+    'n2': {
+        'type': int,
+        'default': 20
     }
 }
 
 # VolSma 策略
 class OSmaCross(bt.Strategy):
+    params = (('n1', 10), ('n2', 20),)
+    vector_engine = 'signal'
+
+    @staticmethod
+    def vector_signals(data, p):
+        cross = data.tick(crossover(sma(data.close, p.n1), sma(data.close, p.n2)))
+        return cross > 0, cross < 0
     
     def __init__(self):
         pass
-        sma1 = bt.indicators.SMA(period=10)
-        sma2 = bt.indicators.SMA(period=20)
+        sma1 = bt.indicators.SMA(period=self.p.n1)
+        sma2 = bt.indicators.SMA(period=self.p.n2)
         self.crossover = bt.indicators.CrossOver(sma1, sma2)
     def prenext(self):
         self.next()         # 执行next()方法，实现买入/卖出逻辑
@@ -79,28 +96,27 @@ class OSmaCross(bt.Strategy):
 
     
 class DataFeed:
+    extra_columns = ['date', 'exchange', 'instrument_name', 'expiration_date']
+    # add_data_to_engine 只使用前 3 个看涨期权合约（按 exchange、instrument_name、expiration_date 排序）
+    selector = InstrumentSelector(claim_type='call', top_n=3, rank_by=None)
+
     def __init__(self, paramecfg = {}):
         self.code = ''
         self.begin_time = paramecfg.get('begin_time', '2025-01-01') 
         self.end_time = paramecfg.get('end_time', '2025-01-02')
+        self.get_date_db()
 
 
     def get_strategy_params(self):
         return {}
 
+    def get_date_db(self):
+        columns = feed_columns('crypto_options_5m', OptionsDataFeed, self.extra_columns)
+        self.df = read_market_data('crypto_options_5m', self.begin_time, self.end_time,
+                                   columns=columns, convert=mark_price_bars, selector=self.selector)
+
     def add_data_to_engine(self, cerebro, datas=[]):
-        sql = f"""
-select * from crypto_options_5m 
-where datetime >= '{self.begin_time}' 
-and datetime < '{self.end_time}' 
-and claim_type='call'
-        """
-        df = pd.read_sql(sql, engine)
-        df['close'] = df['mark_price']
-        df['open'] = df['mark_price']
-        df['high'] = df['mark_price']
-        df['low'] = df['mark_price']
-        dfs = df.groupby(['exchange', 'instrument_name', 'expiration_date'])
+        dfs = self.df.groupby(['exchange', 'instrument_name', 'expiration_date'], observed=True)
         
         n = 0
         for i, df in dfs:
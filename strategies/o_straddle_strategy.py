@@ -3,7 +3,6 @@ import pandas as pd
 import numpy as np
 import backtrader as bt
 from backtrader.feeds import PandasData
-from sqlalchemy import create_engine
 import pytz
 import os, sys
 import math
@@ -12,10 +11,24 @@ import datetime as dt
 from pydantic import BaseModel, Field
 
 try:
-    from utils.data_feed_utils import  engine
+    from utils.market_data import read_market_data
+    from utils.array_feed import ArrayData
+    from utils.frame_compact import exact_float64
+    from utils.time_utils import normalize_timestamps
+    from utils.csv_loader import load_daily_csv
+    from utils.option_chain import OptionChainIndex
+    from utils.schedule_triggers import ScheduleTriggers
+    from utils.position_book import OptionPosition, PositionBook, TradeLog, minute_text, rounded
 except Exception as e:
     sys.path.append('../')
-    from utils.data_feed_utils import  engine
+    from utils.market_data import read_market_data
+    from utils.array_feed import ArrayData
+    from utils.frame_compact import exact_float64
+    from utils.time_utils import normalize_timestamps
+    from utils.csv_loader import load_daily_csv
+    from utils.option_chain import OptionChainIndex
+    from utils.schedule_triggers import ScheduleTriggers
+    from utils.position_book import OptionPosition, PositionBook, TradeLog, minute_text, rounded
 
 
 class param(BaseModel):
@@ -43,6 +56,11 @@ paramecfg = {
         'type': dt.datetime,
         'default': dt.datetime.strptime('2025-01-02 16:00:00', '%Y-%m-%d %H:%M:%S')
     },
+    # 调度时间点没有期权链快照时，使用不早于该时间多少秒内的最近快照，0 表示只用精确匹配的快照
+    'chain_tolerance': {
+        'type': int,
+        'default': 0
+    },
     'schedule' : [
         (dt.time(16, 5), 1/3), (dt.time(20, 0), 1/12), (dt.time(0, 0), 1/12),
         (dt.time(4, 0), 1/12), (dt.time(8, 0), 1/12), (dt.time(12, 0), 1/3)
@@ -77,6 +95,23 @@ SCHEDULE = [
     (dt.time(4, 0), 1/12), (dt.time(8, 0), 1/12), (dt.time(12, 0), 1/3)
 ]
 
+def parse_schedule(schedule):
+    """把 [['16:05', 0.1], ...] 形式的调度表转换为 [(dt.time(16, 5), 0.1), ...]，已转换的条目保持不变"""
+    parsed = []
+    for sched_time, portion in schedule:
+        if not isinstance(sched_time, dt.time):
+            sched_time = dt.time.fromisoformat(sched_time)
+        parsed.append((sched_time, float(portion)))
+    return parsed
+
+# 交易记录导出的列：(列名, 字段, 格式化)，结算时只记录原始值，导出时再格式化
+TRADE_LOG_EXPORT = [
+    ('Entry UTC', 'entry_dt', minute_text), ('Exit UTC', 'exit_dt', minute_text),
+    ('Strike', 'strike', None), ('Size', 'size', rounded(4)),
+    ('Start Spot', 'entry_spot', rounded(2)), ('End Spot', 'exit_spot', rounded(2)),
+    ('Total P/L ($)', 'pnl', rounded(2)),
+]
+
 # ==========================================
 # 2. DATA LOADERS
 # ==========================================
@@ -93,27 +128,19 @@ def get_required_filenames(start_hkt, end_hkt):
         current_date += dt.timedelta(days=1)
     return file_paths
 
+# CSV 中需要的列和解析时的类型，时间列在读取后统一转换
+CSV_DTYPES = {
+    'date': 'int64', 'underlyer_spot': 'float64', 'expiration_date': 'str', 'claim_type': 'category',
+    'strike': 'float64', 'best_ask_price': 'float64', 'ask_iv': 'float64', 'datetime': 'str',
+}
+
 def load_and_merge_data(file_paths):
-    df_list = []
-    use_cols = [
-        'date', 'underlyer_spot', 'expiration_date', 'claim_type', 
-        'strike', 'best_ask_price', 'ask_iv', 'datetime'
-    ]
     print(f"\n--- Loading Files ---")
-    for path in file_paths:
-        if os.path.exists(path):
-            print(f"Loading: {path}")
-            try:
-                df_temp = pd.read_csv(path, usecols=use_cols)
-                df_list.append(df_temp)
-            except Exception as e:
-                print(f"Error reading {path}: {e}")
-    
-    if not df_list: return None
-    df_master = pd.concat(df_list, ignore_index=True)
-    df_master['datetime_idx'] = pd.to_datetime(df_master['date'], unit='ms').dt.tz_localize('UTC')
+    # 各日期文件并发解析，合并后按毫秒时间戳排序
+    df_master = load_daily_csv(file_paths, columns=list(CSV_DTYPES), dtypes=CSV_DTYPES, sort_by='date')
+    if df_master is None: return None
+    df_master = normalize_timestamps(df_master, epoch_column='date')
     df_master.set_index('datetime_idx', inplace=True)
-    df_master.sort_index(inplace=True)
     return df_master
 
 # ==========================================
@@ -149,14 +176,19 @@ class PnLIndicator(bt.Indicator):
 # ==========================================
 
 class OStraddleStrategy(bt.Strategy):
-    params = (('df_market', None), ('schedule', None),)
+    params = (('df_market', None), ('schedule', None), ('chain_tolerance', 0),)
+    vector_engine = 'straddle'
 
     def __init__(self):
         self.df = self.p.df_market
+        # 按时间、到期日、行权价预先建立索引，调度时二分查找 ATM 合约
+        self.chain = OptionChainIndex(self.df)
+        self.chain_tolerance = float(self.p.chain_tolerance or 0) or None
         self.spot = self.datas[0]
-        self.schedule = SCHEDULE
+        self.schedule = parse_schedule(self.p.schedule) if self.p.schedule else SCHEDULE
         print(self.schedule)
-        
+        # 回测前按时钟数据的时间算出全部调度触发的K线，next() 只在触发K线和到期K线上做处理
+        self.triggers = ScheduleTriggers(self.schedule, self.spot.p.dataname.index, tz=HKT)
         
         print(self.df.head().to_dict('records'))
         
@@ -165,9 +197,9 @@ class OStraddleStrategy(bt.Strategy):
         self.pnl_plot = PnLIndicator(self.spot)
         
         # State Tracking
-        self.open_positions = []
-        self.trade_log = []
-        self.last_trade_signature = None
+        self.book = PositionBook()
+        self.trade_log = TradeLog(TRADE_LOG_EXPORT)
+        self.next_expiry_num = math.inf  # 最早到期持仓的 date2num 数值
         self.cum_pnl = 0.0
 
     def next(self):
@@ -178,25 +210,26 @@ class OStraddleStrategy(bt.Strategy):
         # 2. Update PnL Line
         self.pnl_plot.lines.pnl[0] = self.cum_pnl
 
-        # 3. Strategy Logic
-        current_dt_utc = self.spot.datetime.datetime(0).replace(tzinfo=pytz.utc)
-        current_dt_hkt = current_dt_utc.astimezone(HKT)
-        
-        self.process_expiries(current_dt_utc)
-        self.check_schedule(current_dt_hkt, current_dt_utc)
+        # 3. Strategy Logic，大部分K线既不到期也不触发调度，只比较两个数值
+        now = self.spot.datetime[0]
+        if now >= self.next_expiry_num:
+            self.process_expiries(self.spot.datetime.datetime(0).replace(tzinfo=pytz.utc))
+        if now >= self.triggers.next_num:
+            for current_dt_utc, portion in self.triggers.pop(now):
+                self.execute_straddle(current_dt_utc, portion)
 
     def process_expiries(self, current_dt_utc):
-        active_positions = []
-        for pos in self.open_positions:
-            if current_dt_utc >= pos['expiry_dt']:
-                self.settle_position(pos, current_dt_utc)
-            else:
-                active_positions.append(pos)
-        self.open_positions = active_positions
+        for pos in self.book.pop_due(current_dt_utc):
+            self.settle_position(pos, current_dt_utc)
+        self.update_next_expiry()
+
+    def update_next_expiry(self):
+        expiry = self.book.next_expiry
+        self.next_expiry_num = math.inf if expiry is None else bt.date2num(expiry)
 
     def settle_position(self, pos, current_dt_utc):
         settlement_spot = self.spot.close[0]
-        strike = float(pos['strike'])
+        strike = float(pos.strike)
         
         # --- PLOT EXIT MARKER ---
         self.markers.lines.sell_exit[0] = settlement_spot
@@ -205,61 +238,33 @@ class OStraddleStrategy(bt.Strategy):
         call_payoff = max(0.0, settlement_spot - strike)
         put_payoff = max(0.0, strike - settlement_spot)
         
-        call_cost = pos['call_ask'] * pos['entry_spot'] * pos['size']
-        put_cost = pos['put_ask'] * pos['entry_spot'] * pos['size']
+        call_cost = pos.call_ask * pos.entry_spot * pos.size
+        put_cost = pos.put_ask * pos.entry_spot * pos.size
         
-        total_pnl = ((call_payoff + put_payoff) * pos['size']) - (call_cost + put_cost)
+        total_pnl = ((call_payoff + put_payoff) * pos.size) - (call_cost + put_cost)
         
         self.broker.setcash(self.broker.getcash() + total_pnl + (call_cost + put_cost)) # Simply add net P/L impact
         self.cum_pnl += total_pnl
         self.pnl_plot.lines.pnl[0] = self.cum_pnl # Update immediately
 
-        record = {
-            'Entry UTC': pos['entry_dt'].strftime('%Y-%m-%d %H:%M'),
-            'Exit UTC': current_dt_utc.strftime('%Y-%m-%d %H:%M'),
-            'Strike': strike,
-            'Size': round(pos['size'], 4),
-            'Start Spot': round(pos['entry_spot'], 2),
-            'End Spot': round(settlement_spot, 2),
-            'Total P/L ($)': round(total_pnl, 2),
-        }
-        self.trade_log.append(record)
+        self.trade_log.append(
+            entry_dt=pos.entry_dt, exit_dt=current_dt_utc, strike=strike, size=pos.size,
+            entry_spot=pos.entry_spot, exit_spot=settlement_spot, pnl=total_pnl,
+        )
         print(f"[SETTLE] Strike {strike} | P/L: ${total_pnl:,.2f}")
 
-    def check_schedule(self, current_dt_hkt, current_dt_utc):
-        current_time = current_dt_hkt.time()
-        for sched_time, portion in self.schedule:
-            if current_time.hour == sched_time.hour:
-                if sched_time.minute <= current_time.minute < (sched_time.minute + 5):
-                    sig = f"{current_dt_hkt.date()}_{sched_time.hour}:{sched_time.minute}"
-                    if self.last_trade_signature != sig:
-                        self.execute_straddle(current_dt_utc, portion)
-                        self.last_trade_signature = sig
-
     def execute_straddle(self, current_dt_utc, portion):
-        # Data Slicing & Strike Logic
-        df_now = self.df[self.df.index == current_dt_utc]
-        if df_now.empty: return
+        # 最近到期日上的 ATM 行权价及看涨、看跌卖一价
         current_spot = self.spot.close[0]
-        
-        future_mask = df_now['expiration_date'] > current_dt_utc
-        valid_expiries = df_now.loc[future_mask, 'expiration_date'].unique()
-        if len(valid_expiries) == 0: return
-        target_expiry = min(valid_expiries)
-        
-        df_exp = df_now[df_now['expiration_date'] == target_expiry].copy()
-        df_exp['dist'] = abs(df_exp['strike'] - current_spot)
-        best_row = df_exp.sort_values('dist').iloc[0]
-        target_strike = best_row['strike']
-        
-        legs = df_exp[df_exp['strike'] == target_strike]
-        try:
-            call_row = legs[legs['claim_type'] == 'call'].iloc[0]
-            put_row = legs[legs['claim_type'] == 'put'].iloc[0]
-        except IndexError: return 
-        
-        call_ask = call_row['best_ask_price']
-        put_ask = put_row['best_ask_price']
+        quote = self.chain.atm_straddle(current_dt_utc, current_spot, self.chain_tolerance)
+        if quote is None:
+            print(f"[SKIP] {current_dt_utc} 没有可用的期权链快照或未到期合约")
+            return
+        target_expiry = quote.expiry
+        target_strike = quote.strike
+
+        call_ask = quote.call_ask
+        put_ask = quote.put_ask
         if (pd.isna(call_ask) or call_ask <= 0) or (pd.isna(put_ask) or put_ask <= 0): return
 
         premium_btc = call_ask + put_ask
@@ -273,22 +278,21 @@ class OStraddleStrategy(bt.Strategy):
         # --- PLOT ENTRY MARKER ---
         self.markers.lines.buy_entry[0] = current_spot
 
-        pos = {
-            'entry_dt': current_dt_utc, 'expiry_dt': target_expiry,
-            'strike': target_strike, 'size': size, 'entry_spot': current_spot,
-            'call_ask': call_ask, 'put_ask': put_ask
-        }
-        self.open_positions.append(pos)
+        self.book.add(OptionPosition(
+            entry_dt=current_dt_utc, expiry_dt=target_expiry, strike=target_strike, size=size,
+            entry_spot=current_spot, call_ask=call_ask, put_ask=put_ask,
+        ))
+        self.update_next_expiry()
         print(f"[EXECUTE] Strike {target_strike} | Size {size:.4f}")
 
     def stop(self):
         if self.trade_log:
             pass
-            # pd.DataFrame(self.trade_log).to_csv('straddle_output.csv', index=False)
+            # self.trade_log.to_frame().to_csv('straddle_output.csv', index=False)
             # print("✅ Output saved to straddle_output.csv")
 
 
-class SpotClockData(bt.feeds.PandasData):
+class SpotClockData(ArrayData):
     params = (('datetime', None), ('close', 'spot'), ('open', -1), ('high', -1), ('low', -1), ('volume', -1), ('openinterest', -1),)
 
     
@@ -298,24 +302,22 @@ class DataFeed:
         self.begin_time = pd.to_datetime(paramecfg.get('begin_time', '2025-01-01 00:00:00'))
         self.end_time = pd.to_datetime(paramecfg.get('end_time', '2025-01-02 00:00:00'))
         sch = paramecfg.get('schedule')
-        for x in sch:
-            dummy_date_time_str = f"1900-01-01 {x[0]}"
-            datetime_format = "%Y-%m-%d %H:%M"
-            datetime_object = dt.datetime.strptime(dummy_date_time_str, datetime_format)
-            time_object = datetime_object.time()
-            x[0] = time_object
-        print(sch)
-        global SCHEDULE 
-        SCHEDULE = sch
-        
+        self.schedule = parse_schedule(sch) if sch else SCHEDULE
+        print(self.schedule)
 
         self.get_date_db()
 
     def get_strategy_params(self):
         return {
             'df_market': self.df,
+            'schedule': self.schedule,
         }
 
+    @staticmethod
+    def convert_chunk(df):
+        """逐块把到期日、时间列转换为 UTC 时间，并由毫秒时间戳生成索引列"""
+        return normalize_timestamps(df, epoch_column='date')
+
     def get_date_db(self):
         start_utc_slice = HKT.localize(self.begin_time).astimezone(pytz.utc)
         end_utc_slice = HKT.localize(self.end_time).astimezone(pytz.utc)
@@ -324,28 +326,21 @@ class DataFeed:
             'date', 'underlyer_spot', 'expiration_date', 'claim_type', 
             'strike', 'best_ask_price', 'ask_iv', 'datetime'
         ]
-        cols = ', '.join(use_cols)
-        sql = f"""
-select {cols} from crypto_options_5m 
-where datetime >= '{start_utc_slice}' 
-and datetime <= '{end_utc_slice}' 
-and exchange = 'binance'
-and underlyer = 'BTC_usd'
-        """
-        df = pd.read_sql(sql, engine)
-        df['expiration_date'] = df['expiration_date'].map(lambda x: x.isoformat())
-        df['datetime'] = df['datetime'].map(lambda x: x.strftime('%Y-%m-%d %H:%M:%S'))
-        print(df.head().to_dict('records'))
-        df['datetime_idx'] = pd.to_datetime(df['date'], unit='ms').dt.tz_localize('UTC')
-        df.set_index('datetime_idx', inplace=True)
-        df.sort_index(inplace=True)  
-        
-        
+        # 分块读取并转换，不再整体复制多次
+        df = read_market_data(
+            'crypto_options_5m', start_utc_slice, end_utc_slice,
+            exchange='binance', underlyer='BTC_usd', columns=use_cols, inclusive_end=True,
+            convert=self.convert_chunk, compact=True, index='datetime_idx',
+        )
+        if not df.index.is_monotonic_increasing:
+            df.sort_index(inplace=True)
         print(df.head().to_dict('records'))
         
-        df = df[(df.index >= start_utc_slice) & (df.index <= end_utc_slice)]
-        df['expiration_date'] = pd.to_datetime(df['expiration_date'])
+        mask = (df.index >= start_utc_slice) & (df.index <= end_utc_slice)
+        if not mask.all():
+            df = df[mask]
         df_spot = df[~df.index.duplicated(keep='first')][['underlyer_spot']].rename(columns={'underlyer_spot': 'spot'})
+        df_spot['spot'] = exact_float64(df_spot['spot'])
         self.df = df
         self.df_spot = df_spot 
         
@@ -3,8 +3,17 @@ import pandas as pd
 import datetime as dt
 import pytz
 import os
+import sys
 import math
 
+try:
+    from utils.time_utils import normalize_timestamps
+    from utils.csv_loader import load_daily_csv
+except Exception as e:
+    sys.path.append('../')
+    from utils.time_utils import normalize_timestamps
+    from utils.csv_loader import load_daily_csv
+
 # ==========================================
 # 1. CONFIGURATION
 # ==========================================
@@ -37,30 +46,22 @@ def get_required_filenames(start_hkt, end_hkt):
         current_date += dt.timedelta(days=1)
     return file_paths
 
+# CSV 中需要的列和解析时的类型，时间列在读取后统一转换
+CSV_DTYPES = {
+    'date': 'int64', 'underlyer_spot': 'float64', 'expiration_date': 'str', 'claim_type': 'category',
+    'strike': 'float64', 'best_ask_price': 'float64', 'ask_iv': 'float64', 'datetime': 'str',
+}
+
 def load_and_merge_data(file_paths):
-    df_list = []
-    use_cols = [
-        'date', 'underlyer_spot', 'expiration_date', 'claim_type', 
-        'strike', 'best_ask_price', 'ask_iv', 'datetime'
-    ]
     print(f"\n--- Loading Files ---")
-    for path in file_paths:
-        if os.path.exists(path):
-            print(f"Loading: {path}")
-            try:
-                df_temp = pd.read_csv(path, usecols=use_cols)
-                df_list.append(df_temp)
-            except Exception as e:
-                print(f"Error reading {path}: {e}")
-    
-    if not df_list: return None
-    df_master = pd.concat(df_list, ignore_index=True)
+    # 各日期文件并发解析，合并后按毫秒时间戳排序
+    df_master = load_daily_csv(file_paths, columns=list(CSV_DTYPES), dtypes=CSV_DTYPES, sort_by='date')
+    if df_master is None: return None
     
     print(df_master.head().to_dict('records'))
     
-    df_master['datetime_idx'] = pd.to_datetime(df_master['date'], unit='ms').dt.tz_localize('UTC')
+    df_master = normalize_timestamps(df_master, epoch_column='date')
     df_master.set_index('datetime_idx', inplace=True)
-    df_master.sort_index(inplace=True)
     return df_master
 
 # ==========================================
@@ -256,7 +257,6 @@ def run_strategy():
     start_utc_slice = HKT.localize(TARGET_START_HKT).astimezone(pytz.utc)
     end_utc_slice = HKT.localize(TARGET_END_HKT).astimezone(pytz.utc)
     df = df[(df.index >= start_utc_slice) & (df.index <= end_utc_slice)]
-    df['expiration_date'] = pd.to_datetime(df['expiration_date'])
     df_spot = df[~df.index.duplicated(keep='first')][['underlyer_spot']].rename(columns={'underlyer_spot': 'spot'})
 
 
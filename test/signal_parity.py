@@ -0,0 +1,131 @@
+"""
+信号策略（FSmaCross、OSmaCross、FVolSma、FNewTest）的 backtrader 回测与向量化引擎对比
+用法: python test/signal_parity.py [天数]
+用各策略自己的 DataFeed.add_data_to_engine 加载构造的 5 分钟K线（不查询数据库），
+分别用 backtrader 和 core.vector_runer.signal_engine 回测，校验成交、每根K线的净值、分析器指标和日收益一致，并比较耗时
+"""
+import io
+import os
+import sys
+import time
+import contextlib
+import numpy as np
+import pandas as pd
+import backtrader as bt
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.backtrader_runer import build_cerebro, get_analyzer_stats
+from core.vector_runer import signal_engine, load_feeds
+import strategies.f_sma_cross as f_sma_cross
+import strategies.o_sma_cross as o_sma_cross
+import strategies.f_vol_sma as f_vol_sma
+import strategies.f_new_test as f_new_test
+
+PARAMS = {'cash': 500000, 'commission': 0.002, 'n1': 10, 'n2': 20}
+
+
+class ValueRecorder(bt.Analyzer):
+    """记录每个 tick 上 broker 的净值和每笔成交"""
+
+    def start(self):
+        self.values = []
+        self.fills = []
+
+    def notify_order(self, order):
+        if order.status in [order.Completed, order.Partial]:
+            self.fills.append((order.executed.size, order.executed.price))
+
+    def next(self):
+        self.values.append(self.strategy.broker.getvalue())
+
+
+def make_bars(days, instruments, seed, freq='5min'):
+    """
+    构造 mark_price_bars 之后的K线：价格按 0.5 取整、成交量取小整数，均线经常相等，覆盖差为 0 的情形；
+    多个合约的起止时间不同，覆盖多数据源的时钟并集和 data0 开始前的 tick。freq 为K线周期
+    """
+    rng = np.random.default_rng(seed)
+    frames = []
+    for k in range(instruments):
+        start = pd.Timestamp('2025-01-01', tz='UTC') + pd.Timedelta(minutes=5 * 7 * k)
+        times = pd.date_range(start, periods=days * (pd.Timedelta('1D') // pd.Timedelta(freq)) - 11 * k, freq=freq)
+        price = np.round((95000 + np.cumsum(rng.normal(0, 40, len(times)))) * 2) / 2
+        frames.append(pd.DataFrame({
+            'datetime': times, 'date': times.normalize(), 'exchange': 'deribit',
+            'instrument_name': f"BTC-{k}", 'expiration_date': pd.Timestamp('2026-01-01', tz='UTC'),
+            'mark_price': price, 'open': price, 'high': price, 'low': price, 'close': price,
+            'volume': rng.integers(0, 4, len(times)).astype(float), 'volume_usd': 0.0, 'open_interest': 0.0,
+            'underlyer_spot': price, 'bid': price, 'ask': price,
+        }))
+    # 第一个合约晚于其他合约开始
+    frames[0] = frames[0].iloc[23:] if instruments > 1 else frames[0]
+    return pd.concat(frames, ignore_index=True)
+
+
+def synthetic_feed(module, df):
+    class SyntheticDataFeed(module.DataFeed):
+        def get_date_db(self):
+            self.df = df.copy()
+    return SyntheticDataFeed({})
+
+
+def run_backtrader(StrategyClass, module, df):
+    with contextlib.redirect_stdout(io.StringIO()):
+        cerebro = build_cerebro(StrategyClass, module, datafeed=synthetic_feed(module, df), **PARAMS)
+        cerebro.addanalyzer(ValueRecorder, _name='recorder')
+        start = time.perf_counter()
+        strat = cerebro.run()[0]
+        elapsed = time.perf_counter() - start
+    returns = strat.analyzers.getbyname('pyfolio').get_pf_items()[0]
+    return elapsed, strat, get_analyzer_stats(strat), returns
+
+
+def run_vector(StrategyClass, module, df):
+    """返回 (加载数据源耗时, 回测耗时, VectorRun)，参数扫描时数据源只加载一次"""
+    datafeed = synthetic_feed(module, df)
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        datafeed._vector_feeds = load_feeds(datafeed)
+        t_load = time.perf_counter() - start
+        start = time.perf_counter()
+        run = signal_engine(StrategyClass, module, datafeed, float(PARAMS['cash']), PARAMS)
+    return t_load, time.perf_counter() - start, run
+
+
+def check(name, StrategyClass, module, df):
+    t_bt, strat, bt_stats, bt_returns = run_backtrader(StrategyClass, module, df)
+    t_load, t_vec, run = run_vector(StrategyClass, module, df)
+    print(f"{name:10s} backtrader {t_bt:7.3f} s, vector {t_vec:7.3f} s ({t_bt / t_vec:.0f}x)，另加载数据源 {t_load:.3f} s")
+
+    recorder = strat.analyzers.getbyname('recorder')
+    fills = list(zip(run.trade_log.columns.get('size', []), run.trade_log.columns.get('price', [])))
+    if recorder.fills != fills:
+        raise AssertionError(f"{name} 成交不一致: {len(recorder.fills)} 笔 / {len(fills)} 笔")
+    values = np.array(recorder.values)
+    if len(values) != len(run.values) or not np.array_equal(values, run.values):
+        raise AssertionError(f"{name} 净值不一致")
+
+    vec_stats = run.stats()
+    for key, value in bt_stats.items():
+        other = vec_stats[key]
+        if (value is None) != (other is None) or (value is not None and not np.isclose(value, other, rtol=1e-9)):
+            raise AssertionError(f"{name} 指标 {key} 不一致: {value} / {other}")
+    vec_returns = run.returns()
+    if not bt_returns.index.equals(vec_returns.index) or \
+            not np.allclose(bt_returns.to_numpy(), vec_returns.to_numpy(), rtol=1e-12, atol=1e-15):
+        raise AssertionError(f"{name} 日收益不一致")
+    print(f"{'':10s} {len(fills)} 笔成交、{len(values)} 个 tick 的净值一致，最终净值 {run.end_value:,.2f}，指标 {vec_stats}")
+
+
+def main(days):
+    futures = make_bars(days, 1, seed=3)
+    options = make_bars(days, 3, seed=5)
+    print(f"{days} 天，期货K线 {len(futures)} 根，期权K线 {len(options)} 根（3 个合约）")
+    check('FSmaCross', f_sma_cross.FSmaCross, f_sma_cross, futures)
+    check('OSmaCross', o_sma_cross.OSmaCross, o_sma_cross, options)
+    check('FVolSma', f_vol_sma.FVolSma, f_vol_sma, futures)
+    check('FNewTest', f_new_test.FNewTest, f_new_test, futures)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 30)
@@ -0,0 +1,115 @@
+"""
+OStraddleStrategy 的 backtrader 回测与向量化引擎对比
+用法: python test/straddle_parity.py [天数]
+构造 5 分钟期权链，分别用 backtrader 和 core.vector_runer.vector_straddle 回测，
+校验交易记录和盈亏逐分一致、最终净值和分析器指标一致，并比较耗时
+"""
+import io
+import os
+import sys
+import time
+import contextlib
+import datetime as dt
+import numpy as np
+import pandas as pd
+import backtrader as bt
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.vector_runer import vector_straddle
+from core.backtrader_runer import get_analyzer_stats
+from utils.option_chain import OptionChainIndex
+from utils.position_book import TradeLog
+from strategies.o_straddle_strategy import OStraddleStrategy, SpotClockData, TRADE_LOG_EXPORT, HKT
+
+CASH = 1_000_000
+SCHEDULE = [
+    (dt.time(16, 5), 0.1), (dt.time(20, 0), 0.1), (dt.time(0, 0), 0.1),
+    (dt.time(4, 0), 0.1), (dt.time(8, 0), 0.3), (dt.time(12, 0), 0.3),
+]
+
+
+def make_chain(days, seed=11):
+    """每天 08:00 UTC 到期，行权价 1000 间隔，卖价为内在价值加时间价值（BTC 计价）"""
+    rng = np.random.default_rng(seed)
+    times = pd.date_range('2025-01-01', periods=days * 288, freq='5min', tz='UTC')
+    spot = np.round(95000 + np.cumsum(rng.normal(0, 60, len(times))), 2)
+    frames = []
+    for d in range(days + 2):
+        expiry = pd.Timestamp('2025-01-01 08:00', tz='UTC') + pd.Timedelta(days=d)
+        live = np.flatnonzero((times < expiry) & (times >= expiry - pd.Timedelta(days=3)))
+        if not len(live):
+            continue
+        for strike in range(88000, 102001, 1000):
+            for claim_type in ('call', 'put'):
+                intrinsic = np.maximum(0, spot[live] - strike if claim_type == 'call' else strike - spot[live])
+                ask = np.round(intrinsic / spot[live] + 0.0015 + rng.random(len(live)) * 0.001, 4)
+                # 少量快照缺失报价
+                ask[rng.random(len(live)) < 0.01] = np.nan
+                frames.append(pd.DataFrame({
+                    'datetime_idx': times[live], 'underlyer_spot': spot[live], 'expiration_date': expiry,
+                    'claim_type': claim_type, 'strike': float(strike), 'best_ask_price': ask,
+                }))
+    df = pd.concat(frames).sort_values('datetime_idx', kind='stable').set_index('datetime_idx')
+    df_spot = df[~df.index.duplicated(keep='first')][['underlyer_spot']].rename(columns={'underlyer_spot': 'spot'})
+    return df, df_spot
+
+
+def run_backtrader(df, df_spot):
+    cerebro = bt.Cerebro(stdstats=False)
+    cerebro.broker.set_cash(CASH)
+    cerebro.addstrategy(OStraddleStrategy, df_market=df, schedule=SCHEDULE)
+    cerebro.adddata(SpotClockData(dataname=df_spot, name='all'))
+    cerebro.addanalyzer(bt.analyzers.Returns, _name='treturn')
+    cerebro.addanalyzer(bt.analyzers.DrawDown, _name='drawdown')
+    cerebro.addanalyzer(bt.analyzers.SharpeRatio, _name='sharpe')
+    cerebro.addanalyzer(bt.analyzers.PyFolio, _name='pyfolio')
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        strat = cerebro.run()[0]
+    elapsed = time.perf_counter() - start
+    returns = strat.analyzers.getbyname('pyfolio').get_pf_items()[0]
+    return elapsed, strat, cerebro.broker.getvalue(), get_analyzer_stats(strat), returns
+
+
+def run_vector(df, df_spot):
+    """返回 (建立期权链索引耗时, 回测耗时, VectorRun)，索引在参数扫描中只建立一次"""
+    start = time.perf_counter()
+    chain = OptionChainIndex(df)
+    t_index = time.perf_counter() - start
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        run = vector_straddle(chain, df_spot.index, df_spot['spot'].to_numpy(), SCHEDULE, CASH,
+                              tz=HKT, trade_log=TradeLog(TRADE_LOG_EXPORT))
+    return t_index, time.perf_counter() - start, run
+
+
+def main(days):
+    df, df_spot = make_chain(days)
+    print(f"{days} 天，期权链 {len(df)} 行，K线 {len(df_spot)} 根")
+
+    t_bt, strat, bt_value, bt_stats, bt_returns = run_backtrader(df, df_spot)
+    print(f"backtrader:  {t_bt:8.3f} s")
+    t_index, t_vec, run = run_vector(df, df_spot)
+    print(f"vector:      {t_vec:8.3f} s  ({t_bt / t_vec:.0f}x)，另建立期权链索引 {t_index:.3f} s")
+
+    expected, actual = strat.trade_log.to_records(), run.trade_log.to_records()
+    if expected != actual:
+        raise AssertionError(f"交易记录不一致: {len(expected)} 笔 / {len(actual)} 笔")
+    if round(strat.cum_pnl, 2) != round(run.extra['cum_pnl'], 2) or round(bt_value, 2) != round(run.end_value, 2):
+        raise AssertionError(f"盈亏不一致: {strat.cum_pnl} / {run.extra['cum_pnl']}, {bt_value} / {run.end_value}")
+    print(f"交易记录 {len(actual)} 笔一致，累计盈亏 {run.extra['cum_pnl']:,.2f}，最终净值 {run.end_value:,.2f}")
+
+    vec_stats = run.stats()
+    for key, value in bt_stats.items():
+        other = vec_stats[key]
+        if (value is None) != (other is None) or (value is not None and not np.isclose(value, other, rtol=1e-9)):
+            raise AssertionError(f"指标 {key} 不一致: {value} / {other}")
+    vec_returns = run.returns()
+    if not bt_returns.index.equals(vec_returns.index) or \
+            not np.allclose(bt_returns.to_numpy(), vec_returns.to_numpy(), rtol=1e-12, atol=1e-15):
+        raise AssertionError("日收益不一致")
+    print(f"分析器指标一致: {vec_stats}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 30)
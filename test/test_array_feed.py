@@ -0,0 +1,77 @@
+"""ArrayData 预加载和逐行加载得到的各条 line 与 PandasData 完全一致"""
+import numpy as np
+import pandas as pd
+import pytest
+import backtrader as bt
+from backtrader.utils import date2num, num2date
+
+from utils.array_feed import ArrayTable, date2num_array, num2date_array
+from utils.data_feed_utils import FuturesDataFeed
+from bench_feeds import PandasFuturesFeed, make_frame, load
+
+
+def assert_lines_equal(expected, actual):
+    assert expected.keys() == actual.keys()
+    for name, values in expected.items():
+        np.testing.assert_array_equal(actual[name], values, err_msg=name)
+
+
+@pytest.fixture
+def frame():
+    df = make_frame(2000)
+    # 缺失值和秒级时间
+    df.loc[10:20, 'open_interest'] = np.nan
+    df['datetime'] += pd.to_timedelta(np.arange(len(df)) % 7, unit='s')
+    return df
+
+
+def test_preload_matches_pandas_data(frame):
+    assert_lines_equal(load(PandasFuturesFeed, frame)[1], load(FuturesDataFeed, frame)[1])
+
+
+def test_array_table_and_memory_map(frame, tmp_path):
+    expected = load(PandasFuturesFeed, frame)[1]
+    assert_lines_equal(expected, load(FuturesDataFeed, ArrayTable.from_frame(frame))[1])
+    ArrayTable.from_frame(frame).save(str(tmp_path))
+    assert_lines_equal(expected, load(FuturesDataFeed, ArrayTable.load(str(tmp_path)))[1])
+
+
+def test_date_range(frame):
+    window = dict(fromdate=frame['datetime'][500].to_pydatetime(), todate=frame['datetime'][900].to_pydatetime())
+    expected = load(PandasFuturesFeed, frame, **window)[1]
+    assert len(expected['datetime']) == 401
+    assert_lines_equal(expected, load(FuturesDataFeed, frame, **window)[1])
+
+
+def test_timezone_aware_datetime(frame):
+    aware = frame.assign(datetime=frame['datetime'].dt.tz_localize('Asia/Hong_Kong'))
+    assert_lines_equal(load(PandasFuturesFeed, aware)[1], load(FuturesDataFeed, aware)[1])
+
+
+class Recorder(bt.Strategy):
+    def start(self):
+        self.rows = []
+
+    def next(self):
+        self.rows.append((self.data.datetime[0], self.data.close[0], self.data.open_interest[0]))
+
+
+def run(feed_cls, df, preload):
+    cerebro = bt.Cerebro(stdstats=False, preload=preload)
+    cerebro.addstrategy(Recorder)
+    cerebro.adddata(feed_cls(dataname=df, datetime='datetime'))
+    return cerebro.run()[0].rows
+
+
+def test_strategy_sees_same_bars_with_and_without_preload(frame):
+    expected = run(PandasFuturesFeed, frame, preload=True)
+    assert len(expected) == len(frame)
+    for preload in (True, False):
+        np.testing.assert_array_equal(np.array(run(FuturesDataFeed, frame, preload)), np.array(expected))
+
+
+def test_date2num_roundtrip():
+    stamps = pd.date_range('2024-01-01', periods=500, freq='37s1ms')
+    nums = date2num_array(stamps.asi8)
+    assert nums.tolist() == [date2num(ts.to_pydatetime()) for ts in stamps]
+    assert list(num2date_array(nums)) == [np.datetime64(num2date(x)) for x in nums]
@@ -0,0 +1,68 @@
+"""按日期拆分的 CSV 并发读取：列投影、类型、排序，Arrow 与 pandas 两种实现结果一致"""
+import pandas as pd
+import pytest
+
+import utils.csv_loader as csv_loader
+from utils.csv_loader import load_daily_csv
+
+DTYPES = {'date': 'int64', 'claim_type': 'category', 'strike': 'float64', 'expiration_date': 'str'}
+
+
+@pytest.fixture(params=['arrow', 'pandas'])
+def reader(request, monkeypatch):
+    if request.param == 'pandas':
+        monkeypatch.setattr(csv_loader, 'pa', None)
+    return request.param
+
+
+def write_day(path, dates, claim_types):
+    pd.DataFrame({
+        'date': dates,
+        'underlyer_spot': [95000.5] * len(dates),
+        'expiration_date': ['2025-03-28'] * len(dates),
+        'claim_type': claim_types,
+        'strike': [100000] * len(dates),
+    }).to_csv(path, index=False)
+    return str(path)
+
+
+def test_projects_columns_and_types(reader, tmp_path):
+    paths = [write_day(tmp_path / 'd1.csv', [1, 2], ['call', 'put']),
+             write_day(tmp_path / 'd2.csv', [3, 4], ['put', 'put'])]
+    df = load_daily_csv(paths, columns=list(DTYPES), dtypes=DTYPES, sort_by='date')
+    assert list(df.columns) == list(DTYPES)
+    assert df['date'].tolist() == [1, 2, 3, 4] and df['date'].dtype == 'int64'
+    # 两个文件的类别不同，合并后仍为一个 category 列
+    assert df['claim_type'].dtype == 'category'
+    assert df['claim_type'].astype(str).tolist() == ['call', 'put', 'put', 'put']
+    assert df['strike'].dtype == 'float64'
+    assert df['expiration_date'].tolist() == ['2025-03-28'] * 4
+    assert df.index.tolist() == [0, 1, 2, 3]
+
+
+def test_sorts_when_files_out_of_order(reader, tmp_path):
+    paths = [write_day(tmp_path / 'd2.csv', [3, 4], ['call', 'call']),
+             write_day(tmp_path / 'd1.csv', [1, 2], ['put', 'put'])]
+    df = load_daily_csv(paths, columns=['date', 'claim_type'], dtypes=DTYPES, sort_by='date')
+    assert df['date'].tolist() == [1, 2, 3, 4]
+    assert df['claim_type'].astype(str).tolist() == ['put', 'put', 'call', 'call']
+    assert df.index.tolist() == [0, 1, 2, 3]
+    assert load_daily_csv(paths, columns=['date'])['date'].tolist() == [3, 4, 1, 2]
+
+
+def test_skips_missing_and_unreadable_files(reader, tmp_path, capsys):
+    good = write_day(tmp_path / 'd1.csv', [1], ['call'])
+    # 缺少要求的列
+    (tmp_path / 'bad.csv').write_text('foo\n1\n')
+    paths = [str(tmp_path / 'missing.csv'), str(tmp_path / 'bad.csv'), good]
+    df = load_daily_csv(paths, columns=['date', 'strike'], dtypes=DTYPES)
+    assert df.to_dict('list') == {'date': [1], 'strike': [100000.0]}
+    out = capsys.readouterr().out
+    assert 'missing.csv' not in out
+    assert f"Error reading {tmp_path / 'bad.csv'}" in out
+
+
+def test_returns_none_without_readable_files(reader, tmp_path):
+    assert load_daily_csv([str(tmp_path / 'missing.csv')]) is None
+    (tmp_path / 'bad.csv').write_text('foo\n1\n')
+    assert load_daily_csv([str(tmp_path / 'bad.csv')], columns=['date']) is None
@@ -0,0 +1,67 @@
+"""DataFrame 压缩：类型降级不改变取值"""
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+
+from utils.frame_compact import compact_frame, exact_float, exact_float64
+
+
+def make_frame():
+    n = 1000
+    rng = np.random.default_rng(1)
+    return pd.DataFrame({
+        'exchange': ['deribit'] * n,
+        'instrument_name': [f"BTC-{i % 20}" for i in range(n)],
+        'note': [f"row {i}" for i in range(n)],
+        'mark_price': np.round(rng.random(n) * 0.1, 4),
+        'underlyer_spot': 95000 + rng.random(n),
+        'strike': np.arange(n) * 1000.0,
+        'count': np.arange(n, dtype='int64'),
+        'delta': -np.arange(n, dtype='int64'),
+        'expiration_date': [dt.datetime(2025, 1, 1 + i % 28) for i in range(n)],
+    })
+
+
+def test_compacts_columns():
+    df = make_frame()
+    out = compact_frame(df, report=False)
+    assert out['exchange'].dtype == 'category' and out['instrument_name'].dtype == 'category'
+    # 几乎每行不同的字符串不转为 category
+    assert out['note'].dtype == object
+    assert out['mark_price'].dtype == np.float32 and out['strike'].dtype == np.float32
+    # 有效数字超过 6 位的现价保持 float64
+    assert out['underlyer_spot'].dtype == np.float64
+    assert out['count'].dtype == np.uint16 and out['delta'].dtype == np.int16
+    assert out['expiration_date'].dtype == 'datetime64[ns]'
+    # 原 DataFrame 不变
+    assert df['mark_price'].dtype == np.float64
+
+
+def test_values_are_preserved():
+    df = make_frame()
+    out = compact_frame(df, report=False)
+    for name in ('mark_price', 'strike'):
+        pd.testing.assert_series_equal(exact_float64(out[name]), df[name])
+    assert [exact_float(v) for v in out['mark_price'].to_numpy()[:50]] == df['mark_price'][:50].tolist()
+    assert (out['instrument_name'].astype(str) == df['instrument_name']).all()
+    assert (out['count'] == df['count']).all() and (out['delta'] == df['delta']).all()
+    assert (out['expiration_date'] == pd.to_datetime(df['expiration_date'])).all()
+
+
+def test_nan_and_mixed_offsets():
+    df = pd.DataFrame({
+        'iv': [0.5, np.nan, np.inf],
+        'when': [pd.Timestamp('2025-01-01T00:00+08:00').to_pydatetime(),
+                 pd.Timestamp('2025-01-01T00:00+00:00').to_pydatetime(), None],
+    })
+    out = compact_frame(df, report=False)
+    assert out['iv'].dtype == np.float32
+    assert np.isnan(out['iv'][1]) and np.isinf(out['iv'][2])
+    assert str(out['when'].dt.tz) == 'UTC'
+    assert out['when'][0] == pd.Timestamp('2024-12-31T16:00Z')
+
+
+def test_report(capsys):
+    compact_frame(make_frame(), label='options')
+    assert capsys.readouterr().out.startswith('[compact] options 1000 行')
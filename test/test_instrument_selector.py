@@ -0,0 +1,108 @@
+"""声明式合约筛选：编译出的 SQL 在数据库中选出合约，只返回选中合约的行情"""
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from utils.instrument_selector import InstrumentSelector
+from utils.market_data import MarketDataCache
+
+TABLE = 'option_bars'
+
+# 合约: (到期日, 类型, 行权价, 每根K线的成交量)
+INSTRUMENTS = {
+    'A': ('2024-01-05', 'call', 100.0, 5.0),
+    'B': ('2024-01-05', 'put', 150.0, 3.0),
+    'C': ('2024-01-12', 'call', 95.0, 1.0),
+    'D': ('2024-01-19', 'call', 100.0, 9.0),
+    'E': ('2023-12-29', 'call', 100.0, 7.0),
+}
+
+
+@pytest.fixture
+def conn():
+    rows = []
+    for hour in range(48):
+        when = pd.Timestamp('2024-01-01') + pd.Timedelta(hours=hour)
+        for name, (expiry, claim_type, strike, volume) in INSTRUMENTS.items():
+            rows.append({
+                'datetime': when, 'exchange': 'deribit', 'underlyer': 'BTC', 'instrument_name': name,
+                'expiration_date': pd.Timestamp(expiry), 'claim_type': claim_type, 'strike': strike,
+                'underlyer_spot': 100.0, 'volume': volume, 'mark_price': float(hour),
+            })
+    conn = sqlite3.connect(':memory:')
+    pd.DataFrame(rows).to_sql(TABLE, conn, index=False)
+    yield conn
+    conn.close()
+
+
+def select(conn, selector, columns=None, begin='2024-01-01', end='2024-01-02'):
+    sql, params = selector.compile(TABLE, columns, begin, end)
+    return pd.read_sql(sql, conn, params=params, parse_dates=['datetime'])
+
+
+def names(df):
+    return sorted(df['instrument_name'].unique())
+
+
+def test_equality_filters_and_range(conn):
+    df = select(conn, InstrumentSelector(exchange='deribit', claim_type='put'))
+    assert names(df) == ['B']
+    assert len(df) == 24
+    assert df['datetime'].is_monotonic_increasing
+    assert df['datetime'].max() < pd.Timestamp('2024-01-02')
+
+
+def test_nearest_expiries(conn):
+    # 区间开始前已到期的合约不计入
+    assert names(select(conn, InstrumentSelector(nearest_expiries=2))) == ['A', 'B', 'C']
+
+
+def test_strike_band(conn):
+    assert names(select(conn, InstrumentSelector(strike_band=0.1))) == ['A', 'C', 'D', 'E']
+
+
+def test_top_n_by_volume(conn):
+    df = select(conn, InstrumentSelector(claim_type='call', top_n=2), columns=['datetime', 'instrument_name'])
+    assert names(df) == ['D', 'E']
+    assert list(df.columns) == ['datetime', 'instrument_name']
+
+
+def test_compiled_sql():
+    sql, params = InstrumentSelector(underlyer='BTC', top_n=1, rank_by=None).compile(
+        TABLE, ['datetime', 'mark_price'], '2024-01-01', '2024-01-02', inclusive_end=True)
+    assert 'datetime <= :end' in sql and 'underlyer = :underlyer' in sql
+    # 按合约标识的字节序排序，与 pandas groupby 的分组顺序一致
+    assert 'order by exchange collate "C", instrument_name collate "C", expiration_date' in sql
+    assert sql.strip().startswith('with bars as') and 'select datetime, mark_price from bars join instruments' in sql
+    assert params == {'begin': pd.Timestamp('2024-01-01').to_pydatetime(),
+                      'end': pd.Timestamp('2024-01-02').to_pydatetime(), 'underlyer': 'BTC', 'top_n': 1}
+
+
+def test_rejects_invalid_names_and_rank():
+    with pytest.raises(ValueError):
+        InstrumentSelector().compile('bars; drop table bars', None, '2024-01-01', '2024-01-02')
+    with pytest.raises(ValueError):
+        InstrumentSelector().compile(TABLE, ['mark_price as x'], '2024-01-01', '2024-01-02')
+    with pytest.raises(ValueError):
+        InstrumentSelector(rank_by='open_interest')
+
+
+def test_read_with_selector_skips_cache(conn, tmp_path):
+    class SqliteCache(MarketDataCache):
+        queries = 0
+
+        def _stream_sql(self, sql, params):
+            self.queries += 1
+            yield from pd.read_sql(sql, conn, params=params, chunksize=self.chunk_rows, parse_dates=['datetime'])
+
+    cache = SqliteCache(str(tmp_path / 'cache'), chunk_rows=10)
+    selector = InstrumentSelector(claim_type='call', top_n=1)
+    df = cache.read(TABLE, '2024-01-01 06:00', '2024-01-01 12:00', columns=['datetime', 'instrument_name'],
+                    selector=selector)
+    assert set(df['instrument_name']) == {'D'} and len(df) == 6
+    cache.read(TABLE, '2024-01-01 06:00', '2024-01-01 12:00', columns=['datetime', 'instrument_name'],
+               selector=selector)
+    assert cache.queries == 2
+    with pytest.raises(ValueError):
+        cache.read(TABLE, '2024-01-01', '2024-01-02', exchange='deribit', selector=selector)
@@ -0,0 +1,258 @@
+"""
+JobManager 的预热、提交、状态查询、取消、参数扫描和已结束任务的淘汰
+工作进程在首次提交时 fork，之前替换的 _run_job、_prepare_sweep 在工作进程中同样生效
+"""
+import os
+import time
+import itertools
+import pytest
+
+import core.job_queue as job_queue
+from core.job_queue import JobManager, expand_grid
+from core.results_catalog import ResultsCatalog
+from utils.shared_data import get_store
+
+
+def fake_run_job(job_id, strategy_name, params, shared_progress, *args):
+    shared_progress[job_id] = {'stage': 'running'}
+    if params.get('fail'):
+        raise RuntimeError('boom')
+    time.sleep(params.get('sleep', 0))
+    return {'status': 'success', 'result_id': f"{strategy_name}_{params.get('n1')}",
+            'stats': {'sharpe': params.get('sharpe'), 'max_drawdown': params.get('max_drawdown')}}
+
+
+def fake_prepare_sweep(strategy_name, params, data_path):
+    # 不查询行情，各组合自行加载数据
+    if params.get('fail'):
+        raise RuntimeError('no data')
+    return None
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    monkeypatch.setattr(job_queue, '_run_job', fake_run_job)
+    monkeypatch.setattr(job_queue, '_prepare_sweep', fake_prepare_sweep)
+    # 不预先导入回测引擎，工作进程秒级启动
+    monkeypatch.setattr(job_queue, '_warm_worker', lambda: None)
+    manager = JobManager(max_workers=1, warm=False)
+    yield manager
+    manager.shutdown()
+
+
+def wait_finished(manager, job_id, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = manager.get(job_id)
+        if job['finished_at']:
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"任务 {job_id} 没有结束")
+
+
+def test_submit_returns_result(manager):
+    job_id = manager.submit('f_sma_cross', {'n1': 10})
+    assert manager.get(job_id)['status'] in ('queued', 'running', 'success')
+    job = wait_finished(manager, job_id)
+    assert job['status'] == 'success'
+    assert job['result']['result_id'] == 'f_sma_cross_10'
+    assert job['progress'] == {'stage': 'running'}
+    assert 'future' not in job
+
+
+def test_failed_job_records_error(manager):
+    job = wait_finished(manager, manager.submit('f_sma_cross', {'fail': True}))
+    assert job['status'] == 'failed'
+    assert job['error'] == 'RuntimeError: boom'
+
+
+def test_unknown_job(manager):
+    assert manager.get('missing') is None
+    assert manager.cancel('missing') is None
+
+
+def test_cancel_queued_job(manager):
+    # 唯一的工作进程被第一个任务占用，第二个任务仍在排队
+    running = manager.submit('f_sma_cross', {'sleep': 1.0})
+    queued = manager.submit('f_sma_cross', {'n1': 5})
+    assert manager.cancel(queued) is True
+    assert manager.get(queued)['status'] == 'cancelled'
+    assert wait_finished(manager, running)['status'] == 'success'
+    assert manager.cancel(running) is False
+
+
+def test_prune_finished_jobs(manager):
+    manager.max_finished_jobs = 2
+    job_ids = [manager.submit('f_sma_cross', {'n1': n}) for n in range(3)]
+    for job_id in job_ids:
+        wait_finished(manager, job_id)
+    manager.submit('f_sma_cross', {'n1': 3})
+    # 最早结束的任务被淘汰，进度一起删除
+    assert manager.get(job_ids[0]) is None
+    assert job_ids[0] not in manager.progress
+    assert manager.get(job_ids[-1]) is not None
+
+
+def wait_sweep(manager, sweep_id, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        sweep = manager.get_sweep(sweep_id)
+        if sweep['status'] not in ('preparing', 'running'):
+            return sweep
+        time.sleep(0.05)
+    raise AssertionError(f"参数扫描 {sweep_id} 没有结束")
+
+
+def test_expand_grid():
+    assert expand_grid({'n1': [5, 10], 'n2': [20]}) == [{'n1': 5, 'n2': 20}, {'n1': 10, 'n2': 20}]
+    assert expand_grid({'n1': []}) == []
+
+
+def test_sweep_ranks_results(manager):
+    sweep_id = manager.submit_sweep('f_sma_cross', {'n1': 10}, {'sharpe': [0.5, None, 1.5, -1.0]})
+    sweep = wait_sweep(manager, sweep_id)
+    assert sweep['status'] == 'success'
+    assert sweep['done'] == sweep['total'] == 4
+    # 越大越好，指标为空的组合排在最后
+    assert [row['sharpe'] for row in sweep['results']] == [1.5, 0.5, -1.0, None]
+    assert sweep['results'][0]['params'] == {'sharpe': 1.5}
+    assert sweep['results'][0]['result_id'] == 'f_sma_cross_10'
+
+
+def test_sweep_ranks_drawdown_ascending(manager):
+    sweep_id = manager.submit_sweep('f_sma_cross', {}, {'max_drawdown': [3.0, 1.0, 2.0]}, rank_by='max_drawdown')
+    assert [row['max_drawdown'] for row in wait_sweep(manager, sweep_id)['results']] == [1.0, 2.0, 3.0]
+
+
+def test_sweep_rejects_bad_requests(manager):
+    with pytest.raises(ValueError):
+        manager.submit_sweep('f_sma_cross', {}, {'n1': [1]}, rank_by='profit')
+    with pytest.raises(ValueError):
+        manager.submit_sweep('f_sma_cross', {}, {'n1': []})
+
+
+def test_failed_sweep_preparation(manager):
+    sweep = wait_sweep(manager, manager.submit_sweep('f_sma_cross', {'fail': True}, {'n1': [1, 2]}))
+    assert sweep['status'] == 'failed'
+    assert sweep['error'] == 'RuntimeError: no data'
+
+
+def test_prune_finished_sweeps(manager):
+    manager.max_finished_sweeps = 1
+    first = manager.submit_sweep('f_sma_cross', {}, {'n1': [1, 2]})
+    wait_sweep(manager, first)
+    second = manager.submit_sweep('f_sma_cross', {}, {'n1': [3]})
+    wait_sweep(manager, second)
+    # 第二个扫描结束后最早结束的扫描被淘汰
+    deadline = time.monotonic() + 5
+    while manager.get_sweep(first) is not None and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert manager.get_sweep(first) is None
+    assert manager.get_sweep(second)['status'] == 'success'
+
+
+class LoopingRunner:
+    """在主循环中检查停止请求、不会自行结束的回测"""
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+
+    def run_backtest(self, strategy_name, progress=None, **kwargs):
+        for bar in itertools.count():
+            progress.update(stage='running', bars=bar)
+            progress.check()
+            time.sleep(0.01)
+
+
+@pytest.fixture
+def looping_manager(monkeypatch, tmp_path):
+    """使用真实 _run_job 和 RunGuard 的任务队列"""
+    catalog = ResultsCatalog(str(tmp_path / 'results'))
+    monkeypatch.setattr(job_queue, '_get_runner', lambda: LoopingRunner(catalog))
+    monkeypatch.setattr(job_queue, '_warm_worker', lambda: None)
+    manager = JobManager(max_workers=1, warm=False)
+    manager.catalog = catalog
+    yield manager
+    manager.shutdown()
+
+
+def test_cancel_running_job(looping_manager):
+    manager = looping_manager
+    job_id = manager.submit('f_sma_cross', {'n1': 10})
+    deadline = time.monotonic() + 30
+    while manager.get(job_id)['status'] != 'running':
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+    assert manager.cancel(job_id, '测试取消') is True
+    job = wait_finished(manager, job_id)
+    assert job['status'] == 'cancelled'
+    assert job['result']['reason'] == '测试取消'
+    assert not job['result']['interrupted']
+    assert job['progress']['stage'] == 'cancelled'
+    # 原因写入结果索引，任务淘汰后仍可查询
+    record, = manager.catalog.cancellations('f_sma_cross')
+    assert (record['job_id'], record['reason'], record['params']) == (job_id, '测试取消', {'n1': 10})
+    assert record['progress']['bars'] == job['result']['progress']['bars']
+
+
+def test_run_job_releases_shared_data_when_guard_stop_fails(monkeypatch):
+    class Runner:
+        def run_backtest(self, strategy_name, progress=None, **kwargs):
+            return {'status': 'success'}
+
+    class Store:
+        released = False
+
+        def release_all(self):
+            self.released = True
+
+    stop = job_queue.RunGuard.stop
+
+    def failing_stop(guard):
+        stop(guard)
+        raise RuntimeError('stop failed')
+
+    monkeypatch.setattr(job_queue, '_get_runner', Runner)
+    monkeypatch.setattr(job_queue.RunGuard, 'stop', failing_stop)
+    store = Store()
+    with pytest.raises(RuntimeError, match='stop failed'):
+        job_queue._run_job('job1', 'f_sma_cross', {}, {}, shared_data=store)
+    assert store.released
+    assert get_store() is None
+
+
+def test_run_job_resets_shared_data_store(monkeypatch):
+    seen = []
+
+    class Runner:
+        def run_backtest(self, strategy_name, progress=None, **kwargs):
+            # 行情加载时通过 get_store() 使用本任务的共享数据
+            seen.append(get_store())
+            return {'status': 'success'}
+
+    class Store:
+        def release_all(self):
+            pass
+
+    monkeypatch.setattr(job_queue, '_get_runner', Runner)
+    store = Store()
+    assert job_queue._run_job('job1', 'f_sma_cross', {}, {}, shared_data=store) == {'status': 'success'}
+    assert seen == [store]
+    # 同一工作进程中之后的任务不再使用上一个任务的共享数据
+    assert get_store() is None
+
+
+def test_warm_up_starts_every_worker(monkeypatch, tmp_path):
+    # 初始化函数在每个工作进程启动时记录进程号
+    monkeypatch.setattr(job_queue, '_warm_worker', lambda: (tmp_path / str(os.getpid())).touch())
+    manager = JobManager(max_workers=2, warm=True)
+    try:
+        deadline = time.monotonic() + 30
+        while len(list(tmp_path.iterdir())) < 2:
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+        # 预热之后提交的任务由已启动的工作进程执行
+        assert manager.executor.submit(job_queue._ping).result(timeout=30) in {int(p.name) for p in tmp_path.iterdir()}
+        assert manager.jobs == {}
+    finally:
+        manager.shutdown()
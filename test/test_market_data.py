@@ -0,0 +1,280 @@
+"""
+行情数据本地缓存：按日分区的 Parquet 缓存、分块读取和列投影
+数据库换成内存中的 SQLite，SQL 与 PostgreSQL 中执行的相同
+"""
+import os
+import json
+import sqlite3
+import datetime as dt
+
+import pandas as pd
+import pytest
+
+from utils.market_data import MarketDataCache
+
+TABLE = 'option_bars'
+
+
+class SqliteCache(MarketDataCache):
+    """
+    从 SQLite 读取行情并记录执行的查询
+    datetime 列相当于 PostgreSQL 的 timestamp without time zone：与带偏移的字符串比较时忽略偏移
+    """
+
+    def __init__(self, conn, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.conn = conn
+        self.queries = []
+
+    def _bind(self, value):
+        ts = pd.Timestamp(value)
+        return (ts.tz_localize(None) if ts.tzinfo is not None else ts).strftime('%Y-%m-%d %H:%M:%S')
+
+    def _stream_sql(self, sql, params):
+        self.queries.append((sql, params))
+        bound = {k: self._bind(v) if k in ('begin', 'end') else v for k, v in params.items()}
+        yield from pd.read_sql(sql, self.conn, params=bound, chunksize=self.chunk_rows, parse_dates=['datetime'])
+
+    def table_columns(self, table, refresh=False):
+        return [row[1] for row in self.conn.execute(f"pragma table_info({table})")]
+
+
+class TimestamptzCache(SqliteCache):
+    """
+    datetime 列相当于 timestamptz（SQLite 中保存 UTC 时间），数据库会话时区为 session_tz：
+    不带偏移的字符串按会话时区解释，读出的时间带时区
+    """
+
+    def __init__(self, conn, *args, session_tz='Asia/Hong_Kong', **kwargs):
+        super().__init__(conn, *args, **kwargs)
+        self.session_tz = session_tz
+
+    def _bind(self, value):
+        ts = pd.Timestamp(value)
+        ts = ts.tz_localize(self.session_tz) if ts.tzinfo is None else ts
+        return ts.tz_convert('UTC').strftime('%Y-%m-%d %H:%M:%S')
+
+    def _stream_sql(self, sql, params):
+        for chunk in super()._stream_sql(sql, params):
+            chunk['datetime'] = chunk['datetime'].dt.tz_localize('UTC').dt.tz_convert(self.session_tz)
+            yield chunk
+
+
+def make_bars():
+    rows = []
+    for hour in range(72):
+        when = pd.Timestamp('2024-01-01') + pd.Timedelta(hours=hour)
+        for exchange in ('deribit', 'okx'):
+            for underlyer in ('BTC', 'ETH'):
+                rows.append({
+                    'datetime': when, 'exchange': exchange, 'underlyer': underlyer,
+                    'instrument_name': f"{underlyer}-C", 'claim_type': 'call' if hour % 2 else 'put',
+                    'mark_price': float(hour), 'volume': float(hour % 5),
+                })
+    return pd.DataFrame(rows)
+
+
+@pytest.fixture
+def bars():
+    return make_bars()
+
+
+@pytest.fixture
+def conn(bars):
+    conn = sqlite3.connect(':memory:')
+    bars.to_sql(TABLE, conn, index=False)
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def cache(conn, tmp_path, monkeypatch):
+    monkeypatch.delenv('MARKET_DATA_CACHE', raising=False)
+    return SqliteCache(conn, str(tmp_path / 'cache'))
+
+
+def expected(bars, begin, end, exchange=None, underlyer=None, inclusive_end=False):
+    mask = (bars['datetime'] >= begin) & ((bars['datetime'] <= end) if inclusive_end else (bars['datetime'] < end))
+    if exchange:
+        mask &= bars['exchange'] == exchange
+    if underlyer:
+        mask &= bars['underlyer'] == underlyer
+    return bars[mask].reset_index(drop=True)
+
+
+def assert_rows_equal(df, other):
+    key = ['datetime', 'exchange', 'underlyer']
+    pd.testing.assert_frame_equal(df.sort_values(key, ignore_index=True)[list(other.columns)],
+                                  other.sort_values(key, ignore_index=True), check_dtype=False)
+
+
+def test_first_read_queries_and_caches_by_day(cache, bars):
+    df = cache.read(TABLE, '2024-01-01 06:00', '2024-01-02 12:00', exchange='deribit')
+    assert_rows_equal(df, expected(bars, '2024-01-01 06:00', '2024-01-02 12:00', 'deribit'))
+    assert len(cache.queries) == 1
+    day_dir = os.path.join(cache.cache_dir, TABLE, 'date=2024-01-01')
+    assert sorted(os.listdir(os.path.join(day_dir, 'exchange=deribit'))) == \
+        ['underlyer=BTC.parquet', 'underlyer=ETH.parquet']
+    with open(os.path.join(day_dir, '_manifest.json')) as f:
+        assert json.load(f) == {'scopes': [['deribit', '*', '*']]}
+    # 分区保存全天的数据，不只是请求的区间
+    assert len(pd.read_parquet(os.path.join(day_dir, 'exchange=deribit', 'underlyer=BTC.parquet'))) == 24
+
+
+def test_cached_days_are_read_from_disk(cache, bars):
+    cache.read(TABLE, '2024-01-01', '2024-01-03', exchange='deribit')
+    cache.queries.clear()
+    df = cache.read(TABLE, '2024-01-01 03:00', '2024-01-02 21:00', exchange='deribit', underlyer='ETH')
+    assert cache.queries == []
+    assert_rows_equal(df, expected(bars, '2024-01-01 03:00', '2024-01-02 21:00', 'deribit', 'ETH'))
+
+
+def test_only_missing_days_are_queried(cache, bars):
+    cache.read(TABLE, '2024-01-02', '2024-01-03')
+    cache.queries.clear()
+    df = cache.read(TABLE, '2024-01-01', '2024-01-03 23:00', inclusive_end=True)
+    assert [params for _, params in cache.queries] == [
+        {'begin': '2024-01-01 00:00:00+00:00', 'end': '2024-01-02 00:00:00+00:00'},
+        {'begin': '2024-01-03 00:00:00+00:00', 'end': '2024-01-04 00:00:00+00:00'},
+    ]
+    assert_rows_equal(df, expected(bars, '2024-01-01', '2024-01-03 23:00', inclusive_end=True))
+
+
+def test_narrower_cached_scope_does_not_cover_wider_request(cache, bars):
+    cache.read(TABLE, '2024-01-01', '2024-01-02', exchange='okx')
+    cache.queries.clear()
+    df = cache.read(TABLE, '2024-01-01', '2024-01-02')
+    assert len(cache.queries) == 1
+    assert_rows_equal(df, expected(bars, '2024-01-01', '2024-01-02'))
+    cache.queries.clear()
+    cache.read(TABLE, '2024-01-01', '2024-01-02', exchange='okx')
+    assert cache.queries == []
+
+
+def test_refresh_and_fresh_days_bypass_cache(cache, conn):
+    cache.read(TABLE, '2024-01-01', '2024-01-02')
+    cache.queries.clear()
+    cache.read(TABLE, '2024-01-01', '2024-01-02', refresh=True)
+    assert len(cache.queries) == 1
+
+    # 距今不足 fresh_days 天的数据不缓存
+    fresh_days = (dt.date.today() - dt.date(2023, 1, 1)).days
+    recent = SqliteCache(conn, os.path.join(cache.cache_dir, 'recent'), fresh_days=fresh_days)
+    recent.read(TABLE, '2024-01-01', '2024-01-02')
+    recent.read(TABLE, '2024-01-01', '2024-01-02')
+    assert len(recent.queries) == 2
+    assert not os.path.exists(os.path.join(recent.cache_dir, TABLE, 'date=2024-01-01'))
+
+
+def test_cache_disabled_by_environment(conn, tmp_path, monkeypatch):
+    monkeypatch.setenv('MARKET_DATA_CACHE', '0')
+    cache = SqliteCache(conn, str(tmp_path / 'cache'))
+    cache.read(TABLE, '2024-01-01', '2024-01-02')
+    cache.read(TABLE, '2024-01-01', '2024-01-02')
+    assert len(cache.queries) == 2
+    assert not os.path.exists(cache.cache_dir)
+
+
+def test_filters_and_empty_result(cache, bars):
+    df = cache.read(TABLE, '2024-01-01', '2024-01-02', filters={'claim_type': 'call'})
+    want = expected(bars, '2024-01-01', '2024-01-02')
+    assert_rows_equal(df, want[want['claim_type'] == 'call'].reset_index(drop=True))
+    assert cache.read(TABLE, '2024-02-01', '2024-02-02').empty
+
+
+def test_days_covering_range(cache):
+    assert cache._days('2024-01-01', '2024-01-03') == [dt.date(2024, 1, 1), dt.date(2024, 1, 2)]
+    assert cache._days('2024-01-01', '2024-01-03', inclusive_end=True)[-1] == dt.date(2024, 1, 3)
+    # 边界带时区时前后各多取一天
+    assert cache._days('2024-01-02T00:00+08:00', '2024-01-02T12:00+08:00') == \
+        [dt.date(2024, 1, 1), dt.date(2024, 1, 2), dt.date(2024, 1, 3)]
+
+
+def test_chunked_read_matches_single_chunk(conn, tmp_path, bars):
+    whole = SqliteCache(conn, str(tmp_path / 'whole'), chunk_rows=10_000)
+    chunked = SqliteCache(conn, str(tmp_path / 'chunked'), chunk_rows=7)
+    want = whole.read(TABLE, '2024-01-01 05:00', '2024-01-03 05:00')
+    pd.testing.assert_frame_equal(chunked.read(TABLE, '2024-01-01 05:00', '2024-01-03 05:00'), want)
+    # 跨块的日期在写入缓存前已完整
+    for day in ('2024-01-01', '2024-01-02', '2024-01-03'):
+        path = os.path.join(chunked.cache_dir, TABLE, f"date={day}", 'exchange=okx', 'underlyer=BTC.parquet')
+        assert len(pd.read_parquet(path)) == 24
+    chunked.queries.clear()
+    pd.testing.assert_frame_equal(chunked.read(TABLE, '2024-01-01 05:00', '2024-01-03 05:00'), want)
+    assert chunked.queries == []
+
+
+def test_convert_is_applied_per_chunk(conn, tmp_path, bars):
+    cache = SqliteCache(conn, str(tmp_path / 'cache'), chunk_rows=50)
+    sizes = []
+
+    def convert(chunk):
+        sizes.append(len(chunk))
+        chunk = chunk.copy()
+        chunk['datetime_idx'] = chunk['datetime'].dt.tz_localize('UTC')
+        return chunk
+
+    df = cache.read(TABLE, '2024-01-01', '2024-01-02 12:00', convert=convert, index='datetime_idx')
+    # 每块截取区间后再转换
+    assert len(sizes) > 1 and max(sizes) <= 50
+    assert sum(sizes) == len(df) == len(expected(bars, '2024-01-01', '2024-01-02 12:00'))
+    assert df.index.name == 'datetime_idx' and str(df.index.tz) == 'UTC'
+    assert df.index.is_monotonic_increasing
+
+
+def test_feed_columns_follow_line_declarations(conn, tmp_path):
+    from utils.data_feed_utils import FuturesDataFeed
+    table = pd.DataFrame(columns=['datetime', 'date', 'exchange', 'instrument_name', 'expiration_date', 'mark_price',
+                                  'volume', 'volume_usd', 'open_interest', 'underlyer_spot', 'bid', 'ask',
+                                  'bid_amount', 'settlement_price'])
+    table.to_sql('futures_bars', conn, index=False)
+    cache = SqliteCache(conn, str(tmp_path / 'cache'))
+    columns = cache.feed_columns('futures_bars', FuturesDataFeed, ['date', 'exchange', 'instrument_name', 'missing'])
+    # 开高低收由 mark_price_bars 生成，表中不存在的列和未声明的列不查询
+    assert columns == ['datetime', 'volume', 'mark_price', 'volume_usd', 'open_interest', 'underlyer_spot',
+                       'bid', 'ask', 'date', 'exchange', 'instrument_name']
+
+
+def test_only_requested_columns_are_selected(cache, bars):
+    df = cache.read(TABLE, '2024-01-01', '2024-01-02', columns=['datetime', 'mark_price'],
+                    filters={'claim_type': 'call'})
+    sql, _ = cache.queries[-1]
+    # 分区键总是一起查询，过滤用到的列在过滤后投影掉
+    assert sql.startswith(f"select datetime, exchange, underlyer, claim_type, mark_price from {TABLE} ")
+    assert list(df.columns) == ['datetime', 'mark_price']
+    want = expected(bars, '2024-01-01', '2024-01-02')
+    assert len(df) == (want['claim_type'] == 'call').sum()
+    with open(os.path.join(cache.cache_dir, TABLE, 'date=2024-01-01', '_manifest.json')) as f:
+        assert json.load(f)['scopes'] == [['*', '*', ['claim_type', 'datetime', 'exchange', 'mark_price', 'underlyer']]]
+
+
+def test_wider_columns_refetch_with_union(cache, bars):
+    cache.read(TABLE, '2024-01-01', '2024-01-02', columns=['datetime', 'mark_price'])
+    cache.queries.clear()
+    assert list(cache.read(TABLE, '2024-01-01', '2024-01-02', columns=['mark_price']).columns) == ['mark_price']
+    assert cache.queries == []
+
+    df = cache.read(TABLE, '2024-01-01', '2024-01-02', columns=['datetime', 'volume'])
+    sql, _ = cache.queries[-1]
+    # 重新拉取时保留已缓存的列，覆盖写入后原来的请求仍然命中
+    assert sql.startswith(f"select datetime, exchange, underlyer, mark_price, volume from {TABLE} ")
+    assert df['volume'].tolist() == expected(bars, '2024-01-01', '2024-01-02')['volume'].tolist()
+    cache.queries.clear()
+    cache.read(TABLE, '2024-01-01', '2024-01-02', columns=['mark_price', 'volume'])
+    assert cache.queries == []
+
+
+def test_timestamptz_days_do_not_depend_on_session_tz(conn, tmp_path, bars):
+    # 会话时区为 UTC+8 时，SQL 中的日期边界仍是 UTC 零点，缓存的每一天都完整
+    cache = TimestamptzCache(conn, str(tmp_path / 'cache'))
+    df = cache.read(TABLE, '2024-01-01', '2024-01-03', exchange='deribit', underlyer='BTC')
+    hours = pd.date_range('2024-01-01', periods=48, freq='h', tz='UTC')
+    assert (df['datetime'].dt.tz_convert('UTC') == hours).all()
+    for day in ('2024-01-01', '2024-01-02'):
+        part = pd.read_parquet(os.path.join(cache.cache_dir, TABLE, f"date={day}", 'exchange=deribit',
+                                            'underlyer=BTC.parquet'))
+        assert (part['datetime'].dt.tz_convert('UTC').dt.strftime('%Y-%m-%d') == day).all() and len(part) == 24
+    cache.queries.clear()
+    again = cache.read(TABLE, '2024-01-01', '2024-01-03', exchange='deribit', underlyer='BTC')
+    assert cache.queries == []
+    assert (again['datetime'].dt.tz_convert('UTC') == hours).all()
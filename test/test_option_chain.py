@@ -0,0 +1,85 @@
+"""期权链快照索引：快照的精确和 as-of 查找，ATM 跨式报价的选择"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.option_chain import OptionChainIndex
+
+T0 = pd.Timestamp('2025-01-01 00:00', tz='UTC')
+T1 = pd.Timestamp('2025-01-01 00:05', tz='UTC')
+E1 = pd.Timestamp('2025-01-01 08:00', tz='UTC')
+E2 = pd.Timestamp('2025-01-02 08:00', tz='UTC')
+
+
+def make_chain(rows):
+    """rows 为 (时间, 到期日, 行权价, 看涨/看跌, 卖一价)"""
+    df = pd.DataFrame(rows, columns=['datetime_idx', 'expiration_date', 'strike', 'claim_type', 'best_ask_price'])
+    return df.set_index('datetime_idx')
+
+
+@pytest.fixture
+def chain():
+    rows = []
+    for when in (T0, T1):
+        for expiry in (E2, E1):
+            for strike in (96000.0, 94000.0, 95000.0):
+                rows.append((when, expiry, strike, 'call', 0.01 + strike / 1e7 + (expiry == E2) * 0.1))
+                rows.append((when, expiry, strike, 'put', 0.02 + strike / 1e7 + (when == T1) * 0.1))
+    return OptionChainIndex(make_chain(rows))
+
+
+def test_locate_exact_and_as_of(chain):
+    assert len(chain) == 2
+    assert chain.locate(T0) == 0 and chain.locate(T1) == 1
+    # 不指定 tolerance 时只接受精确匹配
+    assert chain.locate(T1 + pd.Timedelta(seconds=1)) is None
+    # 取不晚于 when 的最近快照，恰好等于 tolerance 时仍然接受
+    assert chain.locate(T1 + pd.Timedelta(minutes=2), tolerance=120) == 1
+    assert chain.locate(T0 + pd.Timedelta(minutes=3), tolerance='5min') == 0
+    assert chain.locate(T1 + pd.Timedelta(seconds=121), tolerance=120) is None
+    # 第一个快照之前没有可用的快照
+    assert chain.locate(T0 - pd.Timedelta(seconds=1), tolerance=3600) is None
+    # 不带时区的时间按 UTC 处理
+    assert chain.locate(T1.tz_localize(None)) == 1
+
+
+def test_atm_straddle(chain):
+    quote = chain.atm_straddle(T1, 95400.0)
+    assert quote.time == T1 and quote.expiry == E1 and quote.strike == 95000.0
+    assert quote.call_ask == pytest.approx(0.01 + 0.0095) and quote.put_ask == pytest.approx(0.12 + 0.0095)
+    # 超出行权价范围时取最近的一端
+    assert chain.atm_straddle(T0, 200000.0).strike == 96000.0
+    assert chain.atm_straddle(T0, 1.0).strike == 94000.0
+    # as-of 命中的快照按 when 选择到期日：E1 到期之后选 E2
+    quote = chain.atm_straddle(E1, 95000.0, tolerance=86400)
+    assert quote.time == T1 and quote.expiry == E2
+    assert chain.atm_straddle(E2, 95000.0, tolerance=86400 * 2) is None
+    assert chain.atm_straddle(T1 + pd.Timedelta(minutes=10), 95000.0, tolerance=300) is None
+
+
+def test_equidistant_strikes_take_first_row():
+    rows = [
+        (T0, E1, 96000.0, 'call', 0.1), (T0, E1, 96000.0, 'put', 0.1),
+        (T0, E1, 94000.0, 'call', 0.2), (T0, E1, 94000.0, 'put', 0.2),
+    ]
+    assert OptionChainIndex(make_chain(rows)).atm_straddle(T0, 95000.0).strike == 96000.0
+    assert OptionChainIndex(make_chain(rows[2:] + rows[:2])).atm_straddle(T0, 95000.0).strike == 94000.0
+
+
+def test_duplicates_and_invalid_rows():
+    rows = [
+        (T0, E1, 95000.0, 'call', 0.1), (T0, E1, 95000.0, 'call', 0.3),
+        (T0, E1, 95000.0, 'put', np.nan),
+        # 到期日为空、行权价为空或类型不明的行不参与选择
+        (T0, pd.NaT, 95000.0, 'put', 0.2), (T0, E1, np.nan, 'put', 0.2), (T0, E1, 95000.0, 'future', 0.2),
+    ]
+    quote = OptionChainIndex(make_chain(rows)).atm_straddle(T0, 95000.0)
+    # 重复行取第一行，没有看跌报价为 NaN
+    assert quote.call_ask == 0.1 and np.isnan(quote.put_ask)
+
+
+def test_empty_chain():
+    chain = OptionChainIndex(make_chain([]).astype({'strike': 'float64', 'best_ask_price': 'float64'}))
+    assert len(chain) == 0
+    assert chain.locate(T0) is None and chain.locate(T0, tolerance=3600) is None
+    assert chain.atm_straddle(T0, 95000.0, tolerance=3600) is None
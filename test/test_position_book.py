@@ -0,0 +1,86 @@
+"""按到期时间组织的持仓簿和按列记录的交易日志"""
+import datetime as dt
+
+import pandas as pd
+
+from utils.position_book import OptionPosition, PositionBook, TradeLog, minute_text, rounded
+
+D1 = dt.datetime(2025, 1, 1, 8)
+D2 = dt.datetime(2025, 1, 2, 8)
+D3 = dt.datetime(2025, 1, 3, 8)
+
+
+def book_with(*expiries):
+    book = PositionBook()
+    positions = [OptionPosition(D1, expiry, 95000.0 + i, 1.0, 95000.0) for i, expiry in enumerate(expiries)]
+    for position in positions:
+        book.add(position)
+    return book, positions
+
+
+def test_pop_due_in_opening_order():
+    # 开仓顺序与到期顺序不同，多个持仓同一根K线到期，且有到期时间相同的持仓
+    book, positions = book_with(D3, D2, D2, D1, D3)
+    assert book.next_expiry == D1
+    assert book.pop_due(D1 - dt.timedelta(minutes=5)) == []
+    # 到期时间等于 now 时到期
+    assert book.pop_due(D1) == [positions[3]]
+    assert book.pop_due(D2 + dt.timedelta(hours=1)) == [positions[1], positions[2]]
+    assert list(book) == [positions[0], positions[4]]
+    assert book.pop_due(D3 + dt.timedelta(days=1)) == [positions[0], positions[4]]
+    assert len(book) == 0 and book.next_expiry is None and book.pop_due(D3) == []
+
+
+def test_pop_due_skipping_bars_matches_list_order():
+    # 中间的K线缺失时，一次取出的多个到期日的持仓仍按开仓顺序结算，与逐个检查列表的顺序相同
+    expiries = [D2, D1, D3, D1, D2]
+    book, positions = book_with(*expiries)
+    expected = [p for p in positions if p.expiry_dt <= D3]
+    assert book.pop_due(D3) == expected
+    assert [p.seq for p in expected] == [0, 1, 2, 3, 4]
+
+
+def test_iteration_keeps_opening_order():
+    book, positions = book_with(D3, D1, D2)
+    assert list(book) == positions
+    assert len(book) == 3
+
+
+def test_trade_log_columns():
+    log = TradeLog()
+    log.append(entry_dt=D1, pnl=1.5)
+    # 新出现的列之前的行补 None，缺少的字段补 None
+    log.append(entry_dt=D2, strike=95000.0)
+    log.append(pnl=-2.0)
+    assert len(log) == 3
+    assert log.columns == {'entry_dt': [D1, D2, None], 'pnl': [1.5, None, -2.0], 'strike': [None, 95000.0, None]}
+    frame = log.to_frame()
+    assert list(frame.columns) == ['entry_dt', 'pnl', 'strike']
+    assert frame['pnl'].tolist()[0] == 1.5
+
+
+def test_trade_log_export_formats_whole_columns():
+    export = [
+        ('Entry Time', 'entry_dt', minute_text),
+        ('PnL', 'pnl', rounded(2)),
+        ('Size', 'size', None),
+        ('Note', 'note', None),
+    ]
+    log = TradeLog(export)
+    values = [1.005, 2.675, -0.125]
+    for i, pnl in enumerate(values):
+        log.append(entry_dt=D1 + dt.timedelta(minutes=i, seconds=30), pnl=pnl, size=i)
+    frame = log.to_frame()
+    assert list(frame.columns) == ['Entry Time', 'PnL', 'Size', 'Note']
+    assert frame['Entry Time'].tolist() == ['2025-01-01 08:00', '2025-01-01 08:01', '2025-01-01 08:02']
+    # 与逐笔 round() 的结果相同（包括二进制表示导致的舍入）
+    assert frame['PnL'].tolist() == [round(v, 2) for v in values]
+    assert frame['Size'].tolist() == [0, 1, 2]
+    assert frame['Note'].isna().all()
+    assert log.to_records()[0] == {'Entry Time': '2025-01-01 08:00', 'PnL': 1.0, 'Size': 0, 'Note': None}
+
+
+def test_empty_trade_log_export():
+    frame = TradeLog([('Entry Time', 'entry_dt', minute_text), ('PnL', 'pnl', rounded(2))]).to_frame()
+    assert list(frame.columns) == ['Entry Time', 'PnL'] and len(frame) == 0
+    assert TradeLog().to_frame().empty
@@ -0,0 +1,33 @@
+"""回测进度上报"""
+import pytest
+
+from core.progress import ProgressReporter
+from core.run_guard import BacktestCancelled
+
+
+def test_update_merges_into_shared_dict():
+    shared = {}
+    reporter = ProgressReporter(shared, 'job1')
+    reporter.update(bar=1, total=10)
+    reporter.update(bar=2)
+    assert shared['job1'] == {'bar': 2, 'total': 10}
+    # 写入的是副本，之后的修改不影响已上报的进度
+    reporter.info['bar'] = 3
+    assert shared['job1']['bar'] == 2
+
+
+def test_due_throttles_updates():
+    reporter = ProgressReporter({}, 'job1', interval=60)
+    assert reporter.due()
+    reporter.update(bar=1)
+    assert not reporter.due()
+    reporter.interval = 0
+    assert reporter.due()
+
+
+def test_check_raises_after_stop_requested():
+    reporter = ProgressReporter({}, 'job1')
+    reporter.check()
+    reporter.stop_reason = 'cancelled'
+    with pytest.raises(BacktestCancelled, match='cancelled'):
+        reporter.check()
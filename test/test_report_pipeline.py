@@ -0,0 +1,58 @@
+"""报告生成阶段：并行执行、失败隔离和耗时记录"""
+import time
+import threading
+
+from core.report_pipeline import ReportPipeline
+
+
+def sleep_and_record(seconds, threads):
+    time.sleep(seconds)
+    threads.append(threading.current_thread().name)
+
+
+def fail():
+    raise RuntimeError('plot failed')
+
+
+def test_reports_run_concurrently_in_threads():
+    threads = []
+    pipeline = ReportPipeline()
+    pipeline.add('a', sleep_and_record, 0.3, threads)
+    pipeline.add('b', sleep_and_record, 0.3, threads)
+    pipeline.add('local', sleep_and_record, 0.3, threads, local=True)
+    start = time.perf_counter()
+    timings = pipeline.run()
+    assert time.perf_counter() - start < 0.8
+    assert {name: t['status'] for name, t in timings.items()} == {'a': 'success', 'b': 'success', 'local': 'success'}
+    assert all(t['seconds'] >= 0.3 for t in timings.values())
+    # local 报告在调用 run() 的线程中生成，其余在线程池中
+    assert threading.current_thread().name in threads
+    assert sum(name.startswith('report') for name in threads) == 2
+
+
+def test_failure_does_not_affect_other_reports():
+    threads = []
+    pipeline = ReportPipeline()
+    pipeline.add('broken', fail)
+    pipeline.add('local_broken', fail, local=True)
+    pipeline.add('ok', sleep_and_record, 0, threads)
+    timings = pipeline.run()
+    assert timings['broken'] == {'status': 'failed', 'seconds': timings['broken']['seconds'],
+                                 'error': 'RuntimeError: plot failed'}
+    assert timings['local_broken']['status'] == 'failed'
+    assert timings['ok']['status'] == 'success'
+    assert len(threads) == 1
+
+
+def test_sequential_when_workers_disabled(monkeypatch):
+    monkeypatch.setenv('BACKTEST_REPORT_WORKERS', '0')
+    threads = []
+    pipeline = ReportPipeline()
+    pipeline.add('a', sleep_and_record, 0, threads)
+    pipeline.add('b', sleep_and_record, 0, threads)
+    assert set(pipeline.run()) == {'a', 'b'}
+    assert threads == [threading.current_thread().name] * 2
+
+
+def test_empty_pipeline():
+    assert ReportPipeline().run() == {}
@@ -0,0 +1,79 @@
+"""
+回测报告：即时生成和延迟生成（report_mode='lazy'）
+延迟生成的报告都由保存的原始输出绘制，不重新执行回测
+"""
+import os
+import json
+
+import pandas as pd
+import pytest
+
+import core.backtrader_runer as bt_runer
+import strategies.f_sma_cross as f_sma_cross
+from signal_parity import make_bars, synthetic_feed
+
+PARAMS = {'cash': 500000, 'commission': 0.002, 'n1': 5, 'n2': 20}
+
+
+@pytest.fixture
+def lazy_result(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    datafeed = synthetic_feed(f_sma_cross, make_bars(3, 1, seed=3))
+    return bt_runer.run_backtest('f_sma_cross', f_sma_cross.FSmaCross, f_sma_cross, datafeed=datafeed,
+                                 report_mode='lazy', **PARAMS)
+
+
+def test_lazy_mode_saves_chart_data_only(lazy_result):
+    assert lazy_result['report_mode'] == 'lazy'
+    assert set(lazy_result['report_timings']) == {'json'}
+    assert not os.path.exists(lazy_result['html_path'])
+    assert not os.path.exists(lazy_result['pf_report_path'])
+
+    raw = pd.read_pickle(lazy_result['raw_path'])
+    bars, trades = raw['chart']['bars'], raw['chart']['trades']
+    assert len(bars) == 3 * 288
+    assert bars['value'].iloc[0] == PARAMS['cash']
+    # 成交记录与 PyFolio 分析器的成交一致
+    transactions = raw['transactions']
+    assert len(trades) == len(transactions) > 0
+    assert trades['size'].tolist() == transactions['amount'].tolist()
+    assert trades['price'].tolist() == transactions['price'].tolist()
+    assert (trades['datetime'].to_numpy() == transactions.index.tz_localize(None).to_numpy()).all()
+
+
+def test_render_lazy_reports_without_rerun(lazy_result, monkeypatch):
+    def no_rerun(*args, **kwargs):
+        raise AssertionError('延迟生成报告不应重新执行回测')
+    monkeypatch.setattr(bt_runer, 'build_cerebro', no_rerun)
+
+    result_id = lazy_result['result_id']
+    html_path = bt_runer.render_report('f_sma_cross', result_id, 'bt')
+    assert html_path == lazy_result['html_path']
+    with open(html_path) as f:
+        assert 'Bokeh' in f.read()
+    assert bt_runer.render_report('f_sma_cross', result_id, 'pf') == lazy_result['pf_report_path']
+    assert os.path.getsize(lazy_result['pf_report_path']) > 0
+
+
+def test_render_without_chart_data_fails(lazy_result):
+    raw = pd.read_pickle(lazy_result['raw_path'])
+    raw['chart'] = None
+    pd.to_pickle(raw, lazy_result['raw_path'])
+    with pytest.raises(ValueError, match='绘图数据'):
+        bt_runer.render_report('f_sma_cross', lazy_result['result_id'], 'bt')
+    with pytest.raises(ValueError):
+        bt_runer.render_report('f_sma_cross', lazy_result['result_id'], 'trades')
+
+
+def test_eager_mode_renders_all_reports(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    datafeed = synthetic_feed(f_sma_cross, make_bars(2, 1, seed=3))
+    result = bt_runer.run_backtest('f_sma_cross', f_sma_cross.FSmaCross, f_sma_cross, datafeed=datafeed,
+                                   report_mode='eager', **PARAMS)
+    assert os.path.getsize(result['html_path']) > 0
+    assert os.path.getsize(result['pf_report_path']) > 0
+    assert pd.read_pickle(result['raw_path'])['chart'] is None
+    with open(result['json_path']) as f:
+        timings = json.load(f)['report_timings']
+    assert {name: t['status'] for name, t in timings.items()} == \
+        {'json': 'success', 'bokeh': 'success', 'quantstats': 'success'}
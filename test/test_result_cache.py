@@ -0,0 +1,135 @@
+"""回测结果缓存：键的规范化、命中和淘汰"""
+import os
+import json
+import time
+import types
+from datetime import datetime
+
+import pytest
+
+from core.result_cache import ResultCache
+
+
+@pytest.fixture
+def module(tmp_path):
+    path = tmp_path / 'strategy.py'
+    path.write_text('N = 1\n')
+    return types.SimpleNamespace(__file__=str(path))
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResultCache(str(tmp_path / 'cache'), max_bytes=1024, max_age_days=1, evict_interval=0)
+
+
+def make_result(tmp_path, result_id, size=10):
+    path = tmp_path / f"{result_id}.pkl"
+    path.write_bytes(b'x' * size)
+    return {'result_id': result_id, 'raw_path': str(path), 'stats': {'sharpe': 1.0}}
+
+
+def entries(cache):
+    return sorted(name[:-len('.json')] for name in os.listdir(cache.cache_dir))
+
+
+def entry_size(cache, key):
+    return os.path.getsize(os.path.join(cache.cache_dir, f"{key}.json"))
+
+
+def test_equivalent_params_share_key(cache, module):
+    key = cache.make_key('f_sma_cross', module, {'n1': 10, 'begin_time': '2025-01-01'})
+    assert key == cache.make_key('f_sma_cross', module, {'n1': 10.0, 'begin_time': '2025-01-01 00:00:00'})
+    assert key == cache.make_key('f_sma_cross', module, {'begin_time': datetime(2025, 1, 1), 'n1': 10})
+    assert key != cache.make_key('f_sma_cross', module, {'n1': 10.5, 'begin_time': '2025-01-01'})
+    assert key != cache.make_key('o_sma_cross', module, {'n1': 10, 'begin_time': '2025-01-01'})
+
+
+def test_report_mode_changes_key(cache, module):
+    # 延迟生成的结果没有已生成的报告，即时生成的请求不能命中
+    params = {'n1': 10}
+    assert cache.make_key('f_sma_cross', module, params, 'lazy') != cache.make_key('f_sma_cross', module, params, 'eager')
+
+
+def test_source_change_changes_key(cache, module):
+    key = cache.make_key('f_sma_cross', module, {'n1': 10})
+    with open(module.__file__, 'a') as f:
+        f.write('N = 2\n')
+    assert key != cache.make_key('f_sma_cross', module, {'n1': 10})
+
+
+def test_put_and_get(cache, tmp_path):
+    assert cache.get('k1') is None
+    result = make_result(tmp_path, 'r1')
+    cache.put('k1', 'f_sma_cross', result)
+    assert cache.get('k1') == dict(result, cached=True)
+
+
+def test_missing_artifact_invalidates_entry(cache, tmp_path):
+    result = make_result(tmp_path, 'r1')
+    cache.put('k1', 'f_sma_cross', result)
+    os.remove(result['raw_path'])
+    assert cache.get('k1') is None
+    assert os.listdir(cache.cache_dir) == []
+
+
+def test_entry_removed_before_hit_is_a_miss(cache, tmp_path, monkeypatch):
+    cache.put('k1', 'f_sma_cross', make_result(tmp_path, 'r1'))
+    # 读取条目之后、记录命中时间之前被其他进程淘汰
+    utime = os.utime
+
+    def evicted_utime(path, *args):
+        os.remove(path)
+        return utime(path, *args)
+
+    monkeypatch.setattr(os, 'utime', evicted_utime)
+    assert cache.get('k1') is None
+
+
+def test_evict_expired_entries(cache, tmp_path):
+    old = make_result(tmp_path, 'old')
+    cache.put('old', 'f_sma_cross', old)
+    path = os.path.join(cache.cache_dir, 'old.json')
+    with open(path) as f:
+        entry = json.load(f)
+    entry['created'] -= 2 * 86400
+    with open(path, 'w') as f:
+        json.dump(entry, f)
+    cache.put('new', 'f_sma_cross', make_result(tmp_path, 'new'))
+    assert entries(cache) == ['new']
+    # 只删除缓存条目，结果文件保留
+    assert os.path.exists(old['raw_path'])
+
+
+def test_evict_least_recently_hit_over_size(cache, tmp_path):
+    for i, name in enumerate(['a', 'b']):
+        cache.put(name, 'f_sma_cross', make_result(tmp_path, name))
+        os.utime(os.path.join(cache.cache_dir, f"{name}.json"), (1000 + i, 1000 + i))
+    # 缓存目录只能容纳两个条目
+    cache.max_bytes = entry_size(cache, 'a') * 2.5
+    # 命中 a 后 b 成为最久未命中的条目
+    assert cache.get('a') is not None
+    cache.put('c', 'f_sma_cross', make_result(tmp_path, 'c'))
+    assert entries(cache) == ['a', 'c']
+    assert os.path.exists(tmp_path / 'b.pkl')
+
+
+def test_put_throttles_eviction(cache, tmp_path):
+    cache.evict_interval = 3600
+    cache.put('a', 'f_sma_cross', make_result(tmp_path, 'a'))
+    cache.max_bytes = entry_size(cache, 'a') * 1.5
+    cache.put('b', 'f_sma_cross', make_result(tmp_path, 'b'))
+    # 第一次写入时已淘汰过，间隔内不再淘汰
+    assert entries(cache) == ['a', 'b']
+    os.utime(os.path.join(cache.cache_dir, 'a.json'), (1000, 1000))
+    cache.evict()
+    assert entries(cache) == ['b']
+
+
+def test_concurrent_remove_evicts_once(cache, tmp_path):
+    result = make_result(tmp_path, 'r1')
+    cache.put('k1', 'f_sma_cross', result)
+    path = os.path.join(cache.cache_dir, 'k1.json')
+    # 两个进程读到同一条目后先后删除
+    assert cache._remove(path) is True
+    assert cache._remove(path) is False
+    assert os.path.exists(result['raw_path'])
@@ -0,0 +1,91 @@
+"""回测结果索引：过滤、排序和分页"""
+import os
+import json
+
+import pytest
+
+from core.results_catalog import ResultsCatalog
+
+
+def record(result_id, timestamp, sharpe, **params):
+    return {
+        'result_id': f"f_sma_cross_{result_id}",
+        'timestamp': timestamp,
+        'parameters': params,
+        'stats': {'sharpe': sharpe, 'rtot': 0.1},
+    }
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    catalog = ResultsCatalog(str(tmp_path / 'results'))
+    catalog.add('f_sma_cross', record('20250101_000001', '2025-01-01T00:00:01', 1.0, n1=10, n2=20))
+    catalog.add('f_sma_cross', record('20250101_000002', '2025-01-01T00:00:02', None, n1=10.0, n2=30))
+    catalog.add('f_sma_cross', record('20250101_000003', '2025-01-01T00:00:03', 2.0, n1='10', n2=20))
+    catalog.add('f_sma_cross', record('20250101_000004', '2025-01-01T00:00:04', 0.5, n1=5, n2=20, mode='fast'))
+    catalog.add('o_sma_cross', record('20250101_000005', '2025-01-01T00:00:05', 3.0, n1=10))
+    return catalog
+
+
+def ids(res):
+    return [item['result_id'] for item in res['items']]
+
+
+def test_default_order_is_newest_first(catalog):
+    res = catalog.query('f_sma_cross')
+    assert res['total'] == 4
+    assert ids(res) == ['20250101_000004', '20250101_000003', '20250101_000002', '20250101_000001']
+    item = res['items'][0]
+    assert item['params'] == {'n1': 5, 'n2': 20, 'mode': 'fast'}
+    assert item['stats']['sharpe'] == 0.5
+    assert item['report_url'] == '/api/reports/f_sma_cross/f_sma_cross_20250101_000004/bt'
+
+
+@pytest.mark.parametrize('value', [10, 10.0, '10', '10.0'])
+def test_numeric_filter_matches_any_stored_form(catalog, value):
+    res = catalog.query('f_sma_cross', filters={'n1': value})
+    assert res['total'] == 3
+    assert sorted(ids(res)) == ['20250101_000001', '20250101_000002', '20250101_000003']
+
+
+def test_combined_and_text_filters(catalog):
+    assert ids(catalog.query('f_sma_cross', filters={'n1': '10', 'n2': 20})) == \
+        ['20250101_000003', '20250101_000001']
+    assert ids(catalog.query('f_sma_cross', filters={'mode': 'fast'})) == ['20250101_000004']
+    assert catalog.query('f_sma_cross', filters={'n1': 11})['total'] == 0
+
+
+def test_sort_by_metric(catalog):
+    # SQLite 中 NULL 最小，降序时排在最后
+    assert ids(catalog.query('f_sma_cross', sort='sharpe', order='desc')) == \
+        ['20250101_000003', '20250101_000001', '20250101_000004', '20250101_000002']
+    assert ids(catalog.query('f_sma_cross', sort='sharpe', order='asc'))[1:] == \
+        ['20250101_000004', '20250101_000001', '20250101_000003']
+
+
+def test_paging(catalog):
+    res = catalog.query('f_sma_cross', page=2, page_size=3)
+    assert (res['total'], res['page'], res['page_size']) == (4, 2, 3)
+    assert ids(res) == ['20250101_000001']
+    assert catalog.query('f_sma_cross', page=3, page_size=3)['items'] == []
+
+
+def test_rejects_invalid_sort_and_key(catalog):
+    with pytest.raises(ValueError):
+        catalog.query('f_sma_cross', sort='params')
+    with pytest.raises(ValueError):
+        catalog.query('f_sma_cross', filters={"n1') or 1=1 --": 1})
+
+
+def test_remove(catalog):
+    catalog.remove('f_sma_cross_20250101_000001')
+    assert catalog.query('f_sma_cross')['total'] == 3
+
+
+def test_imports_existing_json_results(tmp_path):
+    results_dir = tmp_path / 'results'
+    os.makedirs(results_dir / 'f_sma_cross')
+    with open(results_dir / 'f_sma_cross' / 'f_sma_cross_20250101_000001.json', 'w') as f:
+        json.dump(record('20250101_000001', '2025-01-01T00:00:01', 1.0, n1=10), f)
+    (results_dir / 'f_sma_cross' / 'broken.json').write_text('{')
+    assert ResultsCatalog(str(results_dir)).query('f_sma_cross')['total'] == 1
@@ -0,0 +1,69 @@
+"""回测运行看门狗：取消请求、超时、内存上限和宽限期后的中断"""
+import time
+import signal
+
+import pytest
+
+from core.progress import ProgressReporter
+from core.run_guard import RunGuard
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('等待超时')
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def reporter():
+    return ProgressReporter({}, 'job1')
+
+
+def test_no_stop_without_trigger(reporter):
+    guard = RunGuard(reporter, {}, timeout=0, max_rss_mb=0, interval=0.01).start()
+    time.sleep(0.05)
+    guard.stop()
+    assert guard.reason is None and reporter.stop_reason is None
+
+
+def test_cancel_request_sets_stop_reason(reporter):
+    guard = RunGuard(reporter, {'job1': '用户取消'}, timeout=0, max_rss_mb=0, interval=0.01).start()
+    try:
+        wait_for(lambda: reporter.stop_reason is not None)
+    finally:
+        guard.stop()
+    assert guard.reason == reporter.stop_reason == '用户取消'
+    assert not guard.interrupted
+
+
+def test_timeout(reporter):
+    guard = RunGuard(reporter, None, timeout=0.05, max_rss_mb=0, interval=0.01).start()
+    try:
+        wait_for(lambda: reporter.stop_reason is not None)
+    finally:
+        guard.stop()
+    assert '运行时间上限' in guard.reason
+
+
+def test_memory_ceiling(reporter):
+    guard = RunGuard(reporter, None, timeout=0, max_rss_mb=1, interval=0.01).start()
+    try:
+        wait_for(lambda: reporter.stop_reason is not None)
+    finally:
+        guard.stop()
+    assert '内存占用' in guard.reason
+
+
+def test_interrupts_main_thread_after_grace(reporter):
+    previous = signal.getsignal(signal.SIGUSR1)
+    guard = RunGuard(reporter, {'job1': '用户取消'}, timeout=0, max_rss_mb=0, interval=0.01, grace=0.1).start()
+    try:
+        with pytest.raises(KeyboardInterrupt):
+            # 没有检查 stop_reason 的阻塞操作
+            time.sleep(5)
+    finally:
+        guard.stop()
+    assert guard.interrupted
+    assert signal.getsignal(signal.SIGUSR1) is previous
@@ -0,0 +1,99 @@
+"""调度触发K线：与逐根K线检查时间表的结果一致"""
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+import pytz
+
+from utils.array_feed import date2num_array
+from utils.schedule_triggers import ScheduleTriggers
+
+HKT = pytz.timezone('Asia/Hong_Kong')
+
+
+def per_bar_triggers(schedule, stamps, tz=HKT):
+    """逐根K线检查时间表（ScheduleTriggers 之前策略 next() 中的写法），返回 [(K线序号, UTC 时间, portion), ...]"""
+    fired = []
+    last_signature = None
+    for bar, stamp in enumerate(stamps):
+        current_dt_utc = stamp.to_pydatetime().replace(tzinfo=pytz.utc)
+        current_dt_hkt = current_dt_utc.astimezone(tz)
+        current_time = current_dt_hkt.time()
+        for sched_time, portion in schedule:
+            if current_time.hour == sched_time.hour:
+                if sched_time.minute <= current_time.minute < (sched_time.minute + 5):
+                    sig = f"{current_dt_hkt.date()}_{sched_time.hour}:{sched_time.minute}"
+                    if last_signature != sig:
+                        fired.append((bar, current_dt_utc, portion))
+                        last_signature = sig
+    return fired
+
+
+def make_stamps():
+    """不带时区的 UTC 时间：5 分钟K线中夹杂 1 分钟K线，同一调度窗口内有多根K线"""
+    five = pd.date_range('2025-01-01 08:05', '2025-01-04 08:05', freq='5min')
+    one = pd.date_range('2025-01-02 00:00', '2025-01-02 01:00', freq='1min')
+    return five.union(one)
+
+
+SCHEDULE = [
+    # 第一根和最后一根K线（16:05 HKT）都触发
+    (dt.time(16, 5), 0.1),
+    # 与上一项签名相同，同一根K线上不再触发
+    (dt.time(16, 5), 0.2),
+    # 与 08:00 同一根K线匹配时按时间表的顺序依次触发
+    (dt.time(8, 2), 0.3),
+    (dt.time(8, 0), 0.4),
+    (dt.time(0, 0), 0.5),
+    (dt.time(23, 58), 0.6),
+]
+
+
+def test_matches_per_bar_checks():
+    stamps = make_stamps()
+    triggers = ScheduleTriggers(SCHEDULE, stamps, tz='Asia/Hong_Kong')
+    expected = per_bar_triggers(SCHEDULE, stamps)
+    assert list(triggers.bars) == [bar for bar, _, _ in expected]
+    assert triggers.times == [when for _, when, _ in expected]
+    assert triggers.portions == [portion for _, _, portion in expected]
+    assert triggers.bars[0] == 0 and triggers.bars[-1] == len(stamps) - 1
+
+
+def test_repeated_signature_across_schedule_entries():
+    # 只记录上一次触发的签名：08:00 和 08:02 的窗口重叠时两者交替，每根K线都触发
+    stamps = pd.date_range('2025-01-02 00:00', '2025-01-02 00:06', freq='1min')
+    schedule = [(dt.time(8, 0), 0.1), (dt.time(8, 2), 0.2)]
+    triggers = ScheduleTriggers(schedule, stamps)
+    expected = per_bar_triggers(schedule, stamps)
+    assert list(zip(triggers.bars, triggers.portions)) == [(bar, portion) for bar, _, portion in expected]
+    assert len(expected) > 2
+
+
+def test_tz_aware_stamps_and_empty():
+    stamps = make_stamps()
+    naive = ScheduleTriggers(SCHEDULE, stamps)
+    aware = ScheduleTriggers(SCHEDULE, stamps.tz_localize('UTC').tz_convert('Asia/Hong_Kong'))
+    assert list(aware.bars) == list(naive.bars) and aware.times == naive.times
+    for empty in (ScheduleTriggers([], stamps), ScheduleTriggers(SCHEDULE, stamps[:0])):
+        assert len(empty) == 0 and empty.next_num == np.inf and empty.pop(1e9) == []
+
+
+def test_pop_in_bar_order():
+    stamps = make_stamps()
+    triggers = ScheduleTriggers(SCHEDULE, stamps)
+    nums = date2num_array(stamps.asi8)
+    fired = []
+    for bar, now in enumerate(nums):
+        if now >= triggers.next_num:
+            fired.extend((bar, when, portion) for when, portion in triggers.pop(now))
+    assert fired == per_bar_triggers(SCHEDULE, stamps)
+    assert triggers.next_num == np.inf
+
+
+def test_pop_skips_missing_bars():
+    stamps = make_stamps()
+    triggers = ScheduleTriggers(SCHEDULE, stamps)
+    # 跳过第一根触发K线（如被 fromdate 过滤），它的触发不再执行
+    first, second = triggers.nums[0], triggers.nums[1]
+    assert triggers.pop(second) == [(triggers.times[1], triggers.portions[1])]
+    assert triggers.pop(first) == []
@@ -0,0 +1,121 @@
+"""服务端接口：任务队列的生命周期和进度推送"""
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    # 服务在当前目录下创建 results、static、templates
+    monkeypatch.chdir(tmp_path)
+    import server
+    return server
+
+
+class FakeJobManager:
+    instances = []
+
+    def __init__(self):
+        self.closed = False
+        FakeJobManager.instances.append(self)
+
+    def shutdown(self):
+        self.closed = True
+
+
+def test_import_does_not_start_job_manager(server):
+    assert server.job_manager is None
+
+
+def test_lifespan_creates_and_shuts_down_job_manager(server, monkeypatch):
+    monkeypatch.setattr(server, 'JobManager', FakeJobManager)
+    FakeJobManager.instances.clear()
+    with TestClient(server.app):
+        assert server.job_manager is FakeJobManager.instances[0]
+    assert FakeJobManager.instances[0].closed
+    assert server.job_manager is None
+
+
+class ScriptedJobManager:
+    """按顺序返回预先给定的任务状态，最后一个状态之后保持不变"""
+
+    def __init__(self, states):
+        self.states = list(states)
+
+    def get(self, job_id):
+        if job_id != 'job1':
+            return None
+        return self.states.pop(0) if len(self.states) > 1 else self.states[0]
+
+
+def test_job_events_streams_progress_until_finished(server, monkeypatch):
+    running = {'job_id': 'job1', 'status': 'running', 'progress': {'bar': 1}}
+    states = [
+        {'job_id': 'job1', 'status': 'queued'},  # 接口先检查任务是否存在
+        {'job_id': 'job1', 'status': 'queued'},
+        running, running,  # 未变化的状态不重复推送
+        {'job_id': 'job1', 'status': 'running', 'progress': {'bar': 2}},
+        {'job_id': 'job1', 'status': 'success', 'result': {'result_id': 'r1'}},
+    ]
+    monkeypatch.setattr(server, 'job_manager', ScriptedJobManager(states))
+    with TestClient(server.app) as client:
+        response = client.get('/api/jobs/job1/events')
+    assert response.headers['content-type'].startswith('text/event-stream')
+    events = [json.loads(line[len('data: '):]) for line in response.text.split('\n\n') if line]
+    assert [e['status'] for e in events] == ['queued', 'running', 'running', 'success']
+    assert [e.get('progress') for e in events[1:3]] == [{'bar': 1}, {'bar': 2}]
+
+
+def test_job_events_unknown_job(server, monkeypatch):
+    monkeypatch.setattr(server, 'job_manager', ScriptedJobManager([None]))
+    with TestClient(server.app) as client:
+        assert client.get('/api/jobs/missing/events').status_code == 404
+
+
+def test_job_events_end_when_job_is_pruned(server, monkeypatch):
+    states = [
+        {'job_id': 'job1', 'status': 'running'},
+        {'job_id': 'job1', 'status': 'running'},
+        None,
+    ]
+    monkeypatch.setattr(server, 'job_manager', ScriptedJobManager(states))
+    with TestClient(server.app) as client:
+        response = client.get('/api/jobs/job1/events')
+    assert response.status_code == 200
+    events = [json.loads(line[len('data: '):]) for line in response.text.split('\n\n') if line]
+    assert [e['status'] for e in events] == ['running']
+
+
+class RecordingRunner:
+    def __init__(self):
+        self.filters = []
+
+    def load_all_results(self, strategy_name, page, page_size, sort, order, filters):
+        if sort == 'bad':
+            raise ValueError('unknown sort')
+        self.filters.append(filters)
+        return {'items': [], 'total': 0}
+
+
+@pytest.mark.parametrize('params', ['[1]', '1', '"n1"', 'null', '{bad'])
+def test_records_rejects_non_object_params(server, monkeypatch, params):
+    runner = RecordingRunner()
+    monkeypatch.setattr(server, 'runner', runner)
+    monkeypatch.setattr(server, 'job_manager', FakeJobManager())
+    with TestClient(server.app) as client:
+        response = client.get('/api/records', params={'strategies_name': 'f_sma_cross', 'params': params})
+    assert response.status_code == 400
+    assert runner.filters == []
+
+
+def test_records_passes_filters(server, monkeypatch):
+    runner = RecordingRunner()
+    monkeypatch.setattr(server, 'runner', runner)
+    monkeypatch.setattr(server, 'job_manager', FakeJobManager())
+    with TestClient(server.app) as client:
+        url = '/api/records'
+        assert client.get(url, params={'strategies_name': 's', 'params': '{"n1": 10}'}).status_code == 200
+        assert client.get(url, params={'strategies_name': 's'}).status_code == 200
+        assert client.get(url, params={'strategies_name': 's', 'sort': 'bad'}).status_code == 400
+    assert runner.filters == [{'n1': 10}, None]
@@ -0,0 +1,153 @@
+"""共享内存行情数据：发布、映射、释放和按预算淘汰"""
+import threading
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.shared_data import SharedFrameStore, query_key
+from utils.data_feed_utils import mark_price_bars
+
+
+def make_frame(rows=100):
+    return pd.DataFrame({
+        'datetime': pd.date_range('2025-01-01', periods=rows, freq='5min', tz='UTC'),
+        'expiration_date': pd.to_datetime(['2025-03-28'] * rows),
+        'instrument_name': [f"BTC-{i % 3}" for i in range(rows)],
+        'claim_type': pd.Categorical(['call', 'put'] * (rows // 2)),
+        'mark_price': np.linspace(0.01, 0.5, rows),
+        'volume': np.arange(rows, dtype='int64'),
+    })
+
+
+@pytest.fixture
+def store():
+    store = SharedFrameStore({}, threading.Lock(), budget_mb=10)
+    yield store
+    store.release_all()
+    store.clear()
+
+
+def segment_exists(name):
+    try:
+        shared_memory.SharedMemory(name=name).close()
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def test_publish_round_trip(store):
+    df = make_frame().set_index(pd.Index(np.arange(100) * 2, name='row'))
+    shared = store.publish('k1', df)
+    # 字符串列以 category 编码保存
+    pd.testing.assert_frame_equal(shared, df.assign(instrument_name=df['instrument_name'].astype('category')))
+    assert not shared['mark_price'].to_numpy().flags.writeable
+    with pytest.raises(ValueError):
+        shared['mark_price'].to_numpy()[0] = 1.0
+
+
+def test_round_trip_keeps_datetime_units(store):
+    df = pd.DataFrame(index=range(3))
+    for unit in ('s', 'ms', 'us', 'ns'):
+        values = pd.to_datetime(['2025-01-01 00:00:00', '2026-01-01 08:30:00', '2026-06-30 23:59:59']).as_unit(unit)
+        df[f'naive_{unit}'] = values
+        df[f'utc_{unit}'] = values.tz_localize('UTC')
+        df[f'hkt_{unit}'] = values.tz_localize('Asia/Hong_Kong')
+    shared = store.publish('k1', df)
+    pd.testing.assert_frame_equal(shared, df)
+    assert shared['utc_s'].dtype == 'datetime64[s, UTC]'
+    assert shared['utc_s'].iloc[1] == pd.Timestamp('2026-01-01 08:30', tz='UTC')
+
+
+def test_get_or_load_loads_once(store):
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return make_frame()
+
+    first = store.get_or_load('k1', loader)
+    assert store.get_or_load('k1', loader) is first
+    assert len(calls) == 1
+    assert store.stats() == {'datasets': 1, 'used_mb': store.stats()['used_mb'], 'budget_mb': 10.0, 'held': 1}
+    store.release_all()
+    assert store.stats()['held'] == 0
+    # 释放后数据仍在共享内存中，再次读取不需要加载
+    pd.testing.assert_frame_equal(store.get_or_load('k1', loader), first)
+    assert len(calls) == 1
+
+
+def test_failed_load_is_not_registered(store):
+    def loader():
+        raise RuntimeError('db down')
+
+    with pytest.raises(RuntimeError):
+        store.get_or_load('k1', loader)
+    assert store.registry == {}
+
+
+def test_disabled_or_over_budget_returns_loaded_frame():
+    df = make_frame()
+    disabled = SharedFrameStore({}, threading.Lock(), budget_mb=0)
+    assert disabled.get_or_load('k1', lambda: df) is df
+    assert disabled.registry == {}
+    tiny = SharedFrameStore({}, threading.Lock(), budget_mb=0.001)
+    assert tiny.get_or_load('k1', lambda: df) is df
+    assert tiny.registry == {}
+
+
+def test_evicts_least_recently_used_unheld_data(store):
+    store.budget = 20_000
+    store.publish('old', make_frame(300))
+    old_segment = store.registry['old']['segment']
+    store.release_all()
+    store.publish('new', make_frame(300))
+    assert 'old' not in store.registry and not segment_exists(old_segment)
+    # 仍被持有的数据不淘汰，放不下时不共享
+    assert store.publish('newer', make_frame(300)) is None
+    assert 'new' in store.registry
+
+
+def test_clear_unlinks_segments(store):
+    store.publish('k1', make_frame())
+    segment = store.registry['k1']['segment']
+    store.release_all()
+    store.clear()
+    assert store.registry == {} and not segment_exists(segment)
+
+
+def _child_read(store, queue):
+    def loader():
+        raise AssertionError('子进程不应重新加载')
+    try:
+        df = store.get_or_load('k1', loader)
+        queue.put(float(df['mark_price'].sum()))
+    finally:
+        store.release_all()
+
+
+def test_shared_across_processes():
+    ctx = multiprocessing.get_context('fork')
+    with ctx.Manager() as manager:
+        store = SharedFrameStore(manager.dict(), manager.Lock(), budget_mb=10)
+        try:
+            df = store.get_or_load('k1', make_frame)
+            queue = ctx.Queue()
+            child = ctx.Process(target=_child_read, args=(store, queue))
+            child.start()
+            assert queue.get(timeout=30) == float(df['mark_price'].sum())
+            child.join(timeout=30)
+            assert child.exitcode == 0
+        finally:
+            store.release_all()
+            store.clear()
+
+
+def test_query_key():
+    key = query_key('crypto_futures_5m', '2025-01-01', '2025-02-01', columns=['datetime'], convert=mark_price_bars)
+    assert key == query_key('crypto_futures_5m', pd.Timestamp('2025-01-01'), '2025-02-01 00:00:00',
+                            columns=['datetime'], convert=mark_price_bars)
+    assert 'utils.data_feed_utils.mark_price_bars' in key
+    assert key != query_key('crypto_futures_5m', '2025-01-01', '2025-02-01', columns=['datetime'])
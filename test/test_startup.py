@@ -0,0 +1,33 @@
+"""服务启动：回测引擎及其依赖延迟导入，启动耗时报告的解析"""
+import os
+import sys
+import subprocess
+
+from utils.startup_profile import parse_importtime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ['backtrader', 'bokeh', 'pyfolio', 'quantstats', 'matplotlib', 'core.backtrader_runer']
+
+
+def test_import_server_does_not_load_backtest_engines(tmp_path):
+    script = f"import sys, server; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    proc = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, env=env, cwd=tmp_path)
+    assert proc.returncode == 0, proc.stderr
+    assert proc.stdout.strip() == ''
+
+
+def test_parse_importtime():
+    stderr = '\n'.join([
+        'import time: self [us] | cumulative | imported package',
+        'import time:       120 |        120 |   _io',
+        'import time:      2500 |       3100 | pandas',
+        'import time:       600 |        600 |     pandas.core',
+        'some other line',
+    ])
+    assert parse_importtime(stderr) == [
+        ('_io', 120, 120, 1),
+        ('pandas', 2500, 3100, 0),
+        ('pandas.core', 600, 600, 2),
+    ]
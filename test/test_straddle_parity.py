@@ -0,0 +1,27 @@
+"""OStraddleStrategy 的 backtrader 回测与向量化引擎一致，对比的内容见 straddle_parity.py"""
+import backtrader as bt
+import pandas as pd
+
+import straddle_parity
+from core.backtrader_runer import ChartRecorder
+
+
+def test_straddle_parity(tmp_path, monkeypatch):
+    # 交易记录可能导出到当前目录
+    monkeypatch.chdir(tmp_path)
+    straddle_parity.main(3)
+
+
+def test_straddle_chart_matches_backtrader_recorder(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    df, df_spot = straddle_parity.make_chain(2)
+    cerebro = bt.Cerebro(stdstats=False)
+    cerebro.broker.set_cash(straddle_parity.CASH)
+    cerebro.addstrategy(straddle_parity.OStraddleStrategy, df_market=df, schedule=straddle_parity.SCHEDULE)
+    cerebro.adddata(straddle_parity.SpotClockData(dataname=df_spot, name='all'))
+    cerebro.addanalyzer(ChartRecorder, _name='chart')
+    expected = cerebro.run()[0].analyzers.getbyname('chart').get_analysis()
+    chart = straddle_parity.run_vector(df, df_spot)[2].chart()
+    # 策略不通过 broker 下单，图表上没有成交
+    assert expected['trades'].empty and chart['trades'].empty
+    pd.testing.assert_frame_equal(chart['bars'], expected['bars'])
@@ -0,0 +1,92 @@
+"""策略注册表：缓存策略模块，文件修改时间变化时重新加载"""
+import os
+import sys
+import importlib
+
+import pytest
+
+from core.strategy_registry import StrategyRegistry
+from core.backtest_engine import StrategyRunner
+
+PACKAGE = 'registry_test_strategies'
+
+
+def write_strategy(directory, name, text, mtime):
+    path = directory / f"{name}.py"
+    path.write_text(text)
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+@pytest.fixture
+def strategies(tmp_path, monkeypatch):
+    directory = tmp_path / PACKAGE
+    directory.mkdir()
+    write_strategy(directory, 'alpha', "paramecfg = {'n1': 10}\nbackengine = 'vector'\n", 1000)
+    write_strategy(directory, 'beta', "parametmp = '<form>beta</form>'\n", 1000)
+    write_strategy(directory, 'run_xxx', "paramecfg = {}\n", 1000)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    importlib.invalidate_caches()
+    yield directory
+    for name in [m for m in sys.modules if m == PACKAGE or m.startswith(f"{PACKAGE}.")]:
+        del sys.modules[name]
+
+
+@pytest.fixture
+def registry(strategies):
+    return StrategyRegistry(PACKAGE, form_builder=lambda cfg: f"form {sorted(cfg)}")
+
+
+def test_list_strategies(registry):
+    entries = registry.list()
+    assert [e['name'] for e in entries] == ['alpha', 'beta']
+    alpha, beta = entries
+    assert alpha['paramecfg'] == {'n1': 10}
+    assert alpha['params'] == "form ['n1']"
+    assert alpha['backengine'] == 'vector'
+    assert beta['params'] == '<form>beta</form>'
+    assert beta['backengine'] == ''
+
+
+def test_get_is_cached_until_mtime_changes(registry, strategies):
+    entry = registry.get('alpha')
+    assert registry.get('alpha') is entry
+
+    # 内容变化但修改时间不变时沿用缓存
+    write_strategy(strategies, 'alpha', "paramecfg = {'n2': 20}\n", 1000)
+    assert registry.get('alpha') is entry
+
+    write_strategy(strategies, 'alpha', "paramecfg = {'n2': 20}\n", 2000)
+    reloaded = registry.get('alpha')
+    assert reloaded is not entry
+    assert reloaded['paramecfg'] == {'n2': 20}
+    assert reloaded['module'] is sys.modules[f"{PACKAGE}.alpha"]
+
+
+def test_html_template_change_reloads(registry, strategies):
+    entry = registry.get('alpha')
+    html = strategies / 'alpha.html'
+    html.write_text('<p>n1</p>')
+    os.utime(html, (3000, 3000))
+    assert registry.get('alpha') is not entry
+
+
+def test_deleted_strategy_is_dropped(registry, strategies):
+    registry.list()
+    os.remove(strategies / 'beta.py')
+    assert registry.get('beta') is None
+    assert [e['name'] for e in registry.list()] == ['alpha']
+    assert 'beta' not in registry.entries
+
+
+def test_runner_unknown_strategy(strategies):
+    write_strategy(strategies, 'gamma', "paramecfg = {'n1': {'type': int, 'default': 10}}\n", 1000)
+    runner = StrategyRunner(PACKAGE)
+    assert runner.get_strategy_params('gamma') == runner.get_strategy('gamma')['params']
+    assert runner.get_strategy('missing') is None
+    # 与 load_strategy 相同的错误，接口返回 404 而不是 500
+    with pytest.raises(ValueError, match='加载策略失败'):
+        runner.get_strategy_params('missing')
+    with pytest.raises(ValueError, match='加载策略失败'):
+        runner.load_strategy('missing')
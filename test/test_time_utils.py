@@ -0,0 +1,54 @@
+"""时间列统一为 UTC"""
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+
+from utils.time_utils import to_utc, normalize_timestamps
+
+
+def test_naive_datetime_column():
+    values = pd.Series(pd.date_range('2025-01-01', periods=3, freq='h'))
+    out = to_utc(values)
+    assert isinstance(out, pd.Series) and str(out.dt.tz) == 'UTC'
+    assert out[0] == pd.Timestamp('2025-01-01T00:00Z')
+    # 不带时区的按 assume_tz 解释
+    assert to_utc(values, assume_tz='Asia/Hong_Kong')[0] == pd.Timestamp('2024-12-31T16:00Z')
+
+
+def test_aware_index_and_array():
+    index = pd.date_range('2025-01-01', periods=2, freq='D', tz='Asia/Hong_Kong')
+    out = to_utc(index)
+    assert isinstance(out, pd.DatetimeIndex) and str(out.tz) == 'UTC'
+    assert out[0] == pd.Timestamp('2024-12-31T16:00Z')
+    assert isinstance(to_utc(np.array(['2025-01-01T00:00'], dtype='datetime64[ns]')), pd.DatetimeIndex)
+
+
+def test_epoch_numbers():
+    out = to_utc(pd.Series([0, 1_700_000_000_000]), unit='ms')
+    assert out.tolist() == [pd.Timestamp('1970-01-01T00:00Z'), pd.Timestamp('2023-11-14T22:13:20Z')]
+
+
+def test_objects_and_strings():
+    objects = pd.Series([dt.datetime(2025, 1, 1, 8), dt.date(2025, 1, 2)], dtype=object)
+    assert to_utc(objects).tolist() == [pd.Timestamp('2025-01-01T08:00Z'), pd.Timestamp('2025-01-02T00:00Z')]
+    # 时区偏移不一致时按各自偏移换算
+    mixed = pd.Series(['2025-01-01T08:00+08:00', '2025-01-01T00:00+00:00'])
+    assert to_utc(mixed).tolist() == [pd.Timestamp('2025-01-01T00:00Z')] * 2
+
+
+def test_normalize_timestamps():
+    df = pd.DataFrame({
+        'datetime': pd.date_range('2025-01-01', periods=2, freq='5min'),
+        'expiration_date': [dt.date(2025, 3, 28)] * 2,
+        'date': [1_735_689_600_000, 1_735_689_900_000],
+        'mark_price': [1.0, 2.0],
+    })
+    out = normalize_timestamps(df, epoch_column='date')
+    assert str(out['datetime'].dt.tz) == 'UTC' and str(out['expiration_date'].dt.tz) == 'UTC'
+    assert (out['datetime_idx'] == out['datetime']).all()
+    # 原 DataFrame 不变，其余列不复制
+    assert df['datetime'].dt.tz is None
+    assert np.shares_memory(out['mark_price'].to_numpy(), df['mark_price'].to_numpy())
+    plain = pd.DataFrame({'x': [1]})
+    assert normalize_timestamps(plain) is plain
@@ -0,0 +1,84 @@
+"""
+向量化引擎：超过一年的回测的年化指标，以及由保存的绘图数据生成的图表
+与 backtrader 的逐 tick 对比见 signal_parity.py 和 straddle_parity.py
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+import backtrader as bt
+
+import core.backtrader_runer as bt_runer
+import core.vector_runer as vector_runer
+from core.vector_runer import VectorRun
+import strategies.f_sma_cross as f_sma_cross
+import strategies.o_sma_cross as o_sma_cross
+from signal_parity import PARAMS, make_bars, synthetic_feed, run_backtrader, run_vector
+
+
+def test_signal_stats_over_two_years():
+    # 1 小时K线覆盖 800 天，夏普比率按年收益计算，需要两个以上的自然年
+    _, _, bt_stats, bt_returns = run_backtrader(f_sma_cross.FSmaCross, f_sma_cross, make_bars(800, 1, seed=3, freq='1h'))
+    _, _, run = run_vector(f_sma_cross.FSmaCross, f_sma_cross, make_bars(800, 1, seed=3, freq='1h'))
+    stats = run.stats()
+    assert bt_stats['sharpe'] is not None
+    assert stats == pytest.approx(bt_stats, rel=1e-9)
+    pd.testing.assert_series_equal(run.returns(), bt_returns, check_names=False, rtol=1e-12)
+
+
+class ManualCash(bt.Strategy):
+    """与 OStraddleStrategy 一样在 next() 中用 setcash 手工记账"""
+
+    def next(self):
+        self.broker.setcash(self.broker.getcash() * (1.0 + 0.002 * np.sin(len(self))))
+
+
+def test_lagged_sharpe_matches_backtrader():
+    times = pd.date_range('2023-03-01', '2025-06-30', freq='D')
+    cerebro = bt.Cerebro()
+    cerebro.broker.set_cash(100000.0)
+    cerebro.adddata(bt.feeds.PandasData(dataname=pd.DataFrame({'close': 1.0}, index=times)))
+    cerebro.addstrategy(ManualCash)
+    cerebro.addanalyzer(bt.analyzers.Returns, _name='treturn')
+    cerebro.addanalyzer(bt.analyzers.DrawDown, _name='drawdown')
+    cerebro.addanalyzer(bt.analyzers.SharpeRatio, _name='sharpe')
+    bt_stats = bt_runer.get_analyzer_stats(cerebro.run()[0])
+
+    # 策略记账后的现金，逐根K线复现
+    values = 100000.0 * np.cumprod(1.0 + 0.002 * np.sin(np.arange(1, len(times) + 1)))
+    stats = VectorRun(times.tz_localize('UTC'), values, 100000.0).stats()
+    assert bt_stats['sharpe'] is not None
+    assert stats == pytest.approx(bt_stats, rel=1e-9)
+
+
+def test_chart_matches_backtrader_recorder():
+    # 3 个合约，data0 晚于其他合约开始，开始前的收盘价为 NaN
+    df = make_bars(3, 3, seed=5)
+    cerebro = bt_runer.build_cerebro(o_sma_cross.OSmaCross, o_sma_cross, datafeed=synthetic_feed(o_sma_cross, df),
+                                     chart=True, **PARAMS)
+    expected = cerebro.run()[0].analyzers.getbyname('chart').get_analysis()
+    chart = run_vector(o_sma_cross.OSmaCross, o_sma_cross, df)[2].chart()
+    assert np.isnan(chart['bars']['close'].iloc[0]) and len(chart['trades']) > 0
+    pd.testing.assert_frame_equal(chart['bars'], expected['bars'])
+    pd.testing.assert_frame_equal(chart['trades'], expected['trades'])
+
+
+@pytest.mark.parametrize('report_mode', ['lazy', 'eager'])
+def test_vector_result_renders_bt_report(tmp_path, monkeypatch, report_mode):
+    monkeypatch.chdir(tmp_path)
+    datafeed = synthetic_feed(f_sma_cross, make_bars(3, 1, seed=3))
+    result = vector_runer.run_backtest('f_sma_cross', f_sma_cross.FSmaCross, f_sma_cross, datafeed=datafeed,
+                                       report_mode=report_mode, **PARAMS)
+    raw = pd.read_pickle(result['raw_path'])
+    assert len(raw['chart']['bars']) == 3 * 288
+    if report_mode == 'eager':
+        assert result['report_timings']['bokeh']['status'] == 'success'
+        assert os.path.exists(result['html_path'])
+    else:
+        assert not os.path.exists(result['html_path'])
+        # 不创建 cerebro，由绘图数据生成
+        monkeypatch.setattr(bt_runer, 'build_cerebro', None)
+        assert bt_runer.render_report('f_sma_cross', result['result_id'], 'bt') == result['html_path']
+    with open(result['html_path']) as f:
+        assert 'bokeh' in f.read()
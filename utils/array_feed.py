@@ -0,0 +1,171 @@
+import os
+import json
+import datetime as dt
+import numpy as np
+import pandas as pd
+import backtrader as bt
+from backtrader.utils import date2num, num2date
+
+DAY_NS = 86_400_000_000_000
+# 1970-01-01 的 ordinal
+EPOCH_ORDINAL = 719163
+# 参考日期 2000-01-01 的 ordinal，与实际数据的 ordinal 位于同一个二进制数量级 [2**19, 2**20)
+REF_ORDINAL = 730120
+
+
+def _datetime_ns(values):
+    """把时间列或索引转换为 int64 纳秒，带时区时转为 UTC（与 date2num 的处理一致），不带时区时取字面时间"""
+    values = pd.DatetimeIndex(values)
+    if values.tz is not None:
+        values = values.tz_convert('UTC').tz_localize(None)
+    return values.asi8
+
+
+def date2num_array(ns):
+    """
+    向量化的 backtrader date2num
+    同一数量级内 date2num(d) == ordinal + 当日时间的小数部分，且小数部分与日期无关，
+    因此只对不同的当日时间逐个调用 date2num，结果与逐行转换完全一致
+    """
+    ns = np.asarray(ns, dtype='int64')
+    days, tod = np.divmod(ns, DAY_NS)
+    ordinals = days + EPOCH_ORDINAL
+    if len(ns) and (ordinals.min() < 2 ** 19 or ordinals.max() >= 2 ** 20):
+        return np.array([date2num(ts.to_pydatetime()) for ts in pd.to_datetime(ns)], dtype='float64')
+    uniq, inverse = np.unique(tod, return_inverse=True)
+    ref = dt.datetime.fromordinal(REF_ORDINAL)
+    frac = np.array([date2num(ref + dt.timedelta(microseconds=int(t) // 1000)) - REF_ORDINAL for t in uniq],
+                    dtype='float64')
+    return ordinals.astype('float64') + frac[inverse.reshape(-1)]
+
+
+def num2date_array(nums):
+    """
+    向量化的 backtrader num2date，返回不带时区的 UTC 时间（datetime64[ns]）
+    与 date2num_array 相同，只对不同的当日时间小数部分逐个调用 num2date
+    """
+    nums = np.asarray(nums, dtype='float64')
+    ordinals = np.floor(nums)
+    if len(nums) and (ordinals.min() < 2 ** 19 or ordinals.max() >= 2 ** 20):
+        return np.array([num2date(x) for x in nums], dtype='datetime64[ns]')
+    uniq, inverse = np.unique(nums - ordinals, return_inverse=True)
+    ref = dt.datetime.fromordinal(REF_ORDINAL)
+    tod = np.array([(num2date(REF_ORDINAL + f) - ref) // dt.timedelta(microseconds=1) * 1000 for f in uniq],
+                   dtype='int64')
+    days = ordinals.astype('int64') - EPOCH_ORDINAL
+    return (days * DAY_NS + tod[inverse.reshape(-1)]).view('datetime64[ns]')
+
+class ArrayTable:
+    """
+    按列保存的 NumPy 数组，可代替 DataFrame 作为 ArrayData 的 dataname
+    save() 把每列保存为 .npy 文件，load() 以内存映射方式打开，多个回测进程共享同一份页缓存
+    """
+
+    def __init__(self, arrays: dict, index=None):
+        self.arrays = dict(arrays)
+        self.index = index
+        self.columns = pd.Index(list(self.arrays))
+
+    def __len__(self):
+        return len(next(iter(self.arrays.values()))) if self.arrays else 0
+
+    def column(self, i):
+        return self.arrays[self.columns[i]]
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame):
+        arrays = {}
+        for name in df.columns:
+            values = df[name]
+            if pd.api.types.is_datetime64_any_dtype(values):
+                arrays[name] = _datetime_ns(values).view('datetime64[ns]')
+            else:
+                arrays[name] = values.to_numpy()
+        index = _datetime_ns(df.index).view('datetime64[ns]') if isinstance(df.index, pd.DatetimeIndex) else None
+        return cls(arrays, index)
+
+    def save(self, directory: str):
+        """保存为 .npy 目录，object 列（字符串等）不保存"""
+        os.makedirs(directory, exist_ok=True)
+        names = []
+        for name, values in self.arrays.items():
+            if values.dtype == object:
+                continue
+            np.save(os.path.join(directory, f"{name}.npy"), values)
+            names.append(name)
+        if self.index is not None:
+            np.save(os.path.join(directory, "__index__.npy"), self.index)
+        with open(os.path.join(directory, "columns.json"), "w") as f:
+            json.dump(names, f)
+
+    @classmethod
+    def load(cls, directory: str, mmap_mode='r'):
+        with open(os.path.join(directory, "columns.json")) as f:
+            names = json.load(f)
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode) for name in names}
+        index_path = os.path.join(directory, "__index__.npy")
+        index = np.load(index_path, mmap_mode=mmap_mode) if os.path.exists(index_path) else None
+        return cls(arrays, index)
+
+
+class ArrayData(bt.feeds.PandasData):
+    """
+    数组化的行情 feed，列映射规则与 PandasData 相同，可直接替换 PandasData 子类
+    start() 时把映射到的列一次性转换为 float64 数组、时间转换为 date2num 数值，
+    preload 时整块写入各条 line 的缓冲区，不再逐行经过 pandas 索引。
+    dataname 可以是 DataFrame，也可以是 ArrayTable（支持内存映射的 .npy 目录）。
+    使用 filters 或 tzinput 时退回 PandasData 的逐行加载。
+    """
+
+    def _column(self, i):
+        data = self.p.dataname
+        return data.column(i) if isinstance(data, ArrayTable) else data.iloc[:, i].to_numpy()
+
+    def start(self):
+        super().start()
+        self._arrays = {}
+        for field in self.getlinealiases():
+            if field == 'datetime':
+                continue
+            col = self._colmapping[field]
+            if col is not None:
+                self._arrays[field] = np.asarray(self._column(col), dtype='float64')
+        coldtime = self._colmapping['datetime']
+        stamps = self.p.dataname.index if coldtime is None else self._column(coldtime)
+        self._dtnums = date2num_array(_datetime_ns(stamps))
+
+    def _load(self):
+        self._idx += 1
+        if self._idx >= len(self._dtnums):
+            return False
+        for field, values in self._arrays.items():
+            getattr(self.lines, field)[0] = values[self._idx]
+        self.lines.datetime[0] = self._dtnums[self._idx]
+        return True
+
+    def preload(self):
+        if self._filters or self._tzinput:
+            return super().preload()
+
+        dtnums = self._dtnums
+        # 与 load() 相同的区间规则：跳过早于 fromdate 的K线，遇到第一根晚于 todate 的K线即停止
+        keep = dtnums >= self.fromdate
+        beyond = np.flatnonzero(keep & (dtnums > self.todate))
+        if len(beyond):
+            keep[beyond[0]:] = False
+        n = int(keep.sum())
+        self._idx = len(dtnums) - 1
+
+        nan = np.full(n, np.nan)
+        for i, field in enumerate(self.getlinealiases()):
+            if field == 'datetime':
+                values = dtnums[keep]
+            else:
+                values = self._arrays[field][keep] if field in self._arrays else nan
+            line = self.lines[i]
+            line.array.frombytes(np.ascontiguousarray(values, dtype='float64').tobytes())
+            line.lencount += n
+            line.idx = line.idx + n
+
+        self._last()
+        self.home()
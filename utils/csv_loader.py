@@ -0,0 +1,89 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    from pyarrow import csv as pa_csv
+except ImportError:
+    pa = None
+
+
+def _arrow_type(dtype):
+    """pandas 的 dtype 名转换为 Arrow 类型，category 解析为字典编码，转换后即为 pandas 的 category"""
+    if dtype == 'category':
+        return pa.dictionary(pa.int32(), pa.string())
+    if dtype in ('str', 'string', 'object'):
+        return pa.string()
+    return pa.from_numpy_dtype(pd.api.types.pandas_dtype(dtype))
+
+
+def _read_arrow(path, columns, dtypes):
+    convert_options = pa_csv.ConvertOptions(
+        include_columns=columns or [],
+        column_types={name: _arrow_type(dtype) for name, dtype in (dtypes or {}).items()},
+    )
+    return pa_csv.read_csv(path, read_options=pa_csv.ReadOptions(use_threads=True), convert_options=convert_options)
+
+
+def _read_pandas(path, columns, dtypes):
+    df = pd.read_csv(path, usecols=columns, dtype=dtypes)
+    # 与 Arrow 一致，按 columns 的顺序返回
+    return df[columns] if columns else df
+
+
+def _is_sorted(column):
+    if len(column) < 2:
+        return True
+    return pc.all(pc.greater_equal(column.slice(1), column.slice(0, len(column) - 1))).as_py()
+
+
+def load_daily_csv(paths, columns: list = None, dtypes: dict = None, sort_by: str = None, workers: int = None):
+    """
+    并发读取按日期拆分的 CSV 文件（如 DERIBIT_BTC_YYYY-MM-DD.csv），返回一个 DataFrame，列按 columns 的顺序，
+    没有可读的文件时返回 None
+    安装了 pyarrow 时各文件在线程池中由 Arrow 的多线程解析器读取，解析时只保留 columns 并按 dtypes 转换类型，
+    各文件的 Arrow 表直接拼接（不复制），需要时按 sort_by 排序，最后只转换一次为 pandas；
+    未安装时退回 pd.read_csv 逐文件读取后合并。
+    不存在的文件跳过，读取失败的文件打印错误后跳过，与逐个 read_csv 的行为一致。
+    workers 为同时读取的文件数，默认为 CPU 核心数。
+    """
+    existing = []
+    for path in paths:
+        if os.path.exists(path):
+            print(f"Loading: {path}")
+            existing.append(path)
+    if not existing:
+        return None
+
+    read = _read_arrow if pa is not None else _read_pandas
+
+    def load(path):
+        try:
+            return read(path, columns, dtypes)
+        except Exception as e:
+            print(f"Error reading {path}: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=min(len(existing), workers or os.cpu_count() or 1)) as executor:
+        parts = [part for part in executor.map(load, existing) if part is not None]
+    if not parts:
+        return None
+
+    if pa is None:
+        df = pd.concat(parts, ignore_index=True)
+        # 各文件的类别不同时 concat 退化为 object，合并类别后恢复为 category，与 Arrow 一致
+        for name in df.columns:
+            if isinstance(parts[0][name].dtype, pd.CategoricalDtype) and df[name].dtype != 'category':
+                df[name] = union_categoricals([part[name] for part in parts])
+        if sort_by and not df[sort_by].is_monotonic_increasing:
+            df = df.sort_values(sort_by, kind='stable', ignore_index=True)
+        return df
+
+    # 各文件字典编码的取值不同，拼接时统一字典
+    table = pa.concat_tables(parts, promote_options='default').unify_dictionaries()
+    if sort_by and not _is_sorted(table.column(sort_by)):
+        table = table.sort_by(sort_by)
+    return table.to_pandas()
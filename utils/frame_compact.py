@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+
+# float32 可以无损往返 6 位有效数字的十进制数
+FLOAT32_DIGITS = 6
+
+
+def _float32_exact(values: np.ndarray, digits: int = FLOAT32_DIGITS):
+    """float64 数组的每个值是否都不超过 digits 位有效数字，即转为 float32 后能按有效数字还原为原值"""
+    finite = values[np.isfinite(values)]
+    if not len(finite):
+        return True
+    back = finite.astype('float32').astype('float64')
+    nonzero = back != 0
+    scale = np.ones_like(back)
+    scale[nonzero] = 10.0 ** (digits - 1 - np.floor(np.log10(np.abs(back[nonzero]))))
+    restored = np.round(back * scale) / scale
+    # 超出 float32 范围的值（inf）不相等，自然不会被降精度
+    return bool(np.array_equal(restored, finite))
+
+
+def exact_float(value):
+    """
+    取出的标量转为 Python float，float32 按最短十进制表示还原
+    compact_frame 只对不超过 6 位有效数字的列降精度，最短表示就是原来的十进制值，还原后与 float64 原值完全相等
+    """
+    if isinstance(value, np.float32):
+        return float(str(value))
+    return float(value)
+
+
+def exact_float64(series: pd.Series):
+    """exact_float 的列版本，float32 列还原为与原值相等的 float64 列"""
+    if series.dtype == np.float32:
+        return series.astype(str).astype('float64')
+    return series
+
+
+def _to_datetime(series: pd.Series):
+    """object 列中的 datetime/date 对象转为 datetime64[ns]，时区偏移不一致时统一为 UTC"""
+    try:
+        return pd.to_datetime(series)
+    except (ValueError, TypeError):
+        return pd.to_datetime(series, utc=True)
+
+
+def compact_frame(df: pd.DataFrame, category_ratio: float = 0.5, digits: int = FLOAT32_DIGITS,
+                  label: str = None, report: bool = True):
+    """
+    压缩 DataFrame 的内存占用，返回新的 DataFrame
+    - 去重后取值数不超过行数 category_ratio 的字符串列转为 category（claim_type、exchange、instrument_name 等）
+    - float64 列在所有值都不超过 digits 位有效数字时降为 float32，价格和 IV 的十进制取值不变；
+      现价等有效数字更多的列保持 float64
+    - 整数列降为能容纳全部取值的最小整数类型
+    - object 列中的 datetime/date 对象转为 datetime64[ns]，即 int64 纳秒存储，仍可直接与时间比较
+    report 为 True 时打印压缩前后的内存占用。
+    注意 category 列参与 groupby 时应传 observed=True，否则会按所有类别的笛卡尔积分组。
+    """
+    before = df.memory_usage(deep=True).sum() if report else 0
+    converted = {}
+    for name in df.columns:
+        series = df[name]
+        kind = series.dtype
+        if kind == object:
+            inferred = pd.api.types.infer_dtype(series, skipna=True)
+            if inferred in ('datetime', 'date', 'datetime64'):
+                converted[name] = _to_datetime(series)
+            elif inferred == 'string' and series.nunique() <= category_ratio * len(series):
+                converted[name] = series.astype('category')
+        elif kind == np.float64:
+            if _float32_exact(series.to_numpy(), digits):
+                converted[name] = series.astype('float32')
+        elif pd.api.types.is_integer_dtype(kind) and not pd.api.types.is_extension_array_dtype(kind) and len(series):
+            smaller = pd.to_numeric(series, downcast='signed' if series.min() < 0 else 'unsigned')
+            if smaller.dtype.itemsize < kind.itemsize:
+                converted[name] = smaller
+    if converted:
+        df = df.assign(**converted)
+
+    if report:
+        after = df.memory_usage(deep=True).sum()
+        saved = before - after
+        print(f"[compact] {label or 'DataFrame'} {len(df)} 行: {before / 1024 / 1024:.1f}MB -> "
+              f"{after / 1024 / 1024:.1f}MB，节省 {saved / 1024 / 1024:.1f}MB ({saved / max(before, 1):.0%})")
+    return df
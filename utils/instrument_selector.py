@@ -0,0 +1,93 @@
+import re
+import pandas as pd
+
+# 合约标识，与策略中 groupby(['exchange', 'instrument_name', 'expiration_date']) 的分组键一致
+INSTRUMENT_KEYS = ['exchange', 'instrument_name', 'expiration_date']
+
+
+def _param(value):
+    return value.to_pydatetime() if isinstance(value, pd.Timestamp) else value
+
+
+class InstrumentSelector:
+    """
+    声明式合约筛选，编译为 SQL 在数据库中完成，只有选中合约的行情离开数据库
+    exchange / underlyer / claim_type: 等值过滤
+    nearest_expiries: 只保留区间开始日及之后最近的 N 个到期日
+    strike_band: 行权价在区间内平均现价上下该比例内，如 0.1 表示 ±10%
+    top_n: 最多保留的合约数
+    rank_by: top_n 的排序依据，'volume' 为区间成交量从大到小，None 为按合约标识升序（与 pandas groupby 的分组顺序一致）
+    和 groupby 一样，合约标识中有空值的行不会被选中。
+    """
+
+    def __init__(self, exchange: str = None, underlyer: str = None, claim_type: str = None,
+                 nearest_expiries: int = None, strike_band: float = None, top_n: int = None, rank_by: str = 'volume'):
+        if rank_by not in ('volume', None):
+            raise ValueError(f"不支持的排序依据: {rank_by}")
+        self.exchange = exchange
+        self.underlyer = underlyer
+        self.claim_type = claim_type
+        self.nearest_expiries = nearest_expiries
+        self.strike_band = strike_band
+        self.top_n = top_n
+        self.rank_by = rank_by
+
+    def __repr__(self):
+        return f"InstrumentSelector({', '.join(f'{k}={v!r}' for k, v in vars(self).items() if v is not None)})"
+
+    def compile(self, table: str, columns: list, begin, end, inclusive_end: bool = False):
+        """编译为 (sql, params)，结果按 datetime 排序，columns 为空时返回全部列"""
+        for name in [table] + list(columns or []):
+            if not re.fullmatch(r"\w+", name):
+                raise ValueError(f"非法的表名或列名: {name}")
+        params = {'begin': _param(pd.Timestamp(begin)), 'end': _param(pd.Timestamp(end))}
+        where = ["datetime >= :begin", f"datetime {'<=' if inclusive_end else '<'} :end"]
+        for key in ('exchange', 'underlyer', 'claim_type'):
+            value = getattr(self, key)
+            if value is not None:
+                where.append(f"{key} = :{key}")
+                params[key] = value
+
+        keys = ', '.join(INSTRUMENT_KEYS)
+        selected = [f"{key} is not null" for key in INSTRUMENT_KEYS]
+        if self.nearest_expiries:
+            selected.append(
+                "expiration_date in (select distinct expiration_date from bars where expiration_date >= :begin_date "
+                "order by expiration_date limit :nearest_expiries)"
+            )
+            params['begin_date'] = pd.Timestamp(begin).date()
+            params['nearest_expiries'] = int(self.nearest_expiries)
+        having = ''
+        if self.strike_band is not None:
+            having = "having avg(strike) between avg(underlyer_spot) * (1 - :strike_band) " \
+                     "and avg(underlyer_spot) * (1 + :strike_band)"
+            params['strike_band'] = float(self.strike_band)
+        order = ''
+        limit = ''
+        if self.top_n:
+            if self.rank_by == 'volume':
+                order = "order by sum(volume) desc nulls last"
+            else:
+                # 文本列按字节序排序，与 Python 字符串排序一致
+                order = "order by exchange collate \"C\", instrument_name collate \"C\", expiration_date"
+            limit = "limit :top_n"
+            params['top_n'] = int(self.top_n)
+
+        select = ', '.join(columns) if columns else '*'
+        sql = f"""
+with bars as (
+    select * from {table}
+    where {' and '.join(where)}
+),
+instruments as (
+    select {keys} from bars
+    where {' and '.join(selected)}
+    group by {keys}
+    {having}
+    {order}
+    {limit}
+)
+select {select} from bars join instruments using ({keys})
+order by datetime
+"""
+        return sql, params
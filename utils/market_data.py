@@ -0,0 +1,341 @@
+import os
+import re
+import json
+import datetime as dt
+import pandas as pd
+from utils.frame_compact import compact_frame
+from utils.shared_data import get_store, query_key
+
+try:
+    import pyarrow  # noqa: F401  pandas 读写 Parquet 需要 pyarrow
+except ImportError:
+    pyarrow = None
+
+
+def _label(value):
+    """分区目录名中的取值，空值记为 null"""
+    return 'null' if value is None or (isinstance(value, float) and pd.isna(value)) else str(value)
+
+
+def _overlaps(a, b):
+    return a == '*' or b == '*' or a == b
+
+
+def _scope_entry(entry):
+    """清单中的范围：[交易所, 标的, 列]，列为 '*' 或列名列表，旧格式没有列时视为全部列"""
+    exchange, underlyer, columns = (list(entry) + ['*'])[:3]
+    return exchange, underlyer, columns
+
+
+def _sql_day_bound(day):
+    """
+    日期分区在 SQL 中的边界：当天 UTC 零点，显式带 +00:00。
+    timestamptz 列按 UTC 比较，不受数据库会话时区影响；timestamp 列比较时数据库忽略偏移，即不带时区的零点。
+    与写入缓存时按 UTC 日期分组（_utc_dates）一致
+    """
+    return f"{day.isoformat()} 00:00:00+00:00"
+
+
+def _utc_dates(series):
+    """各行所在的 UTC 日期，带时区的时间先转换为 UTC，不带时区的视为 UTC"""
+    if getattr(series.dt, 'tz', None) is not None:
+        series = series.dt.tz_convert('UTC')
+    return series.dt.date
+
+
+def _as_bound(value, series):
+    """把区间边界转换为与 datetime 列一致的时区形式，便于在 pandas 中精确截取"""
+    ts = pd.Timestamp(value)
+    tz = getattr(series.dt, 'tz', None) if len(series) else None
+    if tz is not None and ts.tzinfo is None:
+        # 不带时区的边界视为 UTC，与按 UTC 日期划分的分区一致，不随数据库会话时区变化
+        return ts.tz_localize('UTC').tz_convert(tz)
+    if tz is None and ts.tzinfo is not None:
+        # timestamp without time zone 与带时区的字符串比较时，数据库忽略时区部分
+        return ts.tz_localize(None)
+    return ts
+
+
+class MarketDataCache:
+    """
+    行情数据本地缓存
+    按 表/日期/交易所/标的 分区保存为 Parquet 文件：
+        <cache_dir>/<table>/date=YYYY-MM-DD/exchange=<exchange>/underlyer=<underlyer>.parquet
+    每个日期目录下的 _manifest.json 记录已完整拉取的范围（交易所、标的和列，'*' 表示全部），
+    需要的列超出已缓存的列时，按两者的并集重新拉取这一天。
+    查询区间时只对缺失的日期查询数据库，其余日期直接从磁盘读取。
+    数据库和磁盘上的数据都按块处理：每块先截取区间、过滤、投影，再由 convert 转换为最终类型，
+    最后只合并一次，内存峰值接近最终数据的大小。
+    距今不足 fresh_days 天的日期数据可能还在写入，不缓存，每次都查询数据库。
+    缓存目录可通过环境变量 MARKET_DATA_CACHE_DIR 配置，MARKET_DATA_CACHE=0 时关闭缓存。
+    """
+
+    def __init__(self, cache_dir=None, fresh_days=1, chunk_rows=None):
+        self.cache_dir = cache_dir or os.environ.get('MARKET_DATA_CACHE_DIR', 'data_cache')
+        self.fresh_days = fresh_days
+        # 从数据库分块读取的行数，可通过环境变量 MARKET_DATA_CHUNK_ROWS 配置
+        self.chunk_rows = chunk_rows or int(os.environ.get('MARKET_DATA_CHUNK_ROWS', 100_000))
+        self.enabled = pyarrow is not None and os.environ.get('MARKET_DATA_CACHE', '1') != '0'
+
+    def _day_dir(self, table, day):
+        return os.path.join(self.cache_dir, table, f"date={day.isoformat()}")
+
+    def _manifest(self, table, day):
+        try:
+            with open(os.path.join(self._day_dir(table, day), '_manifest.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'scopes': []}
+
+    def _covered(self, table, day, scope, columns=None):
+        """这一天是否已缓存了 scope 范围内的 columns 列（None 表示全部列）"""
+        for exchange, underlyer, cached in map(_scope_entry, self._manifest(table, day)['scopes']):
+            if exchange in ('*', scope[0]) and underlyer in ('*', scope[1]) and \
+                    (cached == '*' or (columns is not None and set(columns) <= set(cached))):
+                return True
+        return False
+
+    def _fetch_columns(self, table, days, scope, columns):
+        """
+        拉取缺失日期时查询的列：请求的列加上与 scope 重叠的已缓存范围的列，
+        覆盖写入的分区文件仍包含其他范围需要的列
+        """
+        if columns is None:
+            return None
+        fetch = set(columns) | {'datetime', 'exchange', 'underlyer'}
+        for day in days:
+            for exchange, underlyer, cached in map(_scope_entry, self._manifest(table, day)['scopes']):
+                if _overlaps(exchange, scope[0]) and _overlaps(underlyer, scope[1]):
+                    if cached == '*':
+                        return None
+                    fetch |= set(cached)
+        order = self.table_columns(table)
+        return [c for c in order if c in fetch] + sorted(fetch - set(order))
+
+    def table_columns(self, table: str, refresh: bool = False):
+        """数据表的列名（按表中顺序），查询一次 information_schema 后保存在缓存目录"""
+        path = os.path.join(self.cache_dir, table, '_columns.json')
+        if self.enabled and not refresh and os.path.exists(path):
+            with open(path) as f:
+                return json.load(f)
+        from sqlalchemy import text
+        from utils.data_feed_utils import get_engine
+        sql = "select column_name from information_schema.columns where table_name = :table order by ordinal_position"
+        columns = list(pd.read_sql(text(sql), get_engine(), params={'table': table})['column_name'])
+        if self.enabled and columns:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as f:
+                json.dump(columns, f)
+        return columns
+
+    def feed_columns(self, table: str, feed_cls, extra=()):
+        """
+        feed 类实际读取的列：各条 line 对应的列（params 中设为 None 的除外），加上 extra 中策略额外需要的列
+        （如 add_data_to_engine 中 groupby 的分组键 exchange、instrument_name、expiration_date，打印用的 date），
+        再与数据表中存在的列取交集，开高低收等由转换函数生成的列不会出现在 SELECT 中
+        """
+        wanted = ['datetime'] + [
+            alias for alias in feed_cls.lines.getlinealiases()
+            if getattr(feed_cls.params, alias, -1) is not None
+        ] + list(extra)
+        existing = set(self.table_columns(table))
+        return [c for c in dict.fromkeys(wanted) if c in existing]
+
+    def _cacheable(self, day):
+        return day <= dt.date.today() - dt.timedelta(days=self.fresh_days)
+
+    def _days(self, begin, end, inclusive_end=False):
+        """覆盖查询区间的日期，边界带时区时前后各多取一天，避免数据库会话时区造成的日期偏移"""
+        begin, end = pd.Timestamp(begin), pd.Timestamp(end)
+        pad = dt.timedelta(days=1) if begin.tzinfo is not None or end.tzinfo is not None else dt.timedelta(0)
+        first = (begin.tz_localize(None) if begin.tzinfo else begin).date() - pad
+        last = (end.tz_localize(None) if end.tzinfo else end).date() + pad
+        if not pad and not inclusive_end and end == end.normalize() and last > first:
+            # 不含右端点且右端点是零点时，最后一天不在区间内
+            last -= dt.timedelta(days=1)
+        return [first + dt.timedelta(days=i) for i in range((last - first).days + 1)]
+
+    def _stream(self, table, first, last, scope, columns=None):
+        """
+        从数据库分块读取 [first, last] 日期内指定交易所、标的的行情，columns 为空时读取全部列
+        使用服务端游标（stream_results），每次只有 chunk_rows 行在内存中；按 datetime 排序，便于逐日写入缓存
+        """
+        for column in columns or []:
+            if not re.fullmatch(r"\w+", column):
+                raise ValueError(f"非法的列名: {column}")
+        select = ', '.join(columns) if columns else '*'
+        sql = f"select {select} from {table} where datetime >= :begin and datetime < :end"
+        params = {'begin': _sql_day_bound(first), 'end': _sql_day_bound(last + dt.timedelta(days=1))}
+        if scope[0] != '*':
+            sql += " and exchange = :exchange"
+            params['exchange'] = scope[0]
+        if scope[1] != '*':
+            sql += " and underlyer = :underlyer"
+            params['underlyer'] = scope[1]
+        sql += " order by datetime"
+        yield from self._stream_sql(sql, params)
+
+    def _stream_sql(self, sql, params):
+        """用服务端游标分块执行查询"""
+        from sqlalchemy import text
+        from utils.data_feed_utils import get_engine
+        with get_engine().connect().execution_options(stream_results=True) as conn:
+            yield from pd.read_sql(text(sql), conn, params=params, chunksize=self.chunk_rows)
+
+    def _store(self, table, day, scope, pieces, columns=None):
+        """写入一天的分区文件并在清单中登记范围和列，pieces 为这一天的原始数据块"""
+        day_dir = self._day_dir(table, day)
+        df = pd.concat(pieces, ignore_index=True) if pieces else pd.DataFrame()
+        if len(df):
+            for (exchange, underlyer), part in df.groupby(
+                    [df['exchange'].map(_label), df['underlyer'].map(_label)], sort=False):
+                part_dir = os.path.join(day_dir, f"exchange={exchange}")
+                os.makedirs(part_dir, exist_ok=True)
+                path = os.path.join(part_dir, f"underlyer={underlyer}.parquet")
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                part.to_parquet(tmp_path, index=False)
+                os.replace(tmp_path, path)
+        os.makedirs(day_dir, exist_ok=True)
+        manifest = self._manifest(table, day)
+        entry = [scope[0], scope[1], sorted(columns) if columns else '*']
+        # 同一范围只保留列最全的一条
+        manifest['scopes'] = [e for e in manifest['scopes'] if _scope_entry(e)[:2] != tuple(scope)] + [entry]
+        path = os.path.join(day_dir, '_manifest.json')
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, path)
+
+    def _load(self, table, day, scope, columns=None):
+        day_dir = self._day_dir(table, day)
+        frames = []
+        exchanges = [f"exchange={scope[0]}"] if scope[0] != '*' else \
+            sorted(d for d in os.listdir(day_dir) if d.startswith('exchange=')) if os.path.isdir(day_dir) else []
+        for exchange in exchanges:
+            part_dir = os.path.join(day_dir, exchange)
+            if not os.path.isdir(part_dir):
+                continue
+            files = [f"underlyer={scope[1]}.parquet"] if scope[1] != '*' else \
+                sorted(f for f in os.listdir(part_dir) if f.endswith('.parquet'))
+            for file in files:
+                path = os.path.join(part_dir, file)
+                if os.path.exists(path):
+                    frames.append(pd.read_parquet(path, columns=columns))
+        return frames
+
+    def _prepare(self, chunk, begin, end, inclusive_end, filters, load_columns, columns, convert):
+        """截取区间、过滤并投影一个数据块，再转换为最终类型"""
+        if load_columns:
+            chunk = chunk[load_columns]
+        series = chunk['datetime']
+        mask = series >= _as_bound(begin, series)
+        mask &= series <= _as_bound(end, series) if inclusive_end else series < _as_bound(end, series)
+        for key, value in filters.items():
+            mask &= chunk[key] == value
+        if not mask.all():
+            chunk = chunk[mask]
+        if columns:
+            chunk = chunk[columns]
+        return convert(chunk) if convert is not None else chunk
+
+    def read(self, table: str, begin, end, exchange: str = None, underlyer: str = None,
+             columns: list = None, filters: dict = None, inclusive_end: bool = False, refresh: bool = False,
+             convert=None, selector=None, compact: bool = False, index: str = None):
+        """
+        读取 [begin, end) 区间的行情（inclusive_end 为 True 时包含 end），datetime 列带时区时不带时区的 begin、end 视为 UTC
+        exchange、underlyer 为空表示全部；columns 为需要的列，数据库只查询这些列（为空时查询全部列）；
+        filters 为其他列的等值过滤，如 {'claim_type': 'call'}，在读取后过滤，缓存的分区总是包含范围内的全部行；
+        refresh 为 True 时忽略已缓存的分区重新拉取；
+        convert 为逐块调用的类型转换函数，输入截取后的数据块，返回转换后的数据块；
+        selector 为 InstrumentSelector 时合约筛选在数据库中完成，只查询选中合约的行情，不经过缓存；
+        compact 为 True 时合并后压缩列类型（见 compact_frame）并打印节省的内存；
+        index 为合并后设为索引的列，如 convert 生成的 datetime_idx
+        """
+        scope = (exchange or '*', underlyer or '*')
+        filters = filters or {}
+        # 截取区间和过滤用到的列也要读出来，最后再投影到 columns
+        load_columns = list(dict.fromkeys(['datetime', *columns, *filters])) if columns else None
+        prepare = lambda chunk: self._prepare(chunk, begin, end, inclusive_end, filters, load_columns, columns, convert)
+        if selector is not None:
+            if exchange is not None or underlyer is not None:
+                raise ValueError("使用 selector 时请在 selector 中指定 exchange 和 underlyer")
+            sql, params = selector.compile(table, load_columns, begin, end, inclusive_end)
+            frames = [prepare(chunk) for chunk in self._stream_sql(sql, params)]
+            return self._concat(frames, columns, table if compact else None, index)
+
+        days = self._days(begin, end, inclusive_end)
+        frames = []
+        missing = []
+        for day in days:
+            if self.enabled and self._cacheable(day) and not refresh and self._covered(table, day, scope, load_columns):
+                frames.extend(prepare(part) for part in self._load(table, day, scope, load_columns))
+            else:
+                missing.append(day)
+
+        # 连续缺失的日期合并为一次查询
+        runs = []
+        for day in missing:
+            if runs and day - runs[-1][-1] == dt.timedelta(days=1):
+                runs[-1].append(day)
+            else:
+                runs.append([day])
+        for run in runs:
+            cacheable = set(day for day in run if self.enabled and self._cacheable(day))
+            fetch_columns = self._fetch_columns(table, sorted(cacheable), scope, load_columns) \
+                if cacheable else load_columns
+            pending = {}
+            for chunk in self._stream(table, run[0], run[-1], scope, fetch_columns):
+                if cacheable and len(chunk):
+                    row_days = _utc_dates(chunk['datetime'])
+                    for day, piece in chunk.groupby(row_days, sort=False):
+                        if day in cacheable:
+                            pending.setdefault(day, []).append(piece)
+                    # 数据按时间排序，早于当前块最后一天的日期已经完整
+                    for day in sorted(d for d in pending if d < row_days.iloc[-1]):
+                        self._store(table, day, scope, pending.pop(day), fetch_columns)
+                        cacheable.discard(day)
+                frames.append(prepare(chunk))
+                del chunk
+            for day in sorted(cacheable):
+                self._store(table, day, scope, pending.pop(day, []), fetch_columns)
+
+        return self._concat(frames, columns, table if compact else None, index)
+
+    def _concat(self, frames, columns, compact_label=None, index=None):
+        """合并各块，只在未按时间排序时排序，compact_label 不为空时压缩列类型，index 不为空时设为索引"""
+        if not frames:
+            return pd.DataFrame(columns=columns)
+        df = pd.concat([f for f in frames if len(f)] or frames[:1], ignore_index=True)
+        frames.clear()
+        if 'datetime' in df.columns and not df['datetime'].is_monotonic_increasing:
+            df = df.sort_values('datetime', kind='stable', ignore_index=True)
+        if compact_label:
+            df = compact_frame(df, label=compact_label)
+        return df.set_index(index) if index and index in df.columns else df
+
+
+_default_cache = None
+
+
+def _get_default():
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = MarketDataCache()
+    return _default_cache
+
+
+def read_market_data(table: str, begin, end, **kwargs):
+    """
+    使用默认缓存读取行情数据，参数见 MarketDataCache.read
+    在设置了共享存储的工作进程中（见 utils.shared_data），参数相同的查询只加载一次，结果以只读共享内存的形式在进程间复用
+    """
+    store = get_store()
+    if store is None or kwargs.get('refresh'):
+        return _get_default().read(table, begin, end, **kwargs)
+    return store.get_or_load(query_key(table, begin, end, **kwargs),
+                             lambda: _get_default().read(table, begin, end, **kwargs))
+
+
+def feed_columns(table: str, feed_cls, extra=()):
+    """feed 类和策略需要的列，参数见 MarketDataCache.feed_columns"""
+    return _get_default().feed_columns(table, feed_cls, extra)
@@ -0,0 +1,126 @@
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from utils.frame_compact import exact_float64
+
+# ATM 跨式报价：快照时间、到期日、行权价、看涨和看跌的卖一价
+StraddleQuote = namedtuple('StraddleQuote', ['time', 'expiry', 'strike', 'call_ask', 'put_ask'])
+
+
+def _ns(value):
+    """datetime / Timestamp 转为 UTC 纳秒整数"""
+    ts = pd.Timestamp(value)
+    return (ts.tz_convert('UTC') if ts.tzinfo is not None else ts).value
+
+
+def _first_per_group(group_ids, mask, values, n_groups):
+    """每组中第一个满足 mask 的值，没有时为 NaN；group_ids 已按组和原始顺序排序"""
+    out = np.full(n_groups, np.nan)
+    ids = group_ids[mask]
+    if len(ids):
+        unique, first = np.unique(ids, return_index=True)
+        out[unique] = values[mask][first]
+    return out
+
+
+class OptionChainIndex:
+    """
+    期权链快照索引
+    把 (时间, 到期日, 行权价) 三层按 CSR 方式存为有序数组：
+        times[i] 的到期日为 expiries[time_ptr[i]:time_ptr[i + 1]]，
+        expiries[k] 的行权价为 strikes[expiry_ptr[k]:expiry_ptr[k + 1]]，对应 call_ask / put_ask（没有报价为 NaN）
+    查找时间点和到期日是二分查找，ATM 行权价是在有序行权价上的二分查找，不再扫描整个期权链。
+    同一 (时间, 到期日, 行权价, 看涨/看跌) 有多行时取原始顺序的第一行，与 iloc[0] 一致；
+    与 spot 等距的两个行权价取原始顺序中先出现的一个，与按距离稳定排序后取第一行一致。
+    df 的索引为带时区的行情时间，需要 expiration_date、strike、claim_type、best_ask_price 列。
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        times = pd.DatetimeIndex(df.index)
+        times = (times.tz_convert('UTC') if times.tz is not None else times).asi8
+        expiries = pd.DatetimeIndex(df['expiration_date'])
+        expiries = (expiries.tz_convert('UTC') if expiries.tz is not None else expiries).asi8
+        strikes = exact_float64(df['strike']).to_numpy(dtype='float64')
+        asks = exact_float64(df['best_ask_price']).to_numpy(dtype='float64')
+        claim_type = df['claim_type'].astype(str).to_numpy()
+        is_call = claim_type == 'call'
+        is_put = claim_type == 'put'
+
+        # 到期日为空、行权价为空或不是看涨/看跌的行不参与选择
+        valid = (expiries != pd.NaT.value) & ~np.isnan(strikes) & (is_call | is_put)
+        rows = np.flatnonzero(valid)
+        order = rows[np.lexsort((rows, strikes[rows], expiries[rows], times[rows]))]
+        t, e, k = times[order], expiries[order], strikes[order]
+
+        # 每个 (时间, 到期日, 行权价) 一组
+        new_strike = np.ones(len(order), dtype=bool)
+        new_strike[1:] = (t[1:] != t[:-1]) | (e[1:] != e[:-1]) | (k[1:] != k[:-1])
+        strike_ids = np.cumsum(new_strike) - 1
+        n_strikes = int(new_strike.sum())
+        self.strikes = k[new_strike]
+        # 每组在原始数据中第一行的位置，用于等距行权价的取舍
+        self.first_row = order[new_strike]
+        self.call_ask = _first_per_group(strike_ids, is_call[order], asks[order], n_strikes)
+        self.put_ask = _first_per_group(strike_ids, is_put[order], asks[order], n_strikes)
+
+        # 每个 (时间, 到期日) 一组
+        st, se = t[new_strike], e[new_strike]
+        new_expiry = np.ones(n_strikes, dtype=bool)
+        new_expiry[1:] = (st[1:] != st[:-1]) | (se[1:] != se[:-1])
+        self.expiries = se[new_expiry]
+        self.expiry_ptr = np.append(np.flatnonzero(new_expiry), n_strikes)
+
+        # 每个时间点一组
+        et = st[new_expiry]
+        new_time = np.ones(len(et), dtype=bool)
+        new_time[1:] = et[1:] != et[:-1]
+        self.times = et[new_time]
+        self.time_ptr = np.append(np.flatnonzero(new_time), len(et))
+
+    def __len__(self):
+        return len(self.times)
+
+    def locate(self, when, tolerance=None):
+        """
+        查找快照位置
+        tolerance 为空时只接受精确匹配；否则取不晚于 when 的最近快照（as-of），
+        相差超过 tolerance（秒或 Timedelta）时视为缺失。缺失时返回 None
+        """
+        target = _ns(when)
+        i = int(np.searchsorted(self.times, target, side='right')) - 1
+        if i < 0:
+            return None
+        if self.times[i] == target:
+            return i
+        if tolerance is None:
+            return None
+        tolerance = pd.Timedelta(seconds=tolerance) if isinstance(tolerance, (int, float)) else pd.Timedelta(tolerance)
+        return i if target - self.times[i] <= tolerance.value else None
+
+    def atm_straddle(self, when, spot: float, tolerance=None):
+        """
+        when 时刻最近到期（晚于 when）的到期日上离 spot 最近的行权价及其看涨、看跌卖一价
+        没有快照或没有未到期的到期日时返回 None
+        """
+        i = self.locate(when, tolerance)
+        if i is None:
+            return None
+        lo, hi = self.time_ptr[i], self.time_ptr[i + 1]
+        k = lo + int(np.searchsorted(self.expiries[lo:hi], _ns(when), side='right'))
+        if k >= hi:
+            return None
+        s0, s1 = self.expiry_ptr[k], self.expiry_ptr[k + 1]
+        j = s0 + int(np.searchsorted(self.strikes[s0:s1], spot))
+        if j == s1:
+            j -= 1
+        elif j > s0:
+            below, above = abs(self.strikes[j - 1] - spot), abs(self.strikes[j] - spot)
+            if below < above or (below == above and self.first_row[j - 1] < self.first_row[j]):
+                j -= 1
+        return StraddleQuote(
+            time=pd.Timestamp(self.times[i], tz='UTC'),
+            expiry=pd.Timestamp(self.expiries[k], tz='UTC'),
+            strike=float(self.strikes[j]),
+            call_ask=float(self.call_ask[j]),
+            put_ask=float(self.put_ask[j]),
+        )
@@ -0,0 +1,112 @@
+import heapq
+import pandas as pd
+
+
+class OptionPosition:
+    """期权持仓，使用 __slots__ 存储，比 dict 省内存、属性访问更快；单腿持仓只填 call_ask 或 put_ask"""
+    __slots__ = ('entry_dt', 'expiry_dt', 'strike', 'size', 'entry_spot', 'call_ask', 'put_ask', 'seq')
+
+    def __init__(self, entry_dt, expiry_dt, strike, size, entry_spot, call_ask=0.0, put_ask=0.0):
+        self.entry_dt = entry_dt
+        self.expiry_dt = expiry_dt
+        self.strike = strike
+        self.size = size
+        self.entry_spot = entry_spot
+        self.call_ask = call_ask
+        self.put_ask = put_ask
+        self.seq = None
+
+    def __repr__(self):
+        return f"OptionPosition(strike={self.strike}, size={self.size}, expiry={self.expiry_dt})"
+
+
+class PositionBook:
+    """
+    按到期时间组织的持仓簿
+    持仓保存在以 (expiry_dt, 开仓顺序) 为键的最小堆中，每根K线只需看堆顶是否到期，
+    到期处理只涉及到期的持仓，不再每根K线重建整个持仓列表，数千条同时持有的持仓也没有逐K线的 O(n) 开销。
+    pop_due() 按开仓顺序返回到期持仓，与按列表顺序结算一致（现金和盈亏的累加顺序不变）。
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._seq = 0
+
+    def __len__(self):
+        return len(self._heap)
+
+    def __iter__(self):
+        """按开仓顺序遍历未到期持仓"""
+        return iter(sorted((entry[2] for entry in self._heap), key=lambda pos: pos.seq))
+
+    def add(self, position: OptionPosition):
+        position.seq = self._seq
+        self._seq += 1
+        heapq.heappush(self._heap, (position.expiry_dt, position.seq, position))
+
+    @property
+    def next_expiry(self):
+        """最早的到期时间，没有持仓时为 None"""
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now):
+        """取出到期时间不晚于 now 的全部持仓，按开仓顺序返回"""
+        due = []
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            due.append(heapq.heappop(heap)[2])
+        if len(due) > 1:
+            due.sort(key=lambda pos: pos.seq)
+        return due
+
+
+def minute_text(values: pd.Series):
+    """时间列格式化为 'YYYY-MM-DD HH:MM'"""
+    return pd.Series(pd.to_datetime(values)).dt.strftime('%Y-%m-%d %H:%M')
+
+
+def rounded(digits: int):
+    """按 Python round 逐值保留 digits 位小数的格式化函数，结果与逐笔 round() 一致"""
+    return lambda values: values.map(lambda value: round(value, digits))
+
+
+class TradeLog:
+    """
+    按列记录的交易日志
+    append() 只把原始值追加到各列的列表中，不做字符串格式化；
+    to_frame() 导出时才按 export 一次性整列格式化，export 为 [(列名, 字段名, 格式化函数或 None), ...]，
+    为 None 时导出原始字段。
+    """
+
+    def __init__(self, export=None):
+        self.export = export
+        self.columns = {}
+        self._length = 0
+
+    def __len__(self):
+        return self._length
+
+    def append(self, **fields):
+        for name, value in fields.items():
+            values = self.columns.get(name)
+            if values is None:
+                # 新出现的列先用 None 补齐之前的行
+                values = self.columns[name] = [None] * self._length
+            values.append(value)
+        self._length += 1
+        for values in self.columns.values():
+            if len(values) < self._length:
+                values.append(None)
+
+    def to_frame(self) -> pd.DataFrame:
+        raw = pd.DataFrame(self.columns)
+        if self.export is None:
+            return raw
+        data = {}
+        for label, field, formatter in self.export:
+            values = raw[field] if field in raw else pd.Series([None] * len(raw), dtype=object)
+            data[label] = formatter(values) if formatter is not None and len(values) else values
+        return pd.DataFrame(data, index=raw.index)
+
+    def to_records(self):
+        return self.to_frame().to_dict('records')
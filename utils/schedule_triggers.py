@@ -0,0 +1,71 @@
+import datetime as dt
+import numpy as np
+import pandas as pd
+from utils.array_feed import date2num_array
+from utils.time_utils import to_utc
+
+
+class ScheduleTriggers:
+    """
+    按时间表预先计算的触发K线
+    schedule 为 [(dt.time, portion), ...]，时间为 tz 时区的当日时间；stamps 为按时间升序的行情K线时间（不带时区的视为 UTC）。
+    与逐根K线检查的规则相同：
+    - 当地时间的小时等于调度时间的小时，且分钟落在 [minute, minute + window) 内时匹配
+    - 签名为 (当地日期, 小时, 分钟)，与上一次触发的签名相同时不再触发，即每个时间点每天只触发一次
+    - 同一根K线匹配多个调度时间时按 schedule 的顺序依次触发
+    回测前一次性向量化算出全部触发K线，策略在 next() 中只需比较当前K线的 date2num 数值：
+        if now >= triggers.next_num:
+            for when, portion in triggers.pop(now): ...
+    """
+
+    def __init__(self, schedule, stamps, tz='Asia/Hong_Kong', window: int = 5):
+        utc = to_utc(pd.DatetimeIndex(stamps))
+        local = utc.tz_convert(tz)
+        hours = local.hour.to_numpy()
+        minutes = local.minute.to_numpy()
+        days = local.tz_localize(None).normalize().asi8
+
+        times = [t if isinstance(t, dt.time) else dt.time.fromisoformat(t) for t, _ in schedule]
+        bars, orders = [], []
+        for order, sched_time in enumerate(times):
+            matched = np.flatnonzero((hours == sched_time.hour) & (minutes >= sched_time.minute)
+                                     & (minutes < sched_time.minute + window))
+            bars.append(matched)
+            orders.append(np.full(len(matched), order))
+        bars = np.concatenate(bars) if bars else np.empty(0, dtype='int64')
+        orders = np.concatenate(orders) if orders else np.empty(0, dtype='int64')
+        ranked = np.lexsort((orders, bars))
+
+        # 匹配的K线很少，按时间顺序逐个检查签名
+        kept = []
+        last_signature = None
+        for i in ranked:
+            bar, order = int(bars[i]), int(orders[i])
+            signature = (days[bar], times[order].hour, times[order].minute)
+            if signature != last_signature:
+                kept.append((bar, order))
+                last_signature = signature
+
+        self.bars = np.array([bar for bar, _ in kept], dtype='int64')
+        self.portions = [float(schedule[order][1]) for _, order in kept]
+        self.times = [ts.to_pydatetime() for ts in utc[self.bars]]
+        self.nums = date2num_array(utc[self.bars].tz_localize(None).asi8)
+        self._pos = 0
+        self.next_num = self.nums[0] if len(self.nums) else np.inf
+
+    def __len__(self):
+        return len(self.bars)
+
+    def pop(self, now: float):
+        """
+        返回 date2num 数值为 now 的K线上的触发 [(UTC 时间, portion), ...]，并跳过更早的触发
+        now 需按时间顺序递增，跳过的K线（如被 fromdate 过滤）上的触发不再执行
+        """
+        fired = []
+        nums = self.nums
+        while self._pos < len(nums) and nums[self._pos] <= now:
+            if nums[self._pos] == now:
+                fired.append((self.times[self._pos], self.portions[self._pos]))
+            self._pos += 1
+        self.next_num = nums[self._pos] if self._pos < len(nums) else np.inf
+        return fired
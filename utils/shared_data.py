@@ -0,0 +1,289 @@
+import os
+import json
+import time
+import uuid
+import numpy as np
+import pandas as pd
+from multiprocessing import shared_memory, resource_tracker
+
+# 各列在共享内存块中按此字节数对齐
+ALIGN = 64
+
+# 本进程已映射的数据集，key -> (SharedMemory, DataFrame)
+_attached = {}
+
+# 释放时仍被策略引用、暂时无法关闭的映射，下次释放时重试
+_lingering = []
+
+# 本进程使用的共享存储，由工作进程在任务开始时设置
+_store = None
+
+
+def set_store(store):
+    global _store
+    _store = store
+
+
+def get_store():
+    return _store
+
+
+def _name_of(func):
+    return None if func is None else f"{func.__module__}.{getattr(func, '__qualname__', repr(func))}"
+
+
+def query_key(table: str, begin, end, **kwargs):
+    """read_market_data 查询的唯一标识，参数相同的查询共享同一份数据"""
+    kwargs = dict(kwargs)
+    kwargs['convert'] = _name_of(kwargs.get('convert'))
+    if kwargs.get('selector') is not None:
+        kwargs['selector'] = repr(kwargs['selector'])
+    query = dict(table=table, begin=str(pd.Timestamp(begin)), end=str(pd.Timestamp(end)), **kwargs)
+    return json.dumps(query, sort_keys=True, default=str)
+
+
+def _open(name, size=0):
+    """
+    创建或打开共享内存块
+    生命周期由注册表管理，不交给 resource_tracker，否则某个工作进程退出时会删除其他进程仍在使用的数据块
+    """
+    shm = shared_memory.SharedMemory(name=name, create=bool(size), size=size)
+    try:
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    except Exception:
+        pass
+    return shm
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _datetime_array(values, tz, unit='ns'):
+    """共享内存中的 int64 数组按原来的时间单位转为时间数组，尽量不复制"""
+    values = values.view(f'M8[{unit}]')
+    if tz is None:
+        return values
+    dtype = pd.DatetimeTZDtype(unit=unit, tz=tz)
+    try:
+        return pd.arrays.DatetimeArray._simple_new(values, dtype=dtype)
+    except AttributeError:
+        # 没有该内部接口的 pandas 版本只能复制一次
+        return pd.DatetimeIndex(values).tz_localize('UTC').tz_convert(tz).array
+
+
+def _encode_values(values):
+    """把一列转为 (描述, 数组)，字符串等 object 列转为 category 的编码"""
+    dtype = values.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        return {'kind': 'category', 'categories': dtype.categories.tolist(), 'ordered': bool(dtype.ordered)}, \
+            np.asarray(values.codes if isinstance(values, pd.Categorical) else values.cat.codes)
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        tz = getattr(dtype, 'tz', None)
+        index = pd.DatetimeIndex(values)
+        # asi8 是该列自身时间单位（s、ms、us 或 ns）的整数，还原时按同一单位解释
+        return {'kind': 'datetime', 'tz': None if tz is None else str(tz),
+                'unit': getattr(index, 'unit', 'ns')}, index.asi8
+    if dtype == object:
+        return _encode_values(pd.Series(values).astype('category'))
+    return {'kind': 'array'}, np.asarray(values)
+
+
+def _decode_values(spec, values):
+    if spec['kind'] == 'category':
+        return pd.Categorical.from_codes(values, categories=spec['categories'], ordered=spec['ordered'])
+    if spec['kind'] == 'datetime':
+        return _datetime_array(values, spec['tz'], spec.get('unit', 'ns'))
+    return values
+
+
+class SharedFrameStore:
+    """
+    服务端进程内的共享内存行情数据
+    同一查询的数据只加载一次，按列写入一块共享内存，各工作进程只读映射，不复制。
+    注册表保存在 multiprocessing.Manager 的字典中，记录每块数据的列布局、大小、持有进程和最近使用时间：
+    - get_or_load() 在其他进程正在加载同一查询时等待，加载完成后直接映射
+    - release_all() 在任务结束时释放本进程持有的数据
+    - 总大小超过预算时按最近使用时间淘汰无进程持有的数据，持有进程已退出的视为未持有
+    预算可通过环境变量 SHARED_DATA_BUDGET_MB 配置，默认 2048，0 表示不共享。
+    映射的数组只读，策略中对行情 DataFrame 的原地修改会报错，需要修改时先 copy()。
+    """
+
+    def __init__(self, registry, lock, budget_mb=None, load_timeout=600):
+        self.registry = registry
+        self.lock = lock
+        budget_mb = budget_mb if budget_mb is not None else float(os.environ.get('SHARED_DATA_BUDGET_MB', 2048))
+        self.budget = budget_mb * 1024 * 1024
+        self.load_timeout = load_timeout
+
+    def get_or_load(self, key: str, loader):
+        """返回 key 对应的共享 DataFrame，不存在时由 loader() 加载并发布；无法共享时返回 loader() 的结果"""
+        if not self.budget:
+            return loader()
+        deadline = time.monotonic() + self.load_timeout
+        while True:
+            with self.lock:
+                entry = self.registry.get(key)
+                if entry is None or (entry['state'] == 'loading' and not _alive(entry['owner'])):
+                    self.registry[key] = {'state': 'loading', 'owner': os.getpid()}
+                    break
+                if entry['state'] == 'ready':
+                    df = self._attach(key, entry)
+                    if df is not None:
+                        return df
+                    break
+            if time.monotonic() > deadline:
+                return loader()
+            # 其他进程正在加载同一查询
+            time.sleep(0.2)
+
+        try:
+            df = loader()
+        except BaseException:
+            with self.lock:
+                self.registry.pop(key, None)
+            raise
+        shared = self.publish(key, df)
+        return df if shared is None else shared
+
+    def publish(self, key: str, df: pd.DataFrame):
+        """写入共享内存并映射，返回共享的 DataFrame，超出预算无法写入时返回 None"""
+        columns = []
+        arrays = []
+        for name in df.columns:
+            spec, values = _encode_values(df[name])
+            columns.append(dict(spec, name=name))
+            arrays.append(values)
+        if isinstance(df.index, pd.RangeIndex):
+            index = {'kind': 'range', 'start': df.index.start, 'stop': df.index.stop, 'step': df.index.step,
+                     'name': df.index.name}
+            layout = columns
+        else:
+            spec, values = _encode_values(df.index)
+            index = dict(spec, name=df.index.name)
+            layout = columns + [index]
+            arrays.append(values)
+
+        offset = 0
+        for spec, values in zip(layout, arrays):
+            values = np.ascontiguousarray(values)
+            spec.update(offset=offset, dtype=values.dtype.str, length=len(values))
+            offset += -(-values.nbytes // ALIGN) * ALIGN
+        size = max(offset, 1)
+
+        with self.lock:
+            if not self._make_room(size):
+                self.registry.pop(key, None)
+                print(f"[shared_data] {size / 1024 / 1024:.1f}MB 超出共享内存预算，不共享")
+                return None
+            shm = _open(f"bt_{uuid.uuid4().hex[:16]}", size)
+            for spec, values in zip(layout, arrays):
+                target = np.ndarray(spec['length'], dtype=spec['dtype'], buffer=shm.buf, offset=spec['offset'])
+                target[:] = values
+            entry = {
+                'state': 'ready', 'segment': shm.name, 'size': size, 'columns': columns, 'index': index,
+                'holders': [], 'last_used': time.time(),
+            }
+            self.registry[key] = entry
+            shm.close()
+            print(f"[shared_data] 发布 {len(df)} 行 {size / 1024 / 1024:.1f}MB -> {entry['segment']}")
+            return self._attach(key, entry)
+
+    def _attach(self, key, entry):
+        """映射共享数据并登记持有，调用方持有锁；数据块已不存在时返回 None"""
+        if key in _attached:
+            return _attached[key][1]
+        try:
+            shm = _open(entry['segment'])
+        except FileNotFoundError:
+            self.registry.pop(key, None)
+            return None
+
+        def view(spec):
+            values = np.ndarray(spec['length'], dtype=spec['dtype'], buffer=shm.buf, offset=spec['offset'])
+            values.flags.writeable = False
+            return _decode_values(spec, values)
+
+        spec = entry['index']
+        if spec['kind'] == 'range':
+            index = pd.RangeIndex(spec['start'], spec['stop'], spec['step'], name=spec['name'])
+        else:
+            index = pd.Index(view(spec), name=spec['name'], copy=False)
+        df = pd.DataFrame({spec['name']: view(spec) for spec in entry['columns']}, index=index, copy=False)
+        _attached[key] = (shm, df)
+        entry['holders'] = [pid for pid in entry['holders'] if pid != os.getpid()] + [os.getpid()]
+        entry['last_used'] = time.time()
+        self.registry[key] = entry
+        return df
+
+    def _make_room(self, size):
+        """淘汰最久未使用且无进程持有的数据，直到能放下 size 字节，调用方持有锁"""
+        if size > self.budget:
+            return False
+        entries = [(key, entry) for key, entry in self.registry.items() if entry['state'] == 'ready']
+        used = sum(entry['size'] for _, entry in entries)
+        for key, entry in sorted(entries, key=lambda item: item[1]['last_used']):
+            if used + size <= self.budget:
+                break
+            if any(_alive(pid) for pid in entry['holders']):
+                continue
+            self._unlink(key, entry)
+            used -= entry['size']
+        return used + size <= self.budget
+
+    def _unlink(self, key, entry):
+        self.registry.pop(key, None)
+        try:
+            # unlink() 会向 resource_tracker 注销，这里按默认方式打开以保持注册和注销成对
+            shm = shared_memory.SharedMemory(name=entry['segment'])
+            shm.close()
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+    def release_all(self):
+        """任务结束，释放本进程持有的全部数据，数据保留在共享内存中供后续任务使用"""
+        if not _attached and not _lingering:
+            return
+        pid = os.getpid()
+        with self.lock:
+            for key in list(_attached):
+                entry = self.registry.get(key)
+                if entry is not None and entry['state'] == 'ready':
+                    entry['holders'] = [p for p in entry['holders'] if p != pid]
+                    self.registry[key] = entry
+        for key in list(_attached):
+            shm, df = _attached.pop(key)
+            del df
+            _lingering.append(shm)
+        for shm in list(_lingering):
+            try:
+                shm.close()
+                _lingering.remove(shm)
+            except BufferError:
+                # 策略仍引用这些数组，下次释放时再关闭
+                pass
+
+    def stats(self):
+        entries = [entry for entry in self.registry.values() if entry['state'] == 'ready']
+        return {
+            'datasets': len(entries),
+            'used_mb': round(sum(entry['size'] for entry in entries) / 1024 / 1024, 1),
+            'budget_mb': round(self.budget / 1024 / 1024, 1),
+            'held': sum(bool(entry['holders']) for entry in entries),
+        }
+
+    def clear(self):
+        """删除全部共享数据，服务关闭时调用"""
+        with self.lock:
+            for key, entry in list(self.registry.items()):
+                if entry['state'] == 'ready':
+                    self._unlink(key, entry)
+                else:
+                    self.registry.pop(key, None)
@@ -0,0 +1,65 @@
+import os
+import sys
+import subprocess
+
+# 在子进程中导入服务并请求一次策略列表，-X importtime 的逐模块耗时输出到 stderr
+PROFILE_SCRIPT = """
+import time
+start = time.perf_counter()
+import server
+boot = time.perf_counter() - start
+start = time.perf_counter()
+server.runner.get_strategies()
+print(f"boot {boot:.6f}")
+print(f"strategies {time.perf_counter() - start:.6f}")
+"""
+
+
+def parse_importtime(stderr: str):
+    """解析 -X importtime 输出，返回 [(模块, 自身耗时us, 累计耗时us, 嵌套层级)]"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            rows.append((name.strip(), int(self_us), int(cumulative_us), (len(name) - len(name.lstrip())) // 2))
+        except ValueError:
+            continue
+    return rows
+
+
+def profile_startup(top: int = 25):
+    """
+    启动耗时报告
+    在干净的子进程中导入 server，按模块列出导入耗时，并统计首次 /api/strategies 的耗时。
+    任务队列的进程池在服务启动（lifespan）时才创建，导入 server 不会拉起工作进程，报告中只有服务进程自身的导入耗时。
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ,
+               PYTHONPATH=os.pathsep.join(filter(None, [root, os.environ.get('PYTHONPATH')])))
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROFILE_SCRIPT],
+        capture_output=True, text=True, env=env,
+    )
+    timings = dict(line.split() for line in proc.stdout.splitlines() if line.startswith(('boot ', 'strategies ')))
+    rows = parse_importtime(proc.stderr)
+    if proc.returncode != 0:
+        print(proc.stderr[-2000:])
+        return
+
+    print(f"服务启动（import server）: {float(timings.get('boot', 0)) * 1000:.1f} ms")
+    print(f"首次 /api/strategies: {float(timings.get('strategies', 0)) * 1000:.1f} ms")
+
+    # 各模块的自身耗时按顶层包汇总，即每个依赖包的总导入开销
+    packages = {}
+    for name, self_us, _, _ in rows:
+        root = name.split('.')[0]
+        packages[root] = packages.get(root, 0) + self_us
+    print(f"\n按顶层包汇总的导入耗时（前 {top} 个）:")
+    for root, us in sorted(packages.items(), key=lambda x: -x[1])[:top]:
+        print(f"  {us / 1000:10.1f} ms  {root}")
+
+    print(f"\n自身耗时最多的模块（前 {top} 个）:")
+    for name, self_us, cumulative, _ in sorted(rows, key=lambda x: -x[1])[:top]:
+        print(f"  {self_us / 1000:10.1f} ms  (累计 {cumulative / 1000:8.1f} ms)  {name}")
@@ -0,0 +1,57 @@
+import warnings
+import pandas as pd
+
+
+def _localize(values, assume_tz):
+    """不带时区的时间按 assume_tz 解释后转为 UTC，带时区的直接转为 UTC"""
+    tz = values.dt.tz if isinstance(values, pd.Series) else values.tz
+    accessor = values.dt if isinstance(values, pd.Series) else values
+    if tz is None:
+        values = accessor.tz_localize(assume_tz)
+        accessor = values.dt if isinstance(values, pd.Series) else values
+    return accessor.tz_convert('UTC')
+
+
+def to_utc(values, unit: str = None, assume_tz: str = 'UTC'):
+    """
+    把数据库或 CSV 中的时间列统一转换为带时区的 UTC 时间，全程向量化，不逐行调用 Python
+    values 可以是 Series、Index 或数组，返回同类型（数组返回 DatetimeIndex）：
+    - 整数或浮点数视为 unit 单位的 epoch 时间戳，如 unit='ms'
+    - datetime64 列：不带时区的按 assume_tz 解释，带时区的转换为 UTC
+    - object 列（datetime/date 对象或字符串）：由 pd.to_datetime 整列解析，时区偏移不一致时按各自偏移换算
+    """
+    if not isinstance(values, (pd.Series, pd.Index)):
+        values = pd.Index(values)
+    if unit is not None and pd.api.types.is_numeric_dtype(values.dtype):
+        return pd.to_datetime(values, unit=unit, utc=True)
+    if not pd.api.types.is_datetime64_any_dtype(values.dtype):
+        try:
+            with warnings.catch_warnings():
+                # pandas 2.x 对时区偏移不一致的列给出 FutureWarning 并返回 object 列，以后的版本直接报错
+                warnings.simplefilter('ignore', FutureWarning)
+                parsed = pd.to_datetime(values)
+        except (ValueError, TypeError):
+            parsed = None
+        if parsed is None or not pd.api.types.is_datetime64_any_dtype(parsed.dtype):
+            return pd.to_datetime(values, utc=True)
+        values = parsed
+    return _localize(values, assume_tz)
+
+
+def normalize_timestamps(df: pd.DataFrame, columns=('datetime', 'expiration_date'), epoch_column: str = None,
+                         unit: str = 'ms', index_name: str = 'datetime_idx', assume_tz: str = 'UTC'):
+    """
+    统一 DataFrame 中的时间列，可作为 read_market_data 的逐块转换函数（或其中一步）
+    columns 中存在的列转换为带时区的 UTC 时间；
+    epoch_column 不为空时由该列（如毫秒时间戳 date）生成 index_name 列，供合并后 set_index
+    """
+    converted = {name: to_utc(df[name], assume_tz=assume_tz) for name in columns if name in df.columns}
+    if epoch_column is not None:
+        converted[index_name] = to_utc(df[epoch_column], unit=unit, assume_tz=assume_tz)
+    if not converted:
+        return df
+    # 浅拷贝后替换列，其余列不复制（assign 会复制整个 DataFrame）
+    df = df.copy(deep=False)
+    for name, values in converted.items():
+        df[name] = values
+    return df
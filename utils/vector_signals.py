@@ -0,0 +1,106 @@
+import math
+import numpy as np
+
+# float64 的单位舍入误差
+UNIT_ROUNDOFF = 2.0 ** -53
+
+
+class MovingAverage:
+    """
+    向量化的简单移动平均，对应 bt.indicators.SMA
+    values 为滑动窗口求和得到的近似值，bound 为与 backtrader 的 math.fsum(window) / period 之差的上界；
+    exact(i) 按 backtrader 的算法重新计算第 i 个值。前 period - 1 个值为 NaN
+    """
+
+    def __init__(self, source, period: int):
+        self.source = np.asarray(source, dtype='float64')
+        self.period = int(period)
+        self.minperiod = self.period
+        n = len(self.source)
+        self.values = np.full(n, np.nan)
+        self.bound = np.full(n, np.nan)
+        if self.period > n:
+            return
+        windows = np.lib.stride_tricks.sliding_window_view(self.source, self.period)
+        self.values[self.period - 1:] = windows.sum(axis=-1) / self.period
+        # 任意求和顺序的误差不超过 period * u * sum(|x|)，再加上 fsum 和除法各一次舍入，取两倍余量
+        mean_abs = np.abs(windows).sum(axis=-1) / self.period
+        self.bound[self.period - 1:] = 2.0 * (self.period + 4) * UNIT_ROUNDOFF * mean_abs
+
+    def __len__(self):
+        return len(self.values)
+
+    def exact(self, i: int):
+        if i < self.period - 1:
+            return float('nan')
+        return math.fsum(self.source[i - self.period + 1:i + 1]) / self.period
+
+
+def sma(values, period: int) -> MovingAverage:
+    return MovingAverage(values, period)
+
+
+def _difference(a, b):
+    """a - b，以及两条线都已精确时的差；MovingAverage 在两者几乎相等的位置按 backtrader 的算法重新计算"""
+    a_values = a.values if isinstance(a, MovingAverage) else np.asarray(a, dtype='float64')
+    b_values = b.values if isinstance(b, MovingAverage) else np.asarray(b, dtype='float64')
+    diff = a_values - b_values
+    bound = np.zeros(len(diff))
+    for line in (a, b):
+        if isinstance(line, MovingAverage):
+            bound = bound + np.nan_to_num(line.bound, nan=0.0)
+    # 只有差的绝对值在误差范围内时符号或是否为 0 才可能与 backtrader 不同
+    fragile = ~(np.abs(diff) > 2.0 * bound)
+    for i in np.flatnonzero(fragile).tolist():
+        a_i = a.exact(i) if isinstance(a, MovingAverage) else float(a_values[i])
+        b_i = b.exact(i) if isinstance(b, MovingAverage) else float(b_values[i])
+        diff[i] = a_i - b_i
+    return diff
+
+
+def crossover(a, b):
+    """
+    向量化的 bt.indicators.CrossOver：a 上穿 b 为 1.0，下穿为 -1.0，其余为 0.0
+    与 NonZeroDifference 一致，差为 0 时沿用上一个非 0 的差判断穿越前的位置
+    """
+    diff = _difference(a, b)
+    n = len(diff)
+    cross = np.zeros(n)
+    start = max(getattr(a, 'minperiod', 1), getattr(b, 'minperiod', 1)) - 1
+    if start + 1 >= n:
+        return cross
+    index = np.arange(n)
+    # NaN 不等于 0，与 backtrader 一样作为非 0 的差保留
+    last = np.where((diff != 0) & (index >= start), index, start)
+    nzd = diff[np.maximum.accumulate(last)]
+    before = nzd[start:-1]
+    after = diff[start + 1:]
+    cross[start + 1:] = (before < 0.0) & (after > 0.0)
+    cross[start + 1:] -= (before > 0.0) & (after < 0.0)
+    return cross
+
+
+class SignalData:
+    """
+    向量化信号使用的第一个数据源（data0）
+    各条 line 按 data0 自己的K线排列（data.close、data.volume 等）；
+    length 为每个时钟 tick 上的 len(data0)，多个数据源时时钟是全部数据源时间的并集，
+    data0 没有新K线的 tick 上 next() 仍会执行，读到的是 data0 最后一根K线的值
+    """
+
+    def __init__(self, lines: dict, length):
+        self.lines = lines
+        self.length = np.asarray(length, dtype='int64')
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__['lines'][name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __len__(self):
+        return len(self.length)
+
+    def tick(self, values):
+        """按 data0 K线排列的数组展开到每个时钟 tick，即 next() 中读取的 [0]"""
+        return np.asarray(values)[self.length - 1]